@@ -3,6 +3,7 @@ import os
 import base64
 import json
 from datetime import datetime
+import subprocess
 import tempfile
 import time
 
@@ -79,6 +80,12 @@ class FirebaseService:
         blob.upload_from_filename(file_path)
         os.remove(file_path)
 
+    def delete_file(self, blob_name):
+        """Deletes a file from Firebase Storage, if it exists."""
+        blob = self.bucket.blob(blob_name)
+        if blob.exists():
+            blob.delete()
+
 
     def get_document(self, collection_name, document_id):
         # Retrieve an instance of a CollectionReference
@@ -98,48 +105,108 @@ class FirebaseService:
 
 
 def perform_inference_on_video(model, video_path, update_progress, batch_size=3, skip_frames=2):
+    """
+    Yields a uint8 saliency map for every (skip_frames + 1)-th frame of the video, one batch at a time.
+
+    Only the current batch of frames and its maps are held in memory, so peak memory depends on
+    batch_size rather than on the length of the video.
+    """
     cap = cv2.VideoCapture(video_path)
     total_frames = cap.get(cv2.CAP_PROP_FRAME_COUNT)
-    frames = []
+
+    def read_frames():
+        frame_count = 0
+        try:
+            while cap.isOpened():
+                ret, frame = cap.read()
+                if not ret:
+                    break
+
+                if frame_count % (skip_frames + 1) == 0:
+                    yield cv2.cvtColor(frame, cv2.COLOR_BGR2RGB)
+                frame_count += 1
+        finally:
+            cap.release()
+
+    yield from perform_inference_on_frames(model, read_frames(), len(range(0, int(total_frames), skip_frames + 1)),
+                                           update_progress, batch_size=batch_size)
+
+
+def read_frame_cache(frame_cache_path, frame_count):
+    """Yields the frames, as RGB, of a frame cache video written by VideoAnalyser.analyse_video."""
+    cap = cv2.VideoCapture(frame_cache_path)
+    try:
+        for _ in range(frame_count):
+            ret, frame = cap.read()
+            if not ret:
+                break
+            yield cv2.cvtColor(frame, cv2.COLOR_BGR2RGB)
+    finally:
+        cap.release()
+
+
+def perform_inference_on_frames(model, frames, total_frames, update_progress, batch_size=3):
+    """Yields a uint8 saliency map for every RGB frame in `frames`, running the model one batch at a time."""
+    batch = []
     frame_count = 0
-    saliency_maps = []
     start_time = time.time()
 
-    while cap.isOpened():
-        ret, frame = cap.read()
-        if not ret:
-            break
-
-        if frame_count % (skip_frames + 1) != 0:
-            frame_count += 1
-            continue
+    # Running statistics over every saliency value, replacing np.min / np.std over the full list of maps
+    map_count = 0
+    first_shape = None
+    value_count = 0
+    value_min = np.inf
+    value_max = -np.inf
+    value_sum = 0.0
+    value_sum_squares = 0.0
+
+    def emit(batch_frames):
+        nonlocal map_count, first_shape, value_count, value_min, value_max, value_sum, value_sum_squares
+        for saliency_map in process_batch(model, batch_frames):
+            if first_shape is None:
+                first_shape = saliency_map.shape
+            map_count += 1
+            value_count += saliency_map.size
+            value_min = min(value_min, float(np.min(saliency_map)))
+            value_max = max(value_max, float(np.max(saliency_map)))
+            value_sum += float(np.sum(saliency_map, dtype=np.float64))
+            value_sum_squares += float(np.sum(np.square(saliency_map, dtype=np.float64)))
+            yield saliency_to_uint8(saliency_map)
 
-        frame_rgb = cv2.cvtColor(frame, cv2.COLOR_BGR2RGB)
-        frames.append(frame_rgb)
+    for frame in frames:
+        batch.append(frame)
 
-        if len(frames) == batch_size:
-            batch_saliency_maps = process_batch(model, frames)
-            saliency_maps.extend(batch_saliency_maps)
-            frames = []
+        if len(batch) == batch_size:
+            yield from emit(batch)
+            batch = []
         update_progress((frame_count / total_frames) * 100)
         frame_count += 1
 
-    if frames:
-        batch_saliency_maps = process_batch(model, frames)
-        saliency_maps.extend(batch_saliency_maps)
+    if batch:
+        yield from emit(batch)
 
     end_time = time.time()
     elapsed_time = end_time - start_time
     print(f"Time taken to process the video: {elapsed_time} seconds")
 
-    print(f"Number of saliency maps: {len(saliency_maps)}")
-    if saliency_maps:
-        print(f"Shape of first saliency map: {saliency_maps[0].shape}")
-        print(f"Min value: {np.min(saliency_maps)}, Max value: {np.max(saliency_maps)}")
-        print(f"Mean value: {np.mean(saliency_maps)}, Std value: {np.std(saliency_maps)}")
+    print(f"Number of saliency maps: {map_count}")
+    if map_count:
+        mean = value_sum / value_count
+        std = np.sqrt(max(value_sum_squares / value_count - mean ** 2, 0.0))
+        print(f"Shape of first saliency map: {first_shape}")
+        print(f"Min value: {value_min}, Max value: {value_max}")
+        print(f"Mean value: {mean}, Std value: {std}")
+
+
+def saliency_to_uint8(saliency_map):
+    """Converts a float saliency map in [0, 1] to a single-channel uint8 frame."""
+    # Ensure frame is 2D (grayscale)
+    if len(saliency_map.shape) > 2:
+        saliency_map = np.mean(saliency_map, axis=2)
 
-    cap.release()
-    return saliency_maps
+    # Clip values between 0 and 1
+    saliency_map = np.clip(saliency_map, 0, 1)
+    return (saliency_map * 255).astype(np.uint8)
 
 
 def process_batch(model, frames):
@@ -248,46 +315,111 @@ def postprocess_output(output_tensor, vertical_padding, horizontal_padding, orig
     return output_array
 
 
-def create_video_from_frames(frames, original_video_path, skip_frames=2):
-    cap = cv2.VideoCapture(original_video_path)
-    fps = cap.get(cv2.CAP_PROP_FPS)
-    frame_width = int(cap.get(cv2.CAP_PROP_FRAME_WIDTH))
-    frame_height = int(cap.get(cv2.CAP_PROP_FRAME_HEIGHT))
+class FrameSink:
+    """
+    Encodes raw frames with FFmpeg as they are written, in place of cv2.VideoWriter. The same abstraction as
+    serverless_backend/services/frame_sink.py, which isn't deployed with this endpoint.
+    """
+
+    def __init__(self, output_path, width, height, fps, input_pix_fmt='bgr24', codec='libx264', pix_fmt='yuv420p',
+                 preset='medium', crf=23):
+        self.output_path = output_path
+        self.command = [
+            'ffmpeg', '-v', 'error',
+            '-f', 'rawvideo', '-pix_fmt', input_pix_fmt, '-s', f'{width}x{height}', '-r', str(fps), '-i', 'pipe:0',
+            '-c:v', codec, '-preset', preset, '-crf', str(crf), '-pix_fmt', pix_fmt,
+            '-y', output_path
+        ]
+        self.frames_written = 0
+        self.stats = None
+        self._broken = False
+
+    def __enter__(self):
+        self._stderr_file = tempfile.TemporaryFile()
+        self.process = subprocess.Popen(self.command, stdin=subprocess.PIPE, stdout=subprocess.DEVNULL,
+                                        stderr=self._stderr_file)
+        self._start_time = time.perf_counter()
+        return self
+
+    def write(self, frame):
+        if self._broken:
+            return
+        try:
+            self.process.stdin.write(frame.tobytes())
+            self.frames_written += 1
+        except BrokenPipeError:
+            # FFmpeg exited early, its return code and stderr say why when the sink closes
+            self._broken = True
+
+    def __exit__(self, exc_type, exc, traceback):
+        try:
+            if exc_type is not None:
+                self.process.kill()
+                self.process.wait()
+                return False
+
+            try:
+                self.process.stdin.close()
+            except BrokenPipeError:
+                pass
+            if self.process.wait() != 0:
+                self._stderr_file.seek(0)
+                raise RuntimeError(f"FFmpeg failed to encode {self.output_path}: "
+                                   f"{self._stderr_file.read().decode(errors='replace')}")
+        finally:
+            self._stderr_file.close()
+
+        seconds = time.perf_counter() - self._start_time
+        self.stats = {"frames": self.frames_written, "seconds": seconds,
+                      "fps": self.frames_written / seconds if seconds > 0 else float('inf')}
+        print(f"Encoded {self.frames_written} frames to {self.output_path} in {seconds:.2f}s "
+              f"({self.stats['fps']:.1f} fps)")
+        return False
+
+
+def create_video_from_frames(frames, original_video_path, skip_frames=2, video_metadata=None, preset='medium',
+                             crf=23):
+    """
+    Writes an iterable of saliency frames (uint8, or float in [0, 1]) to a grayscale H.264 video as they arrive.
+
+    The fps and size are read from the original video unless `video_metadata` (a dict with the original
+    "fps", "width" and "height") is given.
+    """
+    if video_metadata is not None:
+        fps = video_metadata['fps']
+        frame_width = int(video_metadata['width'])
+        frame_height = int(video_metadata['height'])
+    else:
+        cap = cv2.VideoCapture(original_video_path)
+        fps = cap.get(cv2.CAP_PROP_FPS)
+        frame_width = int(cap.get(cv2.CAP_PROP_FRAME_WIDTH))
+        frame_height = int(cap.get(cv2.CAP_PROP_FRAME_HEIGHT))
+        cap.release()
     fps /= (skip_frames + 1)
-    cap.release()
 
     print(f"FPS: {fps}, Width: {frame_width}, Height: {frame_height}")
 
-    temp_video_file = tempfile.NamedTemporaryFile(delete=False, suffix='.avi')
+    temp_video_file = tempfile.NamedTemporaryFile(delete=False, suffix='.mp4')
     temp_video_path = temp_video_file.name
+    temp_video_file.close()
 
-    # Use MJPG codec for grayscale video
-    fourcc = cv2.VideoWriter_fourcc(*'MJPG')
-    out = cv2.VideoWriter(temp_video_path, fourcc, fps, (frame_width, frame_height), isColor=False)
-
-    print(f"Number of frames to process: {len(frames)}")
-
-    for i, frame in enumerate(frames):
-        # Ensure frame is 2D (grayscale)
-        if len(frame.shape) > 2:
-            frame = np.mean(frame, axis=2)
+    # Single-channel H.264 rather than MJPG, the saliency maps are smooth and compress far better
+    with FrameSink(temp_video_path, frame_width, frame_height, fps, input_pix_fmt='gray', pix_fmt='gray',
+                   preset=preset, crf=crf) as sink:
+        for frame_uint8 in frames:
+            if frame_uint8.dtype != np.uint8:
+                frame_uint8 = saliency_to_uint8(frame_uint8)
 
-        # Clip values between 0 and 1
-        frame = np.clip(frame, 0, 1)
+            # Resize if necessary
+            if frame_uint8.shape != (frame_height, frame_width):
+                frame_uint8 = cv2.resize(frame_uint8, (frame_width, frame_height))
 
-        # Resize if necessary
-        if frame.shape != (frame_height, frame_width):
-            frame = cv2.resize(frame, (frame_width, frame_height))
+            print(
+                f"Frame {sink.frames_written} shape: {frame_uint8.shape}, dtype: {frame_uint8.dtype}, min: {np.min(frame_uint8)}, max: {np.max(frame_uint8)}")
 
-        # Convert to uint8 for video writing
-        frame_uint8 = (frame * 255).astype(np.uint8)
+            sink.write(np.ascontiguousarray(frame_uint8))
 
-        print(
-            f"Frame {i} shape: {frame_uint8.shape}, dtype: {frame_uint8.dtype}, min: {np.min(frame_uint8)}, max: {np.max(frame_uint8)}")
-
-        out.write(frame_uint8)
-
-    out.release()
+    print(f"Number of frames written: {sink.frames_written}")
     print(f"Video saved to {temp_video_path}")
     print(f"Output video file size: {os.path.getsize(temp_video_path)} bytes")
     return temp_video_path
@@ -311,6 +443,7 @@ def create_video_from_frames(frames, original_video_path, skip_frames=2):
             "numpy"
         ],
         base_image="docker.io/nvidia/cuda:12.3.1-runtime-ubuntu20.04",
+        commands=["apt-get update && apt-get install -y ffmpeg"],
     ),
     secrets=["FIREBASE_STORAGE_BUCKET", "SERVICE_ACCOUNT_ENCODED"],
 )
@@ -341,19 +474,40 @@ def predict(context, short_id):
                                                                     {"progress_message": x,
                                                                      "last_updated": datetime.now()})
 
-        update_message("Downloading the video to temporary location")
         update_progress(0)
-        video_tmp_location = firebase_service.download_file_to_temp(short_document['short_clipped_video'])
         firebase_service.update_document('shorts', short_id, {
             "pending_operations": True
         })
 
-        update_message("Calculating Saliency")
-        saliency_map = perform_inference_on_video(model, video_tmp_location, update_progress, batch_size=16,
-                                                  skip_frames=2)
-
-        update_message("Collapsing saliency into video")
-        output_video_path = create_video_from_frames(saliency_map, video_tmp_location)
+        frame_analysis = short_document.get('frame_analysis', {})
+        if (frame_analysis.get('video') == short_document['short_clipped_video'] and
+                'frame_cache' in frame_analysis and frame_analysis.get('frame_cache_skip_frames') == 2):
+            # Downscaled frames were cached when the short was clipped, so the video isn't decoded again
+            update_message("Downloading the cached video frames")
+            frame_cache_location = firebase_service.download_file_to_temp(frame_analysis['frame_cache'])
+
+            update_message("Calculating Saliency")
+            frame_count = frame_analysis['frame_cache_frames']
+            saliency_maps = perform_inference_on_frames(model, read_frame_cache(frame_cache_location, frame_count),
+                                                        frame_count, update_progress, batch_size=16)
+            output_video_path = create_video_from_frames(saliency_maps, None, skip_frames=2, video_metadata={
+                "fps": short_document['fps'],
+                "width": short_document['width'],
+                "height": short_document['height'],
+            })
+            os.remove(frame_cache_location)
+            # The cache has served its purpose, only the clipped video is kept
+            firebase_service.delete_file(frame_analysis['frame_cache'])
+            firebase_service.update_document('shorts', short_id, {"frame_analysis": {"video": frame_analysis['video']}})
+        else:
+            update_message("Downloading the video to temporary location")
+            video_tmp_location = firebase_service.download_file_to_temp(short_document['short_clipped_video'])
+
+            update_message("Calculating Saliency")
+            # Saliency maps are generated lazily, so each batch is written to the video as soon as it is ready
+            saliency_maps = perform_inference_on_video(model, video_tmp_location, update_progress, batch_size=16,
+                                                       skip_frames=2)
+            output_video_path = create_video_from_frames(saliency_maps, video_tmp_location)
 
         update_message("Updating document")
         short_video_path = short_document['short_clipped_video']
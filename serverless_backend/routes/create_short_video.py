@@ -1,6 +1,5 @@
 import ast
 
-from firebase_admin import firestore
 from flask import Blueprint, jsonify
 
 from serverless_backend.routes.extract_segment_from_video import crop_video_to_segment
@@ -8,9 +7,12 @@ from serverless_backend.services.firebase import FirebaseService
 from datetime import datetime
 import tempfile
 import os
+import json
 from serverless_backend.services.handle_operations_from_logs import handle_operations_from_logs
 from serverless_backend.services.parse_segment_words import parse_segment_words
+from serverless_backend.services.video_analyser.video_analyser import VideoAnalyser
 from serverless_backend.services.video_clipper import VideoClipper
+from serverless_backend.services.progress_reporter import ProgressReporter
 
 
 # Routes
@@ -44,7 +46,9 @@ def print_file_size(file_path):
 @create_short_video.route("/v1/create-short-video/<request_id>", methods=['GET'])
 def generate_short_video(request_id):
     firebase_service = FirebaseService()
+    progress_reporter = None
     video_clipper = VideoClipper()
+    video_analyser = VideoAnalyser()
 
     try:
         request_doc = firebase_service.get_document("requests", request_id)
@@ -62,16 +66,9 @@ def generate_short_video(request_id):
         segment_id = short_document['segment_id']
         segment_document = firebase_service.get_document("topical_segments", segment_id)
 
-        def update_progress(progress):
-            firebase_service.update_document("shorts", short_id, {"update_progress": progress})
-            firebase_service.update_document("requests", request_id, {"progress": progress})
-
-        def update_message(message):
-            firebase_service.update_document("shorts", short_id, {
-                "progress_message": message,
-                "last_updated": firestore.firestore.SERVER_TIMESTAMP
-            })
-            firebase_service.update_message(request_id, message)
+        progress_reporter = ProgressReporter(firebase_service, request_id, short_id)
+        update_progress = progress_reporter.update_progress
+        update_message = progress_reporter.update_message
 
         firebase_service.update_document("shorts", short_id, {"pending_operation": True})
         update_message("Getting Documents")
@@ -95,9 +92,9 @@ def generate_short_video(request_id):
                 return response, status_code
 
         firebase_service.update_document("shorts", short_id, {"pending_operation": True})
-        input_path = firebase_service.download_file_to_temp(video_path)
+        # FFmpeg reads the segment video with range requests rather than after a full download
+        input_path = firebase_service.get_ranged_source(video_path)
         video_duration = video_clipper.get_video_duration(input_path)
-        print_file_size(input_path)
         update_progress(20)
 
         update_message("Loading Operations")
@@ -135,21 +132,47 @@ def generate_short_video(request_id):
         video_clipper.delete_segments_from_video(input_path, merge_cuts, output_path, update_progress_time)
         print_file_size(output_path)
 
-        update_message("Uploading clipped video to short location")
+        update_message("Analysing clipped video frames")
+        # One decode of the clipped video gives the frame differences, metadata and saliency input frames,
+        # so saliency and determine-boundaries don't need to decode it again
+        analysis = video_analyser.analyse_video(output_path, lambda x: update_progress(80 + 5 * (x / 100)))
         destination_blob_name = "short-video/" + short_id + "-" + "".join(video_path.split("/")[1:])
+        frame_analysis = {"video": destination_blob_name}
+        # The cache only saves the saliency endpoint work if it's smaller to fetch than the clip itself
+        if os.path.getsize(analysis['frame_cache_path']) < os.path.getsize(output_path):
+            frame_cache_blob_name = "short-frame-cache/" + short_id + ".mp4"
+            firebase_service.upload_file_from_temp(analysis['frame_cache_path'], frame_cache_blob_name)
+            frame_analysis.update({
+                "frame_cache": frame_cache_blob_name,
+                "frame_cache_frames": analysis['frame_cache_frames'],
+                "frame_cache_skip_frames": analysis['frame_cache_skip_frames'],
+            })
+        else:
+            os.remove(analysis['frame_cache_path'])
+        # A cache left from an earlier clip of this short no longer matches its video
+        previous_frame_cache = short_document.get('frame_analysis', {}).get('frame_cache')
+        if previous_frame_cache and previous_frame_cache != frame_analysis.get('frame_cache'):
+            firebase_service.delete_file(previous_frame_cache)
+
+        update_message("Uploading clipped video to short location")
         firebase_service.upload_file_from_temp(output_path, destination_blob_name)
         update_progress(90)
 
         update_message("Updating short document")
-        firebase_service.update_document("shorts", short_id, {"short_clipped_video": destination_blob_name})
+        firebase_service.update_document("shorts", short_id, {
+            "short_clipped_video": destination_blob_name,
+            "frame_analysis": frame_analysis,
+            "visual_difference": json.dumps({"frame_differences": analysis['differences']}),
+            "total_frame_count": analysis['total_frames'],
+            "fps": analysis['fps'],
+            "height": analysis['height'],
+            "width": analysis['width'],
+        })
         update_progress(95)
 
         update_message("Clean up...")
         update_progress(100)
 
-        if os.path.exists(input_path):
-            os.remove(input_path)
-
         update_message("Short video creation completed successfully")
         firebase_service.create_short_request(
             "v1/get_saliency_for_short",
@@ -180,3 +203,6 @@ def generate_short_video(request_id):
             },
             "message": error_message
         }), 500
+    finally:
+        if progress_reporter:
+            progress_reporter.close()
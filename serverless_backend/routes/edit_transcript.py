@@ -11,6 +11,8 @@ from serverless_backend.services.langchain_chains.title_generator_chain import t
 from serverless_backend.services.text_to_speech.eleven_labs_tts_service import generate_ai_voiceover
 from serverless_backend.services.verify_video_document import parse_and_verify_short
 from serverless_backend.services.parse_segment_words import parse_segment_words
+from serverless_backend.services.progress_reporter import ProgressReporter
+from serverless_backend.services.span_planner import SpanPlanner
 from datetime import datetime
 import uuid
 
@@ -60,6 +62,7 @@ def generate_contextual_intro(short_document: Dict, transcript: str, update_prog
 @edit_transcript.route("/v1/temporal-segmentation/<request_id>", methods=['GET'])
 def perform_temporal_segmentation(request_id):
     firebase_service = FirebaseService()
+    progress_reporter = None
     try:
         request_doc = firebase_service.get_document("requests", request_id)
         if not request_doc:
@@ -110,16 +113,9 @@ def perform_temporal_segmentation(request_id):
 
         firebase_service.update_document("shorts", short_id, {"pending_operation": True})
 
-        def update_progress(progress):
-            firebase_service.update_document('shorts', short_id, {'update_progress': progress})
-            firebase_service.update_document("requests", request_id, {"progress": progress})
-
-        def update_message(message):
-            firebase_service.update_document('shorts', short_id, {
-                'progress_message': message,
-                'last_updated': firestore.firestore.SERVER_TIMESTAMP
-            })
-            firebase_service.update_message(request_id, message)
+        progress_reporter = ProgressReporter(firebase_service, request_id, short_id)
+        update_progress = progress_reporter.update_progress
+        update_message = progress_reporter.update_message
 
         update_message("Starting temporal segmentation")
         update_progress(0)
@@ -278,32 +274,15 @@ def perform_temporal_segmentation(request_id):
             },
             "message": "Failed to process temporal segmentation"
         }), 500
+    finally:
+        if progress_reporter:
+            progress_reporter.close()
 
 
-def adjust_timestamps(words):
-    if not words:
-        return []
-
-    adjusted_words = []
-    cumulative_deleted_duration = 0
-    previous_end_time = words[0]['start_time']
-
-    for word in words:
-        # Calculate the gap between this word and the previous one
-        gap = word['start_time'] - previous_end_time
-
-        # If there's a gap, it means words were deleted
-        if gap > 0:
-            cumulative_deleted_duration += gap
-
-        adjusted_word = word.copy()
-        adjusted_word['start_time'] = word['start_time'] - words[0]['start_time'] - cumulative_deleted_duration
-        adjusted_word['end_time'] = word['end_time'] - words[0]['start_time'] - cumulative_deleted_duration
-
-        adjusted_words.append(adjusted_word)
-        previous_end_time = word['end_time']
-
-    return adjusted_words
+def adjust_timestamps(words, span_planner=None):
+    # Time the words on the short as it is cut, which keeps the gaps the span planner merges over
+    span_planner = span_planner or SpanPlanner()
+    return span_planner.retime_words(words)
 
 
 def generate_lines(words, max_words_per_line=3):
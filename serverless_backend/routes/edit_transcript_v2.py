@@ -7,12 +7,15 @@ from serverless_backend.services.parse_segment_words import parse_segment_words
 from serverless_backend.services.langchain_chains.edit_transcript.find_hook_chain import hook_chain
 from serverless_backend.services.langchain_chains.edit_transcript.transcript_boundaries_chain import transcript_boundaries_chain
 from serverless_backend.services.langchain_chains.edit_transcript.unnecessary_segments_chain import unnecessary_segments_chain
+from serverless_backend.services.progress_reporter import ProgressReporter
+from serverless_backend.services.span_planner import SpanPlanner
 
 edit_transcript_v2 = Blueprint("edit_transcript_v2", __name__)
 
 @edit_transcript_v2.route("/v2/temporal-segmentation/<request_id>", methods=['GET'])
 def perform_temporal_segmentation_v2(request_id):
     firebase_service = FirebaseService()
+    progress_reporter = None
     try:
         request_doc = firebase_service.get_document("requests", request_id)
         if not request_doc:
@@ -63,16 +66,9 @@ def perform_temporal_segmentation_v2(request_id):
 
         firebase_service.update_document("shorts", short_id, {"pending_operation": True})
 
-        def update_progress(progress):
-            firebase_service.update_document('shorts', short_id, {'update_progress': progress})
-            firebase_service.update_document("requests", request_id, {"progress": progress})
-
-        def update_message(message):
-            firebase_service.update_document('shorts', short_id, {
-                'progress_message': message,
-                'last_updated': firestore.firestore.SERVER_TIMESTAMP
-            })
-            firebase_service.update_message(request_id, message)
+        progress_reporter = ProgressReporter(firebase_service, request_id, short_id)
+        update_progress = progress_reporter.update_progress
+        update_message = progress_reporter.update_message
 
         update_message("Starting temporal segmentation v2")
         update_progress(0)
@@ -202,31 +198,14 @@ def perform_temporal_segmentation_v2(request_id):
             },
             "message": "Failed to process temporal segmentation v2"
         }), 500
-
-def adjust_timestamps(words):
-    if not words:
-        return []
-
-    adjusted_words = []
-    cumulative_deleted_duration = 0
-    previous_end_time = words[0]['start_time']
-
-    for word in words:
-        # Calculate the gap between this word and the previous one
-        gap = word['start_time'] - previous_end_time
-
-        # If there's a gap, it means words were deleted
-        if gap > 0:
-            cumulative_deleted_duration += gap
-
-        adjusted_word = word.copy()
-        adjusted_word['start_time'] = word['start_time'] - words[0]['start_time'] - cumulative_deleted_duration
-        adjusted_word['end_time'] = word['end_time'] - words[0]['start_time'] - cumulative_deleted_duration
-
-        adjusted_words.append(adjusted_word)
-        previous_end_time = word['end_time']
-
-    return adjusted_words
+    finally:
+        if progress_reporter:
+            progress_reporter.close()
+
+def adjust_timestamps(words, span_planner=None):
+    # Time the words on the short as it is cut, which keeps the gaps the span planner merges over
+    span_planner = span_planner or SpanPlanner()
+    return span_planner.retime_words(words)
 
 def generate_lines(words, max_words_per_line=3):
     lines = []
@@ -45,17 +45,17 @@ def crop_video_to_segment(segment_id):
         end_cut = words[-1]['end_time']
         video_path = video_document['videoPath']
 
-        # 1) Load in video to memory
+        # 1) Open the video for ranged reads, FFmpeg fetches the moov atom and the segment's byte ranges only
         update_progress_message("Getting video stream")
         update_progress(20)
-        input_path = firebase_service.download_file_to_temp(video_document['videoPath'])
-        print_file_size(input_path)
+        input_path = firebase_service.get_ranged_source(video_document['videoPath'])
 
         # 2) Clip video to segment
         update_progress_message("Creating temporary video segment")
         update_progress(40)
         _, output_path = tempfile.mkstemp(suffix='.mp4')  # Ensure it's an mp4 file
-        video_clipper.clip_video(input_path, begin_cut, end_cut, output_path)
+        # Only the partial GOPs at either end are re-encoded, the rest of the segment is stream copied
+        video_clipper.clip_video(input_path, begin_cut, end_cut, output_path, mode="smart")
 
         print_file_size(output_path)
 
@@ -71,8 +71,6 @@ def crop_video_to_segment(segment_id):
         firebase_service.update_document("topical_segments", segment_id, {"video_segment_location": destination_blob_name})
 
         # 5) Cleanup
-        if os.path.exists(input_path):
-            os.remove(input_path)
         if os.path.exists(output_path):
             os.remove(output_path)
 
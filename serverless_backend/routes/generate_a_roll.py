@@ -4,7 +4,6 @@ import tempfile
 import json
 from datetime import datetime
 
-from firebase_admin import firestore
 from flask import Blueprint, jsonify
 
 from serverless_backend.routes.generate_test_audio import generate_test_audio_for_short
@@ -12,12 +11,14 @@ from serverless_backend.routes.spacial_segmentation import add_audio_to_video
 from serverless_backend.services.firebase import FirebaseService
 from serverless_backend.services.verify_video_document import parse_and_verify_short
 from serverless_backend.services.bounding_box_generator.video_cropper import VideoCropper
+from serverless_backend.services.progress_reporter import ProgressReporter
 
 generate_a_roll = Blueprint("generate_a_roll", __name__)
 
 @generate_a_roll.route("/v1/generate-a-roll/<request_id>", methods=['GET'])
 def generate_a_roll_short(request_id):
     firebase_services = FirebaseService()
+    progress_reporter = None
     request_doc = firebase_services.get_document("requests", request_id)
     if not request_doc:
         return jsonify({"status": "error", "message": "Request not found"}), 404
@@ -32,16 +33,9 @@ def generate_a_roll_short(request_id):
         if not short_doc:
             return jsonify({"status": "error", "message": "Short document not found"}), 404
 
-        def update_progress(progress):
-            firebase_services.update_document("shorts", short_id, {"update_progress": progress})
-            firebase_services.update_document("requests", request_id, {"progress": progress})
-
-        def update_message(message):
-            firebase_services.update_document("shorts", short_id, {
-                "progress_message": message,
-                "last_updated": firestore.firestore.SERVER_TIMESTAMP
-            })
-            firebase_services.update_message(request_id, message)
+        progress_reporter = ProgressReporter(firebase_services, request_id, short_id)
+        update_progress = progress_reporter.update_progress
+        update_message = progress_reporter.update_message
 
         auto_generate = short_doc.get('auto_generate', False)
         background_video_path = short_doc.get('background_video_path', 'background-gameplay/Clip11.mp4')
@@ -176,3 +170,6 @@ def generate_a_roll_short(request_id):
             },
             "message": error_message
         }), 500
+    finally:
+        if progress_reporter:
+            progress_reporter.close()
@@ -3,15 +3,16 @@ import tempfile
 from io import BytesIO
 import random
 
-from firebase_admin import firestore
 from flask import Blueprint, jsonify
 from serverless_backend.services.firebase import FirebaseService
 from serverless_backend.services.handle_operations_from_logs import handle_operations_from_logs
-from pydub import AudioSegment
 from datetime import datetime
 
+from serverless_backend.services.audio_assembler import assemble_audio_spans
 from serverless_backend.services.parse_segment_words import parse_segment_words
 from serverless_backend.services.verify_video_document import parse_and_verify_short, parse_and_verify_video, parse_and_verify_segment
+from serverless_backend.services.progress_reporter import ProgressReporter
+from serverless_backend.services.span_planner import SpanPlanner
 
 generate_test_audio = Blueprint("generate_test_audio", __name__)
 
@@ -19,6 +20,7 @@ generate_test_audio = Blueprint("generate_test_audio", __name__)
 @generate_test_audio.route("/v1/generate-test-audio/<request_id>", methods=['GET'])
 def generate_test_audio_for_short(request_id, function_called=False):
     firebase_service = FirebaseService()
+    progress_reporter = None
     try:
         request_doc = firebase_service.get_document("requests", request_id)
         if not request_doc:
@@ -35,16 +37,9 @@ def generate_test_audio_for_short(request_id, function_called=False):
         # Update request log to indicate process initiation
         firebase_service.update_message(request_id, "Test audio generation process initiated")
 
-        def update_progress(progress):
-            firebase_service.update_document("shorts", short_id, {"update_progress": progress})
-            firebase_service.update_document("requests", request_id, {"progress": progress})
-
-        def update_message(message):
-            firebase_service.update_document("shorts", short_id, {
-                "progress_message": message,
-                "last_updated": firestore.firestore.SERVER_TIMESTAMP
-            })
-            firebase_service.update_message(request_id, message)
+        progress_reporter = ProgressReporter(firebase_service, request_id, short_id)
+        update_progress = progress_reporter.update_progress
+        update_message = progress_reporter.update_message
 
         auto_generate = short_document.get('auto_generate', False)
 
@@ -148,29 +143,17 @@ def generate_test_audio_for_short(request_id, function_called=False):
         if not input_extension:
             input_extension = '.mp4'  # Default to .mp4 if no extension is found
 
-        # Download the entire file to a temporary location on disk
-        with tempfile.NamedTemporaryFile(delete=False, suffix=input_extension) as temp_file:
-            firebase_service.download_file(audio_file, temp_file.name)
-            local_audio_path = temp_file.name
-
-        update_message("Audio file downloaded to local storage")
+        # Merge tiny gaps the same way the short's video is cut, then read only those spans of the source
+        # audio into one buffer, cross-fading the joins. The blob is read with range requests, so only the
+        # header and the kept spans of a WAV source are fetched.
+        span_planner = SpanPlanner()
+        spans = span_planner.merge([(word['start_time'], word['end_time']) for word in words_to_handle])
+        spans = [(int(start * 1000), int(end * 1000)) for start, end in spans]
+        update_message(f"Assembling {len(spans)} spans from {len(words_to_handle)} words")
         update_progress(40)
-        print(local_audio_path)
-
-        # Process audio in chunks
-        combined_audio = AudioSegment.empty()
-        audio = AudioSegment.from_file(local_audio_path, format=input_extension[1:])
-
-        for i, word in enumerate(words_to_handle):
-            start_time = int(word['start_time'] * 1000)
-            end_time = int(word['end_time'] * 1000)
-
-            segment = audio[start_time:end_time]
-            combined_audio += segment
-
-            progress = 40 + (i / len(words_to_handle) * 50)
-            update_progress(progress)
-            update_message(f"Processed segment {i + 1}/{len(words_to_handle)}")
+        with firebase_service.open_blob(audio_file) as audio_source:
+            combined_audio = assemble_audio_spans(audio_source, spans, audio_format=input_extension[1:],
+                                                  span_planner=span_planner)
 
         update_progress(90)
         update_message("Finalizing audio")
@@ -199,10 +182,6 @@ def generate_test_audio_for_short(request_id, function_called=False):
         update_message("Test audio generation completed successfully")
 
 
-        # Clean up
-        os.unlink(local_audio_path)
-
-
         if auto_generate and not function_called:
             firebase_service.create_short_request(
                 "v1/generate-intro",
@@ -234,4 +213,7 @@ def generate_test_audio_for_short(request_id, function_called=False):
                 "error": str(e)
             },
             "message": "Failed to generate audio for clip"
-        }), 500
\ No newline at end of file
+        }), 500
+    finally:
+        if progress_reporter:
+            progress_reporter.close()
\ No newline at end of file
@@ -1,6 +1,6 @@
-from firebase_admin import firestore
 from flask import Blueprint, jsonify
 from serverless_backend.services.firebase import FirebaseService
+from serverless_backend.services.progress_reporter import ProgressReporter
 import requests
 import json
 import os
@@ -11,6 +11,7 @@ short_saliency = Blueprint("get_saliency_for_short", __name__)
 @short_saliency.route("/v1/get_saliency_for_short/<request_id>", methods=['GET'])
 def get_saliency_for_short(request_id):
     firebase_service = FirebaseService()
+    progress_reporter = None
     try:
         request_doc = firebase_service.get_document("requests", request_id)
         if not request_doc:
@@ -24,16 +25,9 @@ def get_saliency_for_short(request_id):
         if not short_document:
             return jsonify({"status": "error", "message": "Short document not found"}), 404
 
-        def update_progress(progress):
-            firebase_service.update_document("shorts", short_id, {"update_progress": progress})
-            firebase_service.update_document("requests", request_id, {"progress": progress})
-
-        def update_message(message):
-            firebase_service.update_document("shorts", short_id, {
-                "progress_message": message,
-                "last_updated": firestore.firestore.SERVER_TIMESTAMP
-            })
-            firebase_service.update_message(request_id, message)
+        progress_reporter = ProgressReporter(firebase_service, request_id, short_id)
+        update_progress = progress_reporter.update_progress
+        update_message = progress_reporter.update_message
 
         firebase_service.update_document("shorts", short_id, {"pending_operation": True})
 
@@ -104,3 +98,6 @@ def get_saliency_for_short(request_id):
             },
             "message": error_message
         }), 500
+    finally:
+        if progress_reporter:
+            progress_reporter.close()
@@ -2,15 +2,14 @@ from serverless_backend.services.bounding_box_services import smooth_bounding_bo
 from serverless_backend.services.bounding_box_generator.bounding_boxes import BoundingBoxGenerator
 from serverless_backend.services.verify_video_document import parse_and_verify_short
 from serverless_backend.services.add_text_to_video_service import AddTextToVideoService
-from serverless_backend.services.video_audio_merger import VideoAudioMerger
+from serverless_backend.services.render_graph import RenderGraph
 from serverless_backend.services.email.brevo_email_service import EmailService
 from serverless_backend.services.firebase import FirebaseService
 from serverless_backend.services.video_analyser.video_analyser import VideoAnalyser
-from firebase_admin import auth, firestore
+from serverless_backend.services.progress_reporter import ProgressReporter
+from firebase_admin import auth
 from flask import Blueprint, jsonify
 
-from serverless_backend.services.video_merger import combine_videos
-
 
 def get_user_email(uid):
     try:
@@ -26,6 +25,7 @@ spacial_segmentation = Blueprint("spacial_segmentation", __name__)
 @spacial_segmentation.route("/v1/determine-boundaries/<request_id>", methods=['GET'])
 def determine_boundaries(request_id):
     firebase_services = FirebaseService()
+    progress_reporter = None
     video_analyser = VideoAnalyser()
 
     try:
@@ -41,16 +41,9 @@ def determine_boundaries(request_id):
         if not short_doc:
             return jsonify({"status": "error", "message": "Short document not found"}), 404
 
-        def update_progress(progress):
-            firebase_services.update_document("shorts", short_id, {"update_progress": progress})
-            firebase_services.update_document("requests", request_id, {"progress": progress})
-
-        def update_message(message):
-            firebase_services.update_document("shorts", short_id, {
-                "progress_message": message,
-                "last_updated": firestore.firestore.SERVER_TIMESTAMP
-            })
-            firebase_services.update_message(request_id, message)
+        progress_reporter = ProgressReporter(firebase_services, request_id, short_id)
+        update_progress = progress_reporter.update_progress
+        update_message = progress_reporter.update_message
 
         update_message("Retrieved the document")
         firebase_services.update_document("shorts", short_id, {"pending_operation": True})
@@ -90,11 +83,18 @@ def determine_boundaries(request_id):
             }), 400
 
         update_progress(50)
-        update_message("Getting temporary file")
-        temp_file = firebase_services.download_file_to_temp(video_path)
-        update_progress_diff = lambda x: update_progress(50 + 50 * (x/100))
-        update_message("Calculating frame difference")
-        diff, last_frame, fps, height, width = video_analyser.get_differences(temp_file, update_progress_diff)
+        if short_doc.get('frame_analysis', {}).get('video') == video_path and 'visual_difference' in short_doc:
+            # The clipped video was already analysed in the same decode pass that created it
+            update_message("Using frame differences from video analysis")
+            diff = json.loads(short_doc['visual_difference'])['frame_differences']
+            last_frame = short_doc['total_frame_count']
+            fps, height, width = short_doc['fps'], short_doc['height'], short_doc['width']
+        else:
+            update_message("Getting temporary file")
+            temp_file = firebase_services.download_file_to_temp(video_path)
+            update_progress_diff = lambda x: update_progress(50 + 50 * (x/100))
+            update_message("Calculating frame difference")
+            diff, last_frame, fps, height, width = video_analyser.get_differences_fast(temp_file, update_progress_diff)
         cuts = video_analyser.get_camera_cuts(diff)
         update_message("Completed Download")
 
@@ -151,12 +151,16 @@ def determine_boundaries(request_id):
             },
             "message": error_message
         }), 500
+    finally:
+        if progress_reporter:
+            progress_reporter.close()
 
 
 
 @spacial_segmentation.route("/v1/get-bounding-boxes/<request_id>", methods=['GET'])
 def get_bounding_boxes(request_id):
     firebase_services = FirebaseService()
+    progress_reporter = None
     try:
         request_doc = firebase_services.get_document("requests", request_id)
         if not request_doc:
@@ -170,18 +174,12 @@ def get_bounding_boxes(request_id):
         if not short_doc:
             return jsonify({"status": "error", "message": "Short document not found"}), 404
 
-        bounding_box_generator = BoundingBoxGenerator(step_size=10)
-
-        def update_progress(progress):
-            firebase_services.update_document("shorts", short_id, {"update_progress": progress})
-            firebase_services.update_document("requests", request_id, {"progress": progress})
+        bounding_box_generator = BoundingBoxGenerator(step_size=10, temporal_warm_start=True,
+                                                      workers=int(os.getenv('BOUNDING_BOX_WORKERS', 4)))
 
-        def update_message(message):
-            firebase_services.update_document("shorts", short_id, {
-                "progress_message": message,
-                "last_updated": firestore.firestore.SERVER_TIMESTAMP
-            })
-            firebase_services.update_message(request_id, message)
+        progress_reporter = ProgressReporter(firebase_services, request_id, short_id)
+        update_progress = progress_reporter.update_progress
+        update_message = progress_reporter.update_message
 
         auto_generate = short_doc.get('auto_generate', False)
         selected_box_type = short_doc.get('selected_box_type', 'standard_tiktok')
@@ -221,7 +219,8 @@ def get_bounding_boxes(request_id):
         update_message("Generating bounding boxes")
         update_temp_progress = lambda x: update_progress(30 + 40 * (x/100))
 
-        all_bounding_boxes = bounding_box_generator.generate_bounding_boxes(short_video_saliency, update_temp_progress, skip_frames=2)
+        all_bounding_boxes = bounding_box_generator.generate_bounding_boxes(short_video_saliency, update_temp_progress,
+                                                                             skip_frames=2, cuts=cuts)
 
         update_message("Interpolating and smoothing bounding boxes within camera cuts")
         update_progress(70)
@@ -288,6 +287,9 @@ def get_bounding_boxes(request_id):
             "data": {"request_id": request_id, "short_id": short_id, "error": str(e)},
             "message": error_message
         }), 500
+    finally:
+        if progress_reporter:
+            progress_reporter.close()
 
 
 def merge_consecutive_cuts(cuts):
@@ -373,6 +375,7 @@ def add_audio_to_video(video_path, audio_path):
 @spacial_segmentation.route("/v1/create-cropped-video/<request_id>", methods=['GET'])
 def create_cropped_video(request_id):
     firebase_service = FirebaseService()
+    progress_reporter = None
     try:
         request_doc = firebase_service.get_document("requests", request_id)
         if not request_doc:
@@ -387,18 +390,10 @@ def create_cropped_video(request_id):
             return jsonify({"status": "error", "message": "Short document not found"}), 404
 
         text_service = AddTextToVideoService()
-        video_audio_merger = VideoAudioMerger()
-
-        def update_progress(progress):
-            firebase_service.update_document("shorts", short_id, {"update_progress": progress})
-            firebase_service.update_document("requests", request_id, {"progress": progress})
 
-        def update_message(message):
-            firebase_service.update_document("shorts", short_id, {
-                "progress_message": message,
-                "last_updated": firestore.firestore.SERVER_TIMESTAMP
-            })
-            firebase_service.update_message(request_id, message)
+        progress_reporter = ProgressReporter(firebase_service, request_id, short_id)
+        update_progress = progress_reporter.update_progress
+        update_message = progress_reporter.update_message
 
         update_temp_progress = lambda x, start, length: update_progress(start + (length * (x / 100)))
 
@@ -527,29 +522,29 @@ def create_cropped_video(request_id):
                 'offset': (0, 0.05)  # Changed as per your test script
             })
 
-        # Process video with all text additions in one pass
-        update_message("Adding text to video")
-        output_path = text_service.process_video_with_text(input_path, text_additions)
-        update_progress(70)
+        # Text, voice track, background music and intro are all rendered in one encode
+        render_graph = RenderGraph(input_path, text_service=text_service).add_text(text_additions)
 
         update_message("Adding audio now")
         short_doc = firebase_service.get_document("shorts", short_id)
 
         audio_path = firebase_service.download_file_to_temp(short_doc['temp_audio_file'],
                                                             short_doc['temp_audio_file'].split(".")[-1])
-        output_path = add_audio_to_video(output_path, audio_path)
+        render_graph.set_voice_track(audio_path)
 
         if "background_audio" in short_doc.keys():
             background_audio = firebase_service.get_document("stock-audio", short_doc['background_audio'])
             temp_audio_location = firebase_service.download_file_to_temp(background_audio['storageLocation'])
-            output_path = video_audio_merger.merge_audio_to_video(output_path, temp_audio_location,
-                                                                  short_doc['background_percentage'])
+            render_graph.add_background_music(temp_audio_location, short_doc['background_percentage'])
 
         if "intro_video_path" in short_doc.keys():
             update_message("Adding intro video")
-            update_progress(80)
             intro_video_path = firebase_service.download_file_to_temp(short_doc['intro_video_path'])
-            output_path = combine_videos(intro_video_path, output_path)
+            render_graph.prepend_intro(intro_video_path)
+
+        update_message("Rendering video with text and audio")
+        output_path = render_graph.render(lambda x: update_temp_progress(x, 70, 20))
+        os.remove(input_path)
 
         # Create an output path
         update_message("Added output path to short location")
@@ -597,3 +592,6 @@ def create_cropped_video(request_id):
             },
             "message": error_message
         }), 500
+    finally:
+        if progress_reporter:
+            progress_reporter.close()
@@ -1,5 +1,6 @@
+import struct
 import subprocess
-from tempfile import NamedTemporaryFile
+from tempfile import NamedTemporaryFile, TemporaryFile
 import os
 from flask import Blueprint, jsonify
 from serverless_backend.services.verify_video_document import parse_and_verify_video
@@ -37,6 +38,53 @@ def extract_audio_from_video(video_bytes):
     return audio_bytes
 
 
+def wav_header(data_size, sample_rate=16000, channels=1, sample_width=2):
+    """44 byte PCM WAV header for data_size bytes of audio."""
+    block_align = channels * sample_width
+    return struct.pack('<4sI4s4sIHHIIHH4sI', b'RIFF', 36 + data_size, b'WAVE', b'fmt ', 16, 1, channels,
+                       sample_rate, sample_rate * block_align, block_align, sample_width * 8, b'data', data_size)
+
+
+def stream_audio_from_video(firebase_service, video_blob_name, audio_blob_name):
+    """
+    Streaming version of extract_audio_from_video. FFmpeg reads the video with range requests and writes raw
+    PCM to stdout, which is uploaded in parts as it arrives and given its WAV header once the length is
+    known. Neither the video nor the audio is ever held in memory whole, so memory use doesn't grow with the
+    length of the video.
+    """
+    command = [
+        'ffmpeg',
+        '-v', 'error',
+        '-i', firebase_service.get_ranged_source(video_blob_name),
+        '-vn',
+        '-acodec', 'pcm_s16le',  # Use Linear PCM format
+        '-ar', '16000',  # Set sample rate to 16000 Hz
+        '-ac', '1',  # Set audio channels to mono
+        '-f', 's16le',  # Raw samples, the header is written after the upload
+        'pipe:1'
+    ]
+
+    with TemporaryFile() as stderr_file:
+        process = subprocess.Popen(command, stdout=subprocess.PIPE, stderr=stderr_file)
+        try:
+            stats = firebase_service.transfer.upload_stream(process.stdout, audio_blob_name, header=wav_header,
+                                                            content_type='audio/wav')
+        except BaseException:
+            process.kill()
+            process.wait()
+            raise
+        finally:
+            process.stdout.close()
+
+        if process.wait() != 0:
+            # Don't leave a truncated WAV behind
+            firebase_service.range_backend.delete(audio_blob_name)
+            stderr_file.seek(0)
+            raise RuntimeError(f"FFmpeg failed to extract audio: {stderr_file.read().decode(errors='replace')}")
+
+    return stats
+
+
 split_video_and_audio = Blueprint('split_video_and_audio', __name__)
 
 @split_video_and_audio.route('/v1/split-video/<video_id>', methods=['GET'])
@@ -50,13 +98,9 @@ def split_video_to_audio_and_video(video_id: str):
         print("Updated document ")
         file_storage_path = video_document['videoPath']
 
-        # Download the video
-        video_downloaded = firebase_service.download_file_to_memory(file_storage_path)
-        audio_bytes = extract_audio_from_video(video_downloaded)
-        firebase_service.update_document('videos', video_id,
-                                         {'progressMessage': "Audio split - uploading to firebase."})
+        # Stream the audio track from the stored video straight into the audio blob
         audio_blob_name = "audio/" + video_document['originalFileName'].replace('.mp4', '_audio.wav')
-        firebase_service.upload_audio_file_from_memory(audio_blob_name, audio_bytes)
+        stream_audio_from_video(firebase_service, file_storage_path, audio_blob_name)
         firebase_service.update_document('videos', video_id, {
             'processingProgress': 50,
             'audio_path': audio_blob_name
@@ -3,6 +3,7 @@ from flask import Blueprint, jsonify
 from serverless_backend.services.email.brevo_email_service import EmailService
 from serverless_backend.services.firebase import FirebaseService
 from serverless_backend.services.open_ai import OpenAIService
+from serverless_backend.services.segment_summariser import SegmentSummariser
 from firebase_admin import auth
 
 from serverless_backend.services.vector_db.ziliz import ZilizVectorDB
@@ -73,42 +74,20 @@ def summarise_segments_for_transcript(video_id):
             segments = firebase_service.query_topical_segments_by_video_id(video_id)
             print(segments)
             update_progress_message("Retrieved Segments, Summarising...")
-            previous_segment_summary = ""
-            for index, segment in enumerate(segments):
-                update_progress((index+1) / len(segments) * 100)
-                summary = open_ai_service.get_segment_summary(segment['index'], segment['transcript'], previous_segment_summary)
-                content_moderation = open_ai_service.extract_moderation_metrics(segment['transcript'])
-                segment_summary = summary['segment_summary']
-                previous_segment_summary = summary.get("new_combined_summary", previous_segment_summary)
-                segment_title = summary.get('segment_title', "Unable to name segment")
-                update_progress_message("Description: " + segment_summary[:20] + "...")
-                firebase_service.update_document("topical_segments", segment["id"],
-                                                 {
-                                                    'segment_summary': segment_summary,
-                                                    'segment_title': segment_title,
-                                                    'segment_status': "Segment Summarised",
-                                                    'flagged': content_moderation['flagged'],
-                                                    "harassment": content_moderation["harassment"],
-                                                    "harassment_threatening": content_moderation["harassment_threatening"],
-                                                    "hate": content_moderation['hate'],
-                                                    "hate_threatening": content_moderation["hate_threatening"],
-                                                    "self_harm": content_moderation["self_harm"],
-                                                    "self_harm_intent": content_moderation['self_harm_intent'],
-                                                    "sexual": content_moderation['sexual'],
-                                                    "sexual_minors": content_moderation['sexual_minors'],
-                                                  })
-                segment['segment_summary'] = segment_summary
-                segment['segment_title'] = segment_title
-                segment_text = ziliz_vector_db.generate_segment_text(segment)
-                ziliz_vector_db.get_embedding_and_upload_to_segments(segment_text, segment['id'], segment['video_id'], video_document['channelId'])
-
+            # Segments are summarised, moderated and embedded concurrently, only the rolling summary is sequential
+            summariser = SegmentSummariser(open_ai_service, ziliz_vector_db)
+            updates, vector_rows, video_summary = summariser.summarise(segments, video_document['channelId'],
+                                                                       update_progress, update_progress_message)
+            firebase_service.batch_update_documents(updates)
+            ziliz_vector_db.upload_segment_embeddings(vector_rows)
 
             update_progress_message("Segments Summarised!")
 
             email_service = EmailService()
             notify_users(video_document, email_service, firebase_service)
 
-            firebase_service.update_document("videos", video_id, {'status': 'Create TikTok Ideas'})
+            firebase_service.update_document("videos", video_id, {'status': 'Create TikTok Ideas',
+                                                                   'video_summary': video_summary})
             return jsonify(
                 {
                     "status": "success",
@@ -3,7 +3,7 @@ from serverless_backend.services.verify_video_document import parse_and_verify_v
 from serverless_backend.services.firebase import FirebaseService
 from serverless_backend.services.open_ai import OpenAIService
 from flask import Blueprint, jsonify
-import json
+from serverless_backend.services.packed_words import pack_words
 
 topical_segmentation = Blueprint("topical_segmentation", __name__)
 
@@ -160,7 +160,7 @@ def create_segments(fixed_length_transcripts, boundaries, video_id, update_progr
                 'segment_status': "Topical Segment Created",
                 'previous_segment_status': "Topical Segment Created",
                 'transcript': " ".join(current_segment_transcripts),
-                'words': str(current_words)
+                'words': current_words
             }
             segments.append(segment)
 
@@ -262,7 +262,7 @@ def extract_topical_segments(video_id: str):
         segments_to_add = []
         for index, segment in enumerate(segments):
             update_progress((index + 1) / len(segments) * 100)
-            segment['words'] = json.dumps(segment['words'])  # Convert words to JSON string
+            segment['words_packed'] = pack_words(segment.pop('words'))  # Columnar binary, see packed_words
             segments_to_add.append(segment)
 
         # Use the new batch_add_documents method
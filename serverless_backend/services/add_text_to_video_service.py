@@ -1,16 +1,37 @@
 import cv2
 import os
 import tempfile
+from functools import lru_cache
 from PIL import Image, ImageDraw, ImageFont
 import numpy as np
 import subprocess
 
+from serverless_backend.services.caption_schedule import CaptionSchedule
+from serverless_backend.services.frame_sink import FrameSink
+from serverless_backend.services.text_sprite import TextSprite
+
+
+@lru_cache(maxsize=256)
+def _load_font(font_path, font_size):
+    """Loaded fonts are shared by every AddTextToVideoService in the process, by path and size."""
+    return ImageFont.truetype(font_path, font_size)
+
+
+@lru_cache(maxsize=16384)
+def _text_bbox(font_path, font_size, text):
+    return ImageDraw.Draw(Image.new('RGB', (1, 1))).textbbox((0, 0), text, font=_load_font(font_path, font_size))
+
 
 class AddTextToVideoService:
     def __init__(self):
         self.font_base_path = 'serverless_backend/assets/fonts'
         self.static_overlay = None
-        self.dynamic_overlay = None
+        self.static_sprite = None
+        self.dynamic_additions = []
+        self.caption_schedule = CaptionSchedule([])
+        # Sprites of the dynamic additions on screen, by their index in dynamic_additions
+        self.dynamic_sprites = {}
+        self.frame_size = None
 
     def _get_video_info(self, input_path):
         cap = cv2.VideoCapture(input_path)
@@ -23,24 +44,39 @@ class AddTextToVideoService:
         cap.release()
         return fps, width, height, total_frames
 
-    def _get_font(self, text, max_width, max_height, thickness, font_scale):
+    def _font_path(self, thickness):
         font_path = os.path.abspath(os.path.join(self.font_base_path, f'Montserrat-{thickness}.ttf'))
         if not os.path.exists(font_path):
             raise FileNotFoundError(f"Error: Font file not found at {font_path}")
+        return font_path
+
+    def _get_font(self, text, max_width, max_height, thickness, font_scale):
+        font_path = self._font_path(thickness)
+
+        def fits(font_size):
+            bbox = _text_bbox(font_path, font_size, text)
+            return bbox[2] - bbox[0] <= max_width and bbox[3] - bbox[1] <= max_height
 
-        font_size = int(font_scale * 20)
-        font = ImageFont.truetype(font_path, font_size)
+        # Usually the requested size fits, otherwise binary search for the largest size below it that does,
+        # text grows with the font size
+        low, high = 0, int(font_scale * 20)
+        if high > 0 and fits(high):
+            low = high
+        else:
+            high -= 1
+        while low < high:
+            middle = (low + high + 1) // 2
+            if fits(middle):
+                low = middle
+            else:
+                high = middle - 1
+        if low <= 0:
+            raise ValueError("Error: Text is too large to fit in the video")
 
-        while True:
-            bbox = ImageDraw.Draw(Image.new('RGB', (1, 1))).textbbox((0, 0), text, font=font)
-            if bbox[2] - bbox[0] <= max_width and bbox[3] - bbox[1] <= max_height:
-                break
-            font_size -= 1
-            if font_size <= 0:
-                raise ValueError("Error: Text is too large to fit in the video")
-            font = ImageFont.truetype(font_path, font_size)
+        return _load_font(font_path, low)
 
-        return font
+    def _text_bbox(self, text, font):
+        return _text_bbox(font.path, font.size, text)
 
     def _create_static_overlay(self, width, height, static_additions):
         overlay = Image.new('RGBA', (width, height), (255, 255, 255, 0))
@@ -75,71 +111,96 @@ class AddTextToVideoService:
         # Draw main text
         draw.text(position, text, font=font, fill=color)
 
-    def _process_frame(self, frame, dynamic_additions):
+    def _render_sprite(self, addition):
+        """Rasterizes one addition with its shadow and outline into a sprite cropped to its visible pixels."""
+        width, height = self.frame_size
+        position = addition['position']
+        left, top, right, bottom = self._text_bbox(addition['text'], addition['font'])
+        left, top, right, bottom = left + position[0], top + position[1], right + position[0], bottom + position[1]
+        # Room for the shadow and outline passes, which are drawn offset from the text
+        margin = max(abs(addition['shadow_offset'][0]), abs(addition['shadow_offset'][1]),
+                     addition['outline_thickness'] if addition['outline'] else 0) + 1
+        left, top = max(0, left - margin), max(0, top - margin)
+        right, bottom = min(width, right + margin), min(height, bottom + margin)
+        if right <= left or bottom <= top:
+            return None
+
+        canvas = Image.new('RGBA', (right - left, bottom - top), (255, 255, 255, 0))
+        self._draw_text_with_effects(ImageDraw.Draw(canvas),
+                                     {**addition, 'position': (position[0] - left, position[1] - top)})
+        return TextSprite.crop(np.array(canvas), left, top)
+
+    def _process_frame(self, frame, dynamic_sprites):
         # Apply pre-rendered static overlay
-        if self.static_overlay is not None:
-            alpha_channel = self.static_overlay[:, :, 3] / 255.0
-            for c in range(3):
-                frame[:, :, c] = frame[:, :, c] * (1 - alpha_channel) + self.static_overlay[:, :, c] * alpha_channel
+        if self.static_sprite is not None:
+            self.static_sprite.blend(frame)
 
         # Process dynamic additions (e.g., transcript)
-        if dynamic_additions:
-            if self.dynamic_overlay is None:
-                self.dynamic_overlay = Image.new('RGBA', (frame.shape[1], frame.shape[0]), (255, 255, 255, 0))
-            else:
-                self.dynamic_overlay.paste((255, 255, 255, 0), (0, 0, frame.shape[1], frame.shape[0]))
-
-            draw = ImageDraw.Draw(self.dynamic_overlay)
-
-            for addition in dynamic_additions:
-                self._draw_text_with_effects(draw, addition)
-
-            # Convert the overlay to numpy array and merge with the frame
-            overlay_array = np.array(self.dynamic_overlay)
-            alpha_channel = overlay_array[:, :, 3] / 255.0
-            for c in range(3):
-                frame[:, :, c] = frame[:, :, c] * (1 - alpha_channel) + overlay_array[:, :, c] * alpha_channel
+        for sprite in dynamic_sprites:
+            if sprite is not None:
+                sprite.blend(frame)
 
         return frame
 
-    def process_video_with_text(self, input_path, text_additions):
-        fps, width, height, total_frames = self._get_video_info(input_path)
-
-        static_additions, dynamic_additions = self._prepare_additions(text_additions, width, height, fps)
+    def prepare(self, text_additions, width, height, fps):
+        """Lays out the text additions for frames of the given size and pre-renders the static overlay."""
+        self.frame_size = (width, height)
+        static_additions, self.dynamic_additions = self._prepare_additions(text_additions, width, height, fps)
+        self.caption_schedule = CaptionSchedule(
+            [(addition['start_frame'], addition['end_frame']) for addition in self.dynamic_additions])
+        self.dynamic_sprites = {}
 
-        # Create static overlay once
+        # Create static overlay once, and composite only the part of it that has text
         self.static_overlay = self._create_static_overlay(width, height, static_additions)
+        self.static_sprite = TextSprite.crop(self.static_overlay)
 
-        cap = cv2.VideoCapture(input_path)
+    def render_frame(self, frame, frame_count):
+        """Draws the prepared text additions visible at frame_count onto the frame."""
+        current_indices, changed = self.caption_schedule.advance(frame_count)
 
-        with tempfile.NamedTemporaryFile(suffix='.mp4', delete=False) as output_file:
-            output_path = output_file.name
+        # Each line is rasterized once when it appears and dropped when it goes, frames where the same lines
+        # are on screen reuse the previous frame's sprites as they are
+        if changed:
+            self.dynamic_sprites = {
+                index: self.dynamic_sprites[index] if index in self.dynamic_sprites
+                else self._render_sprite(self.dynamic_additions[index])
+                for index in current_indices
+            }
 
-        fourcc = cv2.VideoWriter_fourcc(*'mp4v')
-        out = cv2.VideoWriter(output_path, fourcc, fps, (width, height))
+        return self._process_frame(frame, self.dynamic_sprites.values())
 
-        frame_count = 0
-
-        while True:
-            ret, frame = cap.read()
-            if not ret:
-                break
+    def process_video_with_text(self, input_path, text_additions, preset='medium', crf=23):
+        fps, width, height, total_frames = self._get_video_info(input_path)
 
-            current_additions = [
-                addition for addition in dynamic_additions
-                if addition['start_frame'] <= frame_count <= addition['end_frame']
-            ]
+        self.prepare(text_additions, width, height, fps)
 
-            frame = self._process_frame(frame, current_additions)
-            out.write(frame)
-            frame_count += 1
+        cap = cv2.VideoCapture(input_path)
 
-            # Optional: Print progress
-            if frame_count % 100 == 0:
-                print(f"Processed {frame_count}/{total_frames} frames")
+        with tempfile.NamedTemporaryFile(suffix='.mp4', delete=False) as output_file:
+            output_path = output_file.name
 
-        cap.release()
-        out.release()
+        try:
+            # Frames are encoded to H.264 as they are drawn, rather than written out as a large mp4v file
+            with FrameSink(output_path, width, height, fps, preset=preset, crf=crf) as sink:
+                frame_count = 0
+
+                while True:
+                    ret, frame = cap.read()
+                    if not ret:
+                        break
+
+                    frame = self.render_frame(frame, frame_count)
+                    sink.write(frame)
+                    frame_count += 1
+
+                    # Optional: Print progress
+                    if frame_count % 100 == 0:
+                        print(f"Processed {frame_count}/{total_frames} frames")
+        except BaseException:
+            os.remove(output_path)
+            raise
+        finally:
+            cap.release()
 
         os.remove(input_path)
         print("All text additions applied to video, original file updated!")
@@ -161,7 +222,7 @@ class AddTextToVideoService:
 
     def _prepare_text_addition(self, addition, width, height):
         font = self._get_font(addition['text'], width, height, addition['thickness'], addition['font_scale'])
-        bbox = ImageDraw.Draw(Image.new('RGB', (1, 1))).textbbox((0, 0), addition['text'], font=font)
+        bbox = self._text_bbox(addition['text'], font)
         text_width, text_height = bbox[2] - bbox[0], bbox[3] - bbox[1]
 
         if 'position' in addition:
@@ -194,7 +255,7 @@ class AddTextToVideoService:
 
         for text, start_time, end_time in zip(transcript['texts'], transcript['start_times'], transcript['end_times']):
             font = self._get_font(text, width, height, transcript['thickness'], transcript['font_scale'])
-            bbox = ImageDraw.Draw(Image.new('RGB', (1, 1))).textbbox((0, 0), text, font=font)
+            bbox = self._text_bbox(text, font)
             text_width, text_height = bbox[2] - bbox[0], bbox[3] - bbox[1]
 
             position = (
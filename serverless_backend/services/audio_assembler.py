@@ -0,0 +1,142 @@
+import wave
+
+import numpy as np
+from pydub import AudioSegment
+
+from serverless_backend.services.span_planner import nearest_zero_crossing
+
+# Sample widths that can be snapped and cross-faded as plain integer arrays
+_SAMPLE_DTYPES = {2: np.int16, 4: np.int32}
+
+
+def merge_word_spans(words):
+    """
+    Converts kept words into (start, end) spans in milliseconds, merging words that follow on directly
+    from each other so that each run of consecutive words is read as one span.
+    """
+    spans = []
+    for word in words:
+        start = int(word['start_time'] * 1000)
+        end = int(word['end_time'] * 1000)
+        if end <= start:
+            continue
+        if spans and spans[-1][1] == start:
+            spans[-1] = (spans[-1][0], end)
+        else:
+            spans.append((start, end))
+    return spans
+
+
+def _span_frames(start, end, frame_rate, total_frames):
+    """Frame range of a millisecond span, rounded the same way as slicing an AudioSegment."""
+    length_ms = round(1000 * total_frames / frame_rate)
+    start_frame = int(min(start, length_ms) * frame_rate / 1000.0)
+    end_frame = int(min(end, length_ms) * frame_rate / 1000.0)
+    return start_frame, max(start_frame, end_frame)
+
+
+def _read_samples(read_frames, start_frame, frame_count, total_frames, dtype, channels):
+    """Reads frames as a (frames, channels) array, padding with silence past the end of the source."""
+    samples = np.zeros((frame_count, channels), dtype=dtype)
+    available = max(0, min(frame_count, total_frames - start_frame))
+    if available:
+        data = np.frombuffer(read_frames(start_frame, available), dtype=dtype).reshape(-1, channels)
+        samples[:len(data)] = data
+    return samples
+
+
+def _snap_frame_ranges(read_frames, frame_ranges, frame_rate, total_frames, dtype, channels, span_planner):
+    """Shifts each frame range onto the nearest zero crossing of its start, keeping its length."""
+    window = int(span_planner.zero_crossing_window * frame_rate)
+    snapped = []
+    for start_frame, end_frame in frame_ranges:
+        low = max(0, start_frame - window)
+        samples = _read_samples(read_frames, low, start_frame + window + 1 - low, total_frames, dtype, channels)
+        mono = samples.astype(np.int64).sum(axis=1)
+        shift = nearest_zero_crossing(mono, start_frame - low, window) - (start_frame - low)
+        snapped.append((start_frame + shift, end_frame + shift))
+    return snapped
+
+
+def _copy_spans(read_frames, spans, frame_rate, sample_width, channels, total_frames, span_planner=None):
+    """
+    Copies each span's frames into one preallocated buffer, padding with silence past the end of the source.
+    With a span_planner, 16 and 32 bit audio is also snapped to zero crossings and cross-faded at each join.
+    """
+    frame_width = sample_width * channels
+    frame_ranges = [_span_frames(start, end, frame_rate, total_frames) for start, end in spans]
+    dtype = _SAMPLE_DTYPES.get(sample_width)
+    if span_planner is not None and dtype is not None:
+        frame_ranges = _snap_frame_ranges(read_frames, frame_ranges, frame_rate, total_frames, dtype, channels,
+                                          span_planner)
+
+    buffer = bytearray(sum(end - start for start, end in frame_ranges) * frame_width)
+    view = memoryview(buffer)
+    offsets = []
+    offset = 0
+
+    for start_frame, end_frame in frame_ranges:
+        offsets.append(offset)
+        data = read_frames(start_frame, min(end_frame, total_frames) - start_frame) if start_frame < total_frames else b''
+        view[offset:offset + len(data)] = data
+        # Anything past the end of the source stays as zeroed silence
+        offset += (end_frame - start_frame) * frame_width
+
+    if span_planner is not None and dtype is not None and len(frame_ranges) > 1:
+        output = np.frombuffer(buffer, dtype=dtype).reshape(-1, channels)
+        lengths = [end - start for start, end in frame_ranges]
+        for i in range(len(frame_ranges) - 1):
+            fade = min(int(span_planner.crossfade * frame_rate), lengths[i] // 2, lengths[i + 1] // 2)
+            if fade <= 0:
+                continue
+            # Blend the audio that followed the end of this span into the start of the next one
+            tail = _read_samples(read_frames, frame_ranges[i][1], fade, total_frames, dtype, channels)
+            head_start = offsets[i + 1] // frame_width
+            head = output[head_start:head_start + fade]
+            weight = (np.arange(fade) / fade)[:, None]
+            head[:] = np.round(tail * (1 - weight) + head * weight).astype(dtype)
+
+    return bytes(buffer)
+
+
+def _assemble_wav_spans(wav_source, spans, span_planner=None):
+    with wave.open(wav_source, 'rb') as wav_file:
+        channels, sample_width, frame_rate, total_frames = wav_file.getparams()[:4]
+
+        def read_frames(start_frame, frame_count):
+            wav_file.setpos(start_frame)
+            return wav_file.readframes(frame_count)
+
+        data = _copy_spans(read_frames, spans, frame_rate, sample_width, channels, total_frames, span_planner)
+
+    return AudioSegment(data=data, sample_width=sample_width, frame_rate=frame_rate, channels=channels)
+
+
+def assemble_audio_spans(audio_path, spans, audio_format=None, span_planner=None):
+    """
+    Builds one AudioSegment from the given millisecond spans of an audio file, in order.
+
+    PCM WAV sources are read with a seek per span, so memory scales with the length of the result rather than
+    the source. Other formats are decoded once by pydub and then copied span by span into a single buffer,
+    which still avoids the quadratic cost of concatenating segments one at a time. Pass a SpanPlanner to snap
+    spans to zero crossings and cross-fade the joins.
+
+    audio_path may also be a seekable file object, such as FirebaseService.open_blob, so a WAV blob is read
+    range by range without downloading it.
+    """
+    try:
+        return _assemble_wav_spans(audio_path, spans, span_planner)
+    except (wave.Error, EOFError):
+        if hasattr(audio_path, 'seek'):
+            audio_path.seek(0)
+
+    audio = AudioSegment.from_file(audio_path, format=audio_format)
+    raw_data = audio.raw_data
+    frame_width = audio.frame_width
+
+    def read_frames(start_frame, frame_count):
+        return raw_data[start_frame * frame_width:(start_frame + frame_count) * frame_width]
+
+    data = _copy_spans(read_frames, spans, audio.frame_rate, audio.sample_width, audio.channels,
+                       int(audio.frame_count()), span_planner)
+    return audio._spawn(data)
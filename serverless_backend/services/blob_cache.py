@@ -0,0 +1,122 @@
+import hashlib
+import os
+import shutil
+import tempfile
+import threading
+from collections import OrderedDict
+
+
+class BlobCache:
+    """
+    On-disk LRU cache of downloaded blobs, shared by every FirebaseService in a worker.
+
+    Entries are keyed by blob name and version (the object generation, or its etag), so an overwritten blob
+    is fetched again, and named by a hash of that key. A cached blob is handed out by hard linking the entry
+    to the caller's path, so a repeat fetch costs no copy and the caller can delete its file as before; it
+    must not be written to in place. The least recently used entries are evicted once the cache holds more
+    than `max_bytes`, and blobs larger than that bypass the cache.
+    """
+
+    def __init__(self, cache_dir, max_bytes):
+        self.cache_dir = cache_dir
+        self.max_bytes = max_bytes
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._lock = threading.Lock()
+        self._entries = OrderedDict()
+        self._total_bytes = 0
+
+        os.makedirs(cache_dir, exist_ok=True)
+        # Pick up entries left by an earlier process in the same container, oldest first
+        existing = []
+        for name in os.listdir(cache_dir):
+            path = os.path.join(cache_dir, name)
+            if name.endswith('.part'):
+                os.remove(path)
+            elif os.path.isfile(path):
+                existing.append((os.path.getmtime(path), name, os.path.getsize(path)))
+        for _, name, size in sorted(existing):
+            self._entries[name] = size
+            self._total_bytes += size
+        with self._lock:
+            self._evict()
+
+    def _entry_name(self, blob_name, version):
+        return hashlib.sha256(f"{blob_name}\0{version}".encode('utf-8')).hexdigest()
+
+    def _evict(self):
+        while self._total_bytes > self.max_bytes and self._entries:
+            name, size = self._entries.popitem(last=False)
+            self._total_bytes -= size
+            self.evictions += 1
+            try:
+                os.remove(os.path.join(self.cache_dir, name))
+            except FileNotFoundError:
+                pass
+
+    def _place(self, entry_path, destination_path):
+        """Links the cache entry to destination_path, replacing any file the caller already created there."""
+        directory = os.path.dirname(os.path.abspath(destination_path))
+        fd, temp_path = tempfile.mkstemp(dir=directory, suffix='.link')
+        os.close(fd)
+        os.remove(temp_path)
+        try:
+            os.link(entry_path, temp_path)
+        except OSError:
+            # Different filesystem, fall back to a copy
+            shutil.copyfile(entry_path, temp_path)
+        os.replace(temp_path, destination_path)
+
+    def fetch(self, blob_name, version, size, destination_path, download):
+        """
+        Makes destination_path hold the blob, calling download(path) to fetch it into the cache on a miss.
+
+        :param version: Generation or etag of the blob, or None to bypass the cache
+        :param size: Size of the blob in bytes, or None if unknown
+        """
+        if version is None or (size is not None and size > self.max_bytes):
+            download(destination_path)
+            return destination_path
+
+        name = self._entry_name(blob_name, version)
+        entry_path = os.path.join(self.cache_dir, name)
+
+        with self._lock:
+            if name in self._entries and os.path.exists(entry_path):
+                self._entries.move_to_end(name)
+                self.hits += 1
+                self._place(entry_path, destination_path)
+                return destination_path
+            self.misses += 1
+
+        # Download outside the lock so other blobs can be served meanwhile, into a partial file first so a
+        # failed download never leaves a truncated entry behind
+        fd, part_path = tempfile.mkstemp(dir=self.cache_dir, suffix='.part')
+        os.close(fd)
+        try:
+            download(part_path)
+            os.replace(part_path, entry_path)
+        except BaseException:
+            if os.path.exists(part_path):
+                os.remove(part_path)
+            raise
+
+        with self._lock:
+            previous_size = self._entries.pop(name, 0)
+            self._entries[name] = os.path.getsize(entry_path)
+            self._total_bytes += self._entries[name] - previous_size
+            # The caller's link keeps the file even if the entry itself is evicted straight away
+            self._place(entry_path, destination_path)
+            self._evict()
+        return destination_path
+
+    def stats(self):
+        with self._lock:
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+                "entries": len(self._entries),
+                "bytes": self._total_bytes,
+            }
@@ -0,0 +1,236 @@
+import base64
+import math
+import os
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from io import BytesIO
+
+import google_crc32c
+
+# Cloud Storage composes at most 32 source objects in one request
+MAX_COMPOSE_PARTS = 32
+
+
+def crc32c_of_file(path, block_size=8 * 1024 * 1024):
+    """Base64 CRC32C of a file, in the form Cloud Storage reports it."""
+    checksum = google_crc32c.Checksum()
+    with open(path, 'rb') as file:
+        for block in iter(lambda: file.read(block_size), b''):
+            checksum.update(block)
+    return base64.b64encode(checksum.digest()).decode('utf-8')
+
+
+def crc32c_of_bytes(data, block_size=8 * 1024 * 1024):
+    """Base64 CRC32C of a bytes-like object, in the form Cloud Storage reports it."""
+    checksum = google_crc32c.Checksum()
+    view = memoryview(data)
+    # The C extension only takes bytes, so a bytearray is checksummed a block at a time
+    for start in range(0, len(view), block_size):
+        checksum.update(bytes(view[start:start + block_size]))
+    return base64.b64encode(checksum.digest()).decode('utf-8')
+
+
+class ChunkedTransfer:
+    """
+    Moves large blobs as byte ranges on a thread pool, so a multi-GB video isn't bound by one TCP stream.
+
+    Downloads are parallel ranged reads written into place in the destination file. Uploads are parallel
+    part uploads that the backend composes into the destination blob, then deletes. Both are verified
+    against the object's CRC32C. Objects smaller than `parallel_threshold` go as a single request.
+
+    `backend` is a BucketRangeBackend, or a stand-in with the same methods.
+    """
+
+    def __init__(self, backend, chunk_size=16 * 1024 * 1024, max_workers=8, parallel_threshold=64 * 1024 * 1024):
+        self.backend = backend
+        self.chunk_size = chunk_size
+        self.max_workers = max_workers
+        self.parallel_threshold = parallel_threshold
+
+    def _ranges(self, size, chunk_size):
+        return [(start, min(size, start + chunk_size)) for start in range(0, size, chunk_size)]
+
+    def _report(self, direction, blob_name, size, parts, start):
+        seconds = time.perf_counter() - start
+        stats = {
+            "bytes": size,
+            "parts": parts,
+            "seconds": seconds,
+            "mb_per_second": size / 1e6 / seconds if seconds > 0 else float('inf'),
+        }
+        print(f"{direction} {blob_name}: {size / 1e6:.1f} MB in {parts} parts, "
+              f"{seconds:.2f}s ({stats['mb_per_second']:.1f} MB/s)")
+        return stats
+
+    def _verify(self, blob_name, expected, actual):
+        if expected and expected != actual:
+            raise RuntimeError(f"CRC32C mismatch for {blob_name}: expected {expected}, got {actual}")
+
+    def download(self, blob_name, path, stat=None):
+        """Downloads a blob to path and returns the transfer stats."""
+        stat = stat or self.backend.stat(blob_name)
+        if stat is None:
+            raise FileNotFoundError(f"Blob {blob_name} not found")
+        start = time.perf_counter()
+        size = stat['size']
+
+        if size < self.parallel_threshold:
+            self.backend.download(blob_name, path)
+            ranges = [(0, size)]
+        else:
+            ranges = self._ranges(size, self.chunk_size)
+            with open(path, 'wb') as file:
+                file.truncate(size)
+            fd = os.open(path, os.O_WRONLY)
+            try:
+                def fetch(byte_range):
+                    data = self.backend.read_range(blob_name, *byte_range)
+                    if len(data) != byte_range[1] - byte_range[0]:
+                        raise RuntimeError(f"Short read of {blob_name} at {byte_range}")
+                    os.pwrite(fd, data, byte_range[0])
+
+                with ThreadPoolExecutor(max_workers=self.max_workers) as executor:
+                    list(executor.map(fetch, ranges))
+            finally:
+                os.close(fd)
+
+        self._verify(blob_name, stat.get('crc32c'), crc32c_of_file(path))
+        return self._report("Downloaded", blob_name, size, len(ranges), start)
+
+    def download_to_memory(self, blob_name, stat=None):
+        """Downloads a blob into a BytesIO positioned at its start."""
+        stat = stat or self.backend.stat(blob_name)
+        if stat is None:
+            raise FileNotFoundError(f"Blob {blob_name} not found")
+        start = time.perf_counter()
+        size = stat['size']
+
+        ranges = [(0, size)] if size < self.parallel_threshold else self._ranges(size, self.chunk_size)
+        # Size the BytesIO up front and write the ranges straight into its buffer, rather than copying a
+        # separately assembled buffer into it
+        in_memory_file = BytesIO()
+        if size:
+            in_memory_file.seek(size - 1)
+            in_memory_file.write(b'\0')
+        view = in_memory_file.getbuffer()
+
+        def fetch(byte_range):
+            data = self.backend.read_range(blob_name, *byte_range) if size else b''
+            if len(data) != byte_range[1] - byte_range[0]:
+                raise RuntimeError(f"Short read of {blob_name} at {byte_range}")
+            view[byte_range[0]:byte_range[1]] = data
+
+        try:
+            with ThreadPoolExecutor(max_workers=self.max_workers) as executor:
+                list(executor.map(fetch, ranges))
+            self._verify(blob_name, stat.get('crc32c'), crc32c_of_bytes(view))
+        finally:
+            view.release()
+
+        self._report("Downloaded", blob_name, size, len(ranges), start)
+        in_memory_file.seek(0)
+        return in_memory_file
+
+    def upload(self, path, blob_name):
+        """Uploads the file at path to blob_name and returns the transfer stats."""
+        start = time.perf_counter()
+        size = os.path.getsize(path)
+        local_crc32c = crc32c_of_file(path)
+
+        if size < self.parallel_threshold:
+            stat = self.backend.upload(path, blob_name)
+            parts = 1
+        else:
+            # Parts are never more than a compose request takes
+            part_size = max(self.chunk_size, math.ceil(size / MAX_COMPOSE_PARTS))
+            ranges = self._ranges(size, part_size)
+            prefix = f"{blob_name}.parts-{uuid.uuid4().hex}"
+            part_names = [f"{prefix}/{index:02d}" for index in range(len(ranges))]
+            try:
+                with ThreadPoolExecutor(max_workers=self.max_workers) as executor:
+                    list(executor.map(
+                        lambda part: self.backend.upload_part(part[0], path, part[1][0], part[1][1] - part[1][0]),
+                        zip(part_names, ranges)
+                    ))
+                stat = self.backend.compose(blob_name, part_names)
+            finally:
+                for part_name in part_names:
+                    try:
+                        self.backend.delete(part_name)
+                    except Exception as e:
+                        print(f"Failed to delete upload part {part_name}: {str(e)}")
+            parts = len(ranges)
+
+        self._verify(blob_name, stat.get('crc32c'), local_crc32c)
+        return self._report("Uploaded", blob_name, size, parts, start)
+
+    def upload_stream(self, stream, blob_name, header=None, content_type=None):
+        """
+        Uploads everything read from a file object, such as a subprocess's stdout, without knowing its
+        length up front. Parts of chunk_size are uploaded as they fill, with at most max_workers in memory at
+        once, so memory stays constant however long the stream is. Parts are composed into blob_name,
+        folding them into an intermediate part whenever the compose limit is reached.
+
+        :param header: Optional function of the total data length returning bytes to put in front of the
+            data, for formats like WAV whose header records the length
+        :param content_type: Content type of the uploaded blob, guessed from blob_name if not given
+        """
+        start = time.perf_counter()
+        prefix = f"{blob_name}.parts-{uuid.uuid4().hex}"
+        uploaded = []
+        part_names = []
+        total = 0
+
+        def part_name():
+            uploaded.append(f"{prefix}/{len(uploaded):04d}")
+            return uploaded[-1]
+
+        def upload_part(name, data):
+            stat = self.backend.upload_bytes(name, data)
+            self._verify(name, stat.get('crc32c'), crc32c_of_bytes(data))
+
+        try:
+            with ThreadPoolExecutor(max_workers=self.max_workers) as executor:
+                in_flight = []
+                while True:
+                    data = stream.read(self.chunk_size)
+                    if not data:
+                        break
+                    total += len(data)
+                    name = part_name()
+                    part_names.append(name)
+                    in_flight.append(executor.submit(upload_part, name, data))
+                    if len(in_flight) >= self.max_workers:
+                        in_flight.pop(0).result()
+                    # Keep a slot free for the header in the final compose
+                    if len(part_names) == MAX_COMPOSE_PARTS - 1:
+                        for future in in_flight:
+                            future.result()
+                        in_flight = []
+                        name = part_name()
+                        self.backend.compose(name, part_names)
+                        part_names = [name]
+                for future in in_flight:
+                    future.result()
+
+            prefix_bytes = header(total) if header else b''
+            if prefix_bytes:
+                name = part_name()
+                upload_part(name, prefix_bytes)
+                part_names.insert(0, name)
+            if part_names:
+                stat = self.backend.compose(blob_name, part_names, content_type=content_type)
+            else:
+                stat = self.backend.upload_bytes(blob_name, b'')
+        finally:
+            for name in uploaded:
+                try:
+                    self.backend.delete(name)
+                except Exception as e:
+                    print(f"Failed to delete upload part {name}: {str(e)}")
+
+        size = total + len(prefix_bytes)
+        if stat.get('size') is not None and stat['size'] != size:
+            raise RuntimeError(f"Uploaded {blob_name} is {stat['size']} bytes, expected {size}")
+        return self._report("Uploaded", blob_name, size, len(uploaded), start)
@@ -1,3 +1,7 @@
+import bisect
+import collections
+from concurrent.futures import ProcessPoolExecutor
+
 import cv2
 import numpy as np
 from typing import Dict, List, Tuple, Callable
@@ -5,11 +9,32 @@ from scipy.interpolate import interp1d
 
 
 class BoundingBoxGenerator:
-    def __init__(self, step_size=10):
+    def __init__(self, step_size=10, engine="numpy", search_mode="exhaustive", pyramid_factor=4,
+                 temporal_warm_start=False, warm_start_radius=None, warm_start_drop=0.2, workers=1,
+                 chunk_size=128):
+        if engine not in ("numpy", "loop"):
+            raise ValueError(f"Unknown search engine: {engine}")
+        if search_mode not in ("exhaustive", "pyramid"):
+            raise ValueError(f"Unknown search mode: {search_mode}")
         self.step_size = step_size
+        self.engine = engine  # "numpy" scores every box of a given height at once, "loop" is the reference search
+        self.search_mode = search_mode
+        self.pyramid_factor = pyramid_factor  # Downsampling factor for the coarse level of the pyramid search
+        # Within a shot, search only around the previous frame's boxes unless the saliency they capture
+        # drops by more than warm_start_drop (as a fraction) relative to the shot's last full search
+        self.temporal_warm_start = temporal_warm_start
+        self.warm_start_radius = warm_start_radius if warm_start_radius is not None else 4 * step_size
+        self.warm_start_drop = warm_start_drop
+        # With workers > 1, frames are decoded in this process and searched on a process pool in chunks of
+        # up to chunk_size consecutive frames, cut on shot boundaries so the warm start covers whole shots
+        self.workers = workers
+        self.chunk_size = chunk_size
         self.tiktok_aspect_ratio = 9 / 16  # TikTok aspect ratio (portrait mode)
         self.reaction_aspect_ratio = 16 / 9  # Reaction box aspect ratio
         self.half_screen_aspect_ratio = 9 / 8  # New half-screen box aspect ratio
+        self._coarse_generator = None
+        if search_mode == "pyramid":
+            self._coarse_generator = BoundingBoxGenerator(step_size=step_size, engine="numpy")
 
     def _calculate_integral_image(self, frame):
         """Calculate the integral image of a given frame."""
@@ -22,6 +47,12 @@ class BoundingBoxGenerator:
 
     def _find_best_single_box(self, integral_image, aspect_ratio):
         """Find the best single bounding box that maximizes the saliency captured."""
+        if self.engine == "numpy":
+            return self._find_best_single_box_numpy(integral_image, aspect_ratio)
+        return self._find_best_single_box_loop(integral_image, aspect_ratio)
+
+    def _find_best_single_box_loop(self, integral_image, aspect_ratio):
+        """Reference search that scores every candidate box one at a time."""
         height, width = integral_image.shape[:2]
         height -= 1  # Adjust for integral image size
         width -= 1  # Adjust for integral image size
@@ -43,6 +74,65 @@ class BoundingBoxGenerator:
 
         return best_box
 
+    def _snap_to_grid(self, value):
+        """Round a coordinate down onto the step_size search grid."""
+        return max(0, (value // self.step_size) * self.step_size)
+
+    def _saliency_grid(self, integral_image, w, h, y_start, y_stop, x_start, x_stop):
+        """Saliency of every w x h box whose top-left corner lies on range(start, stop, step_size) in y and x."""
+        step = self.step_size
+        y_end = y_start + len(range(y_start, y_stop, step)) * step
+        x_end = x_start + len(range(x_start, x_stop, step)) * step
+        # Same corner arithmetic as _saliency_captured, applied to strided views of the integral image
+        return (integral_image[y_start + h:y_end + h:step, x_start + w:x_end + w:step] -
+                integral_image[y_start:y_end:step, x_start + w:x_end + w:step] -
+                integral_image[y_start + h:y_end + h:step, x_start:x_end:step] +
+                integral_image[y_start:y_end:step, x_start:x_end:step])
+
+    def _find_best_single_box_numpy(self, integral_image, aspect_ratio, around=None, radius=0):
+        """
+        Vectorised equivalent of _find_best_single_box_loop, returning the same box.
+
+        If `around` is an (x, y, w, h) box, only candidates whose height and top-left corner are
+        within `radius` pixels of it are scored.
+        """
+        height, width = integral_image.shape[:2]
+        height -= 1  # Adjust for integral image size
+        width -= 1  # Adjust for integral image size
+        best_box = (0, 0, 0, 0)
+        best_saliency = 0
+
+        heights = range(self.step_size, height, self.step_size)
+        if around is not None:
+            around_x, around_y, _, around_h = around
+            heights = range(max(self.step_size, self._snap_to_grid(around_h - radius)),
+                            min(height, around_h + radius + 1), self.step_size)
+
+        for h in heights:
+            w = int(h * aspect_ratio)
+            if w > width:
+                break
+
+            y_start, y_stop = 0, height - h + 1
+            x_start, x_stop = 0, width - w + 1
+            if around is not None:
+                y_start, y_stop = self._snap_to_grid(around_y - radius), min(y_stop, around_y + radius + 1)
+                x_start, x_stop = self._snap_to_grid(around_x - radius), min(x_stop, around_x + radius + 1)
+
+            scores = self._saliency_grid(integral_image, w, h, y_start, y_stop, x_start, x_stop)
+            if scores.size == 0:
+                continue
+
+            # argmax returns the first maximum in (y, x) order, matching the loop's strict ">" tie-breaking
+            best_index = int(np.argmax(scores))
+            saliency = scores.flat[best_index]
+            if saliency > best_saliency:
+                best_saliency = saliency
+                y_index, x_index = divmod(best_index, scores.shape[1])
+                best_box = (x_start + x_index * self.step_size, y_start + y_index * self.step_size, w, h)
+
+        return best_box
+
     def _find_best_reaction_box(self, integral_image):
         height, width = integral_image.shape[:2]
         height -= 1  # Adjust for integral image size
@@ -142,6 +232,200 @@ class BoundingBoxGenerator:
 
         return best_box
 
+    def _find_boxes(self, gray_frame):
+        """Find the best box of every box type for a single grayscale saliency frame."""
+        return self._search_boxes(self._calculate_integral_image(gray_frame))
+
+    def _search_boxes(self, integral_image):
+        """Full search for every box type using the configured search mode."""
+        if self.search_mode == "pyramid":
+            return self._find_boxes_pyramid(integral_image)
+
+        return {
+            "standard_tiktok": self._find_best_single_box(integral_image, self.tiktok_aspect_ratio),
+            "two_boxes": self._find_best_two_boxes(integral_image),
+            "reaction_box": self._find_best_reaction_box(integral_image),
+            "half_screen_box": self._find_best_half_screen_box(integral_image),
+        }
+
+    def _find_boxes_pyramid(self, integral_image):
+        """
+        Coarse-to-fine search: find each box on a downsampled saliency map, then refine it at
+        full resolution within one coarse grid cell of the upscaled box.
+        """
+        factor = self.pyramid_factor
+        # Sampling every factor-th entry of the integral image gives the integral image of the
+        # area-downsampled saliency map (scaled by factor ** 2), without resizing the frame
+        coarse_integral = integral_image[::factor, ::factor]
+        coarse = self._coarse_generator
+        radius = self.step_size * factor
+
+        def upscale(box):
+            return tuple(value * factor for value in box)
+
+        standard_box = coarse._find_best_single_box(coarse_integral, self.tiktok_aspect_ratio)
+        standard_box = self._find_best_single_box_numpy(integral_image, self.tiktok_aspect_ratio,
+                                                        around=upscale(standard_box), radius=radius)
+
+        half_screen_box = coarse._find_best_half_screen_box(coarse_integral)
+        half_screen_box = self._refine_half_screen_box(integral_image, upscale(half_screen_box)[0], radius)
+
+        return {
+            "standard_tiktok": standard_box,
+            # Both halves span the full frame height, so there is only one candidate and nothing to prune
+            "two_boxes": self._find_best_two_boxes(integral_image),
+            # The reaction search is a short walk down box heights that stops on a saliency drop, so it is
+            # already cheap and is kept at full resolution to return the same box as the exhaustive mode
+            "reaction_box": self._find_best_reaction_box(integral_image),
+            "half_screen_box": half_screen_box,
+        }
+
+    def _refine_half_screen_box(self, integral_image, around_x, radius):
+        """Best half-screen box at full resolution with an x within `radius` of `around_x`."""
+        height, width = integral_image.shape[:2]
+        height -= 1  # Adjust for integral image size
+        width -= 1  # Adjust for integral image size
+        box_height = height
+        box_width = int(box_height * self.half_screen_aspect_ratio)
+
+        scores = self._saliency_grid(integral_image, box_width, box_height, 0, 1,
+                                     self._snap_to_grid(around_x - radius),
+                                     min(width - box_width + 1, around_x + radius + 1))
+        if scores.size == 0 or scores.max() <= 0:
+            return (0, 0, 0, 0)
+
+        x_index = int(np.argmax(scores[0]))
+        return (self._snap_to_grid(around_x - radius) + x_index * self.step_size, 0, box_width, box_height)
+
+    def _saliency_fraction(self, integral_image, box):
+        """Fraction of the frame's total saliency captured by an (x, y, w, h) box."""
+        x, y, w, h = box
+        total_saliency = integral_image[-1, -1]
+        if w == 0 or h == 0 or total_saliency <= 0:
+            return 0
+        return self._saliency_captured(integral_image, x, y, x + w - 1, y + h - 1) / total_saliency
+
+    def _find_boxes_warm_start(self, gray_frame, previous=None):
+        """
+        Find every box type for a frame, searching standard_tiktok and half_screen_box only within
+        warm_start_radius of the previous frame's boxes.
+
+        `previous` is the state returned for the previous frame of the same shot, or None at the start
+        of a shot. A full search is run when there is no previous state, or when a warm-started box
+        captures a fraction of the frame's saliency more than warm_start_drop below the fraction captured
+        at the shot's last full search. Returns the boxes and the state to pass in with the next frame.
+        """
+        integral_image = self._calculate_integral_image(gray_frame)
+
+        if previous is not None:
+            previous_boxes, reference_fractions = previous
+            boxes = {
+                "standard_tiktok": self._find_best_single_box_numpy(
+                    integral_image, self.tiktok_aspect_ratio,
+                    around=previous_boxes["standard_tiktok"], radius=self.warm_start_radius),
+                "two_boxes": self._find_best_two_boxes(integral_image),
+                "reaction_box": self._find_best_reaction_box(integral_image),
+                "half_screen_box": self._refine_half_screen_box(
+                    integral_image, previous_boxes["half_screen_box"][0], self.warm_start_radius),
+            }
+            saliency_held = all(
+                reference > 0 and
+                self._saliency_fraction(integral_image, boxes[box_type]) >= reference * (1 - self.warm_start_drop)
+                for box_type, reference in reference_fractions.items()
+            )
+            if saliency_held:
+                return boxes, (boxes, reference_fractions)
+
+        boxes = self._search_boxes(integral_image)
+        reference_fractions = {
+            box_type: self._saliency_fraction(integral_image, boxes[box_type])
+            for box_type in ("standard_tiktok", "half_screen_box")
+        }
+        return boxes, (boxes, reference_fractions)
+
+    def _find_boxes_for_frames(self, gray_frames, shots):
+        """Find the boxes for consecutive frames, warm-starting within each shot when enabled."""
+        frame_boxes = []
+        current_shot = None
+        warm_start_state = None
+        for gray_frame, shot in zip(gray_frames, shots):
+            if self.temporal_warm_start:
+                if shot != current_shot:
+                    current_shot = shot
+                    warm_start_state = None
+                boxes, warm_start_state = self._find_boxes_warm_start(gray_frame, warm_start_state)
+            else:
+                boxes = self._find_boxes(gray_frame)
+            frame_boxes.append(boxes)
+        return frame_boxes
+
+    def _frame_chunks(self, saliency_video, total_frames, skip_frames, cuts):
+        """
+        Yield (gray_frames, shots) chunks of up to chunk_size consecutive saliency frames.
+
+        A chunk only ends inside a shot when the shot is longer than chunk_size frames. Otherwise a shot
+        that does not fit in what is left of the current chunk starts the next one, so each worker
+        warm-starts through the whole shot after a single full search.
+        """
+        frame_count = 0
+        while True:
+            gray_frames, shots = [], []
+            while len(gray_frames) < self.chunk_size:
+                # Saliency frames are sampled every (skip_frames + 1) frames of the original video
+                shot = bisect.bisect_right(cuts, frame_count * (skip_frames + 1))
+                if gray_frames and shot != shots[-1]:
+                    shot_end = -(-cuts[shot] // (skip_frames + 1)) if shot < len(cuts) else total_frames
+                    if shot_end - frame_count > self.chunk_size - len(gray_frames):
+                        break
+                success, frame = saliency_video.read()
+                if not success:
+                    break
+                gray_frames.append(cv2.cvtColor(frame, cv2.COLOR_BGR2GRAY))
+                shots.append(shot)
+                frame_count += 1
+
+            if not gray_frames:
+                return
+            yield gray_frames, shots
+
+    def _generate_frame_boxes_parallel(self, saliency_video, total_frames, update_progress, skip_frames, cuts):
+        """
+        Decode saliency frames in this process and search them in chunks on a process pool.
+
+        At most 2 * workers chunks are in flight, so memory stays bounded, and chunks are collected in
+        submission order so the returned boxes line up with the frames. Chunks follow the shots (see
+        _frame_chunks), so only shots longer than chunk_size restart their warm start mid-shot.
+        """
+        frame_boxes = []
+        pending = collections.deque()
+        reported_hundreds = 0
+        chunks = self._frame_chunks(saliency_video, total_frames, skip_frames, cuts)
+
+        with ProcessPoolExecutor(max_workers=self.workers) as executor:
+            while True:
+                chunk = next(chunks, None)
+                if chunk is not None:
+                    pending.append(executor.submit(self._find_boxes_for_frames, *chunk))
+
+                while pending and (len(pending) >= 2 * self.workers or chunk is None):
+                    try:
+                        frame_boxes.extend(pending.popleft().result())
+                    except Exception as e:
+                        print(f"Error processing frame {len(frame_boxes)}: {str(e)}")
+                        for future in pending:
+                            future.cancel()
+                        return frame_boxes
+
+                    if len(frame_boxes) // 100 > reported_hundreds:
+                        reported_hundreds = len(frame_boxes) // 100
+                        update_progress((len(frame_boxes) / total_frames) * 100)
+                        print(f"Processed {len(frame_boxes)}/{total_frames} frames")
+
+                if chunk is None:
+                    break
+
+        return frame_boxes
+
     def get_total_frames(self, video_path):
         """Get the total number of frames in the video."""
         video = cv2.VideoCapture(video_path)
@@ -153,22 +437,12 @@ class BoundingBoxGenerator:
         video.release()
         return total_frames
 
-    def generate_bounding_boxes(self, saliency_video_path, update_progress, skip_frames=2):
-        saliency_video = cv2.VideoCapture(saliency_video_path)
-        if not saliency_video.isOpened():
-            print("Error: Unable to open saliency video file.")
-            return {}
-
-        total_frames = int(saliency_video.get(cv2.CAP_PROP_FRAME_COUNT))
-        print(f"Total frames in the video: {total_frames}")
-
-        bounding_boxes = {
-            "standard_tiktok": [],
-            "two_boxes": [],
-            "reaction_box": [],
-            "half_screen_box": []
-        }
+    def _generate_frame_boxes(self, saliency_video, total_frames, update_progress, skip_frames, cuts):
+        """Decode and search saliency frames one at a time in this process."""
+        frame_boxes = []
         frame_count = 0
+        current_shot = None
+        warm_start_state = None
 
         while True:
             success, frame = saliency_video.read()
@@ -177,15 +451,16 @@ class BoundingBoxGenerator:
 
             try:
                 gray_frame = cv2.cvtColor(frame, cv2.COLOR_BGR2GRAY)
-                integral_image = self._calculate_integral_image(gray_frame)
-
-                bounding_boxes["standard_tiktok"].append(
-                    self._find_best_single_box(integral_image, self.tiktok_aspect_ratio))
-                bounding_boxes["two_boxes"].append(self._find_best_two_boxes(integral_image))
-                bounding_boxes["reaction_box"].append(self._find_best_reaction_box(integral_image))
-                bounding_boxes["half_screen_box"].append(
-                    self._find_best_half_screen_box(integral_image)
-                )
+                if self.temporal_warm_start:
+                    # Saliency frames are sampled every (skip_frames + 1) frames of the original video
+                    shot = bisect.bisect_right(cuts, frame_count * (skip_frames + 1))
+                    if shot != current_shot:
+                        current_shot = shot
+                        warm_start_state = None
+                    boxes, warm_start_state = self._find_boxes_warm_start(gray_frame, warm_start_state)
+                else:
+                    boxes = self._find_boxes(gray_frame)
+                frame_boxes.append(boxes)
 
                 if frame_count % 100 == 0:
                     progress = (frame_count / total_frames) * 100
@@ -197,6 +472,42 @@ class BoundingBoxGenerator:
 
             frame_count += 1
 
+        return frame_boxes
+
+    def generate_bounding_boxes(self, saliency_video_path, update_progress, skip_frames=2, cuts=None):
+        """
+        Find the best boxes for every frame of the saliency video and interpolate them back to the
+        frame rate of the original video. `cuts` are camera cut frame indices in the original video,
+        used to reset the temporal warm start at shot boundaries.
+        """
+        saliency_video = cv2.VideoCapture(saliency_video_path)
+        if not saliency_video.isOpened():
+            print("Error: Unable to open saliency video file.")
+            return {}
+
+        total_frames = int(saliency_video.get(cv2.CAP_PROP_FRAME_COUNT))
+        print(f"Total frames in the video: {total_frames}")
+
+        bounding_boxes = {
+            "standard_tiktok": [],
+            "two_boxes": [],
+            "reaction_box": [],
+            "half_screen_box": []
+        }
+        cuts = sorted(cuts or [])
+
+        if self.workers > 1:
+            all_frame_boxes = self._generate_frame_boxes_parallel(saliency_video, total_frames, update_progress,
+                                                                  skip_frames, cuts)
+        else:
+            all_frame_boxes = self._generate_frame_boxes(saliency_video, total_frames, update_progress,
+                                                         skip_frames, cuts)
+
+        for frame_boxes in all_frame_boxes:
+            for box_type, box in frame_boxes.items():
+                bounding_boxes[box_type].append(box)
+        frame_count = len(all_frame_boxes)
+
         saliency_video.release()
         print(f"Total frames processed: {frame_count}/{total_frames}")
 
@@ -0,0 +1,68 @@
+from collections import OrderedDict
+from typing import Tuple
+
+import cv2
+import numpy as np
+
+
+class OverlayCompositor:
+    """
+    Draws bordered overlays (picture in picture, reaction boxes) onto frames.
+
+    The border, alpha mask and scratch buffers only depend on the overlay size, so they are built once per
+    size and reused for every frame. Blending is done for all channels at once in uint16 fixed point.
+    """
+
+    def __init__(self, border_thickness: int = 3, border_colour: Tuple[int, int, int] = (255, 255, 255),
+                 max_layouts: int = 16):
+        self.border_thickness = border_thickness
+        self.border_colour = border_colour
+        self.max_layouts = max_layouts
+        self._layouts = OrderedDict()
+
+    def _layout(self, width: int, height: int) -> dict:
+        key = (width, height)
+        if key in self._layouts:
+            self._layouts.move_to_end(key)
+            return self._layouts[key]
+
+        border = self.border_thickness
+        sprite = np.zeros((height, width, 4), dtype=np.uint8)
+        cv2.rectangle(sprite, (0, 0), (width - 1, height - 1), (*self.border_colour, 255), border)
+        sprite[border:height - border, border:width - border, 3] = 255
+
+        alpha = sprite[:, :, 3:].astype(np.uint16)
+        layout = {
+            "sprite": np.ascontiguousarray(sprite[:, :, :3]),
+            "alpha": alpha,
+            "inverse_alpha": 255 - alpha,
+            "blended": np.empty((height, width, 3), dtype=np.uint16),
+            "background": np.empty((height, width, 3), dtype=np.uint16),
+        }
+
+        self._layouts[key] = layout
+        if len(self._layouts) > self.max_layouts:
+            self._layouts.popitem(last=False)
+        return layout
+
+    def composite(self, frame: np.ndarray, content: np.ndarray, x_offset: int, y_offset: int,
+                  width: int, height: int) -> np.ndarray:
+        """Resizes content into a bordered width x height overlay and blends it onto frame in place."""
+        layout = self._layout(width, height)
+        border = self.border_thickness
+        sprite, blended, background = layout["sprite"], layout["blended"], layout["background"]
+
+        sprite[border:height - border, border:width - border] = cv2.resize(
+            content, (width - 2 * border, height - 2 * border))
+
+        region = frame[y_offset:y_offset + height, x_offset:x_offset + width]
+        np.multiply(sprite, layout["alpha"], out=blended)
+        np.multiply(region, layout["inverse_alpha"], out=background)
+        blended += background
+        # Exact rounded division by 255 without leaving uint16
+        blended += 128
+        np.right_shift(blended, 8, out=background)
+        blended += background
+        np.right_shift(blended, 8, out=blended)
+        region[...] = blended
+        return frame
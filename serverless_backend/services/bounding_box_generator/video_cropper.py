@@ -3,7 +3,13 @@ import numpy as np
 from typing import List, Tuple, Dict
 import tempfile
 import os
+import queue
 import subprocess
+import threading
+
+from serverless_backend.services.bounding_box_generator.overlay_compositor import OverlayCompositor
+from serverless_backend.services.frame_sink import FrameSink
+
 
 class VideoCropper:
     def __init__(self, input_video_path: str, bounding_boxes: Dict[str, List[Tuple[int, int, int, int]]],
@@ -24,6 +30,9 @@ class VideoCropper:
         self.target_width = 1080  # TikTok video width
         self.previous_reaction_box = None
         self.background_frame_count = 0
+        self.decode_queue_size = 8
+        self.overlay_compositor = OverlayCompositor()
+        self._frame_buffers = {}
 
     def _initialize_video(self):
         self.video = cv2.VideoCapture(self.input_video_path)
@@ -93,13 +102,22 @@ class VideoCropper:
         else:
             raise ValueError(f"Unknown frame type: {frame_type}")
 
+    def _frame_buffer(self, name: str, shape: Tuple[int, ...]) -> np.ndarray:
+        """Output buffer reused across frames, each frame is encoded before the next one overwrites it."""
+        buffer = self._frame_buffers.get(name)
+        if buffer is None or buffer.shape != shape:
+            buffer = np.empty(shape, dtype=np.uint8)
+            self._frame_buffers[name] = buffer
+        return buffer
+
     def _process_standard_tiktok(self, frame: np.ndarray, box: Tuple[int, int, int, int]) -> np.ndarray:
         try:
             x, y, w, h = box
             cropped_frame = frame[y:y + h, x:x + w]
             if cropped_frame.size == 0:
                 raise ValueError("Cropped frame is empty")
-            return cv2.resize(cropped_frame, (self.target_width, self.target_height))
+            output = self._frame_buffer("full", (self.target_height, self.target_width, 3))
+            return cv2.resize(cropped_frame, (self.target_width, self.target_height), dst=output)
         except Exception as e:
             print(f"Error in _process_standard_tiktok: {str(e)}")
             return None
@@ -111,12 +129,17 @@ class VideoCropper:
             if reverse:
                 cropped_frames = cropped_frames[::-1]
 
-            resized_frames = [cv2.resize(frame, (self.target_width, self.target_height // 2)) for frame in cropped_frames]
+            if not vertical:
+                resized_frames = [cv2.resize(frame, (self.target_width, self.target_height // 2))
+                                  for frame in cropped_frames]
+                return np.hstack(resized_frames)
 
-            if vertical:
-                stacked_frame = np.vstack(resized_frames)
-            else:
-                stacked_frame = np.hstack(resized_frames)
+            # Resize each crop straight into its half of the output frame
+            half_height = self.target_height // 2
+            stacked_frame = self._frame_buffer("two_boxes", (half_height * len(cropped_frames), self.target_width, 3))
+            for i, cropped_frame in enumerate(cropped_frames):
+                cv2.resize(cropped_frame, (self.target_width, half_height),
+                           dst=stacked_frame[i * half_height:(i + 1) * half_height])
 
             return stacked_frame
         except Exception as e:
@@ -130,39 +153,15 @@ class VideoCropper:
             if main_frame is None:
                 return None
 
-            # Create a smaller version of the original frame for PiP
-            pip_height = self.target_height // 4  # 1/4 of the frame height
-            pip_width = int(pip_height * (self.width / self.height))  # Maintain aspect ratio
-
-            # Add padding for border
-            border_thickness = 3
-            padding = border_thickness * 2
-            pip_frame = cv2.resize(frame, (pip_width - padding, pip_height - padding))
-
-            # Create a transparent frame for the PiP with border
-            pip_with_border = np.zeros((pip_height, pip_width, 4), dtype=np.uint8)
+            # A smaller version of the original frame, 1/4 of the frame height, keeping its aspect ratio
+            pip_height = self.target_height // 4
+            pip_width = int(pip_height * (self.width / self.height))
 
-            # Draw white border
-            cv2.rectangle(pip_with_border, (0, 0), (pip_width - 1, pip_height - 1), (255, 255, 255, 255), border_thickness)
-
-            # Place the PiP frame inside the border
-            pip_with_border[border_thickness:pip_height - border_thickness,
-            border_thickness:pip_width - border_thickness, :3] = pip_frame
-            pip_with_border[border_thickness:pip_height - border_thickness,
-            border_thickness:pip_width - border_thickness, 3] = 255
-
-            # Calculate position for PiP (centered at the bottom)
-            y_offset = self.target_height - pip_height - 20  # 20 pixels from bottom
+            # Centered at the bottom, 20 pixels from the bottom edge
+            y_offset = self.target_height - pip_height - 20
             x_offset = (self.target_width - pip_width) // 2
 
-            # Overlay PiP on main frame
-            for c in range(0, 3):
-                alpha = pip_with_border[:, :, 3] / 255.0
-                main_frame[y_offset:y_offset + pip_height, x_offset:x_offset + pip_width, c] = \
-                    (1 - alpha) * main_frame[y_offset:y_offset + pip_height, x_offset:x_offset + pip_width, c] + \
-                    alpha * pip_with_border[:, :, c]
-
-            return main_frame
+            return self.overlay_compositor.composite(main_frame, frame, x_offset, y_offset, pip_width, pip_height)
         except Exception as e:
             print(f"Error in _process_picture_in_picture: {str(e)}")
             return None
@@ -178,41 +177,18 @@ class VideoCropper:
             if reaction_box is None:
                 return main_frame
 
-            # Create a smaller version of the reaction area
+            # A smaller version of the reaction area, 1/4 of the frame height, keeping its aspect ratio
             x, y, w, h = reaction_box
             reaction_frame = frame[y:y + h, x:x + w]
-            reaction_height = self.target_height // 4  # 1/4 of the frame height
-            reaction_width = int(reaction_height * (w / h))  # Maintain aspect ratio
-
-            # Add padding for border
-            border_thickness = 3
-            padding = border_thickness * 2
-            reaction_frame = cv2.resize(reaction_frame, (reaction_width - padding, reaction_height - padding))
-
-            # Create a transparent frame for the reaction box with border
-            reaction_with_border = np.zeros((reaction_height, reaction_width, 4), dtype=np.uint8)
-
-            # Draw white border
-            cv2.rectangle(reaction_with_border, (0, 0), (reaction_width - 1, reaction_height - 1), (255, 255, 255, 255), border_thickness)
+            reaction_height = self.target_height // 4
+            reaction_width = int(reaction_height * (w / h))
 
-            # Place the reaction frame inside the border
-            reaction_with_border[border_thickness:reaction_height - border_thickness,
-            border_thickness:reaction_width - border_thickness, :3] = reaction_frame
-            reaction_with_border[border_thickness:reaction_height - border_thickness,
-            border_thickness:reaction_width - border_thickness, 3] = 255
-
-            # Calculate position for reaction box (centered at the bottom)
-            y_offset = self.target_height - reaction_height - 20  # 20 pixels from bottom
+            # Centered at the bottom, 20 pixels from the bottom edge
+            y_offset = self.target_height - reaction_height - 20
             x_offset = (self.target_width - reaction_width) // 2
 
-            # Overlay reaction box on main frame
-            for c in range(0, 3):
-                alpha = reaction_with_border[:, :, 3] / 255.0
-                main_frame[y_offset:y_offset + reaction_height, x_offset:x_offset + reaction_width, c] = \
-                    (1 - alpha) * main_frame[y_offset:y_offset + reaction_height, x_offset:x_offset + reaction_width, c] + \
-                    alpha * reaction_with_border[:, :, c]
-
-            return main_frame
+            return self.overlay_compositor.composite(main_frame, reaction_frame, x_offset, y_offset,
+                                                     reaction_width, reaction_height)
         except Exception as e:
             print(f"Error in _process_reaction_box: {str(e)}")
             return None
@@ -224,96 +200,133 @@ class VideoCropper:
             if cropped_frame.size == 0:
                 raise ValueError("Cropped frame is empty")
 
-            # Resize the cropped frame to fit the top half of the target frame
-            resized_frame = cv2.resize(cropped_frame, (self.target_width, self.target_height // 2))
+            # Resize the cropped frame straight into the top half of the target frame
+            half_height = self.target_height // 2
+            full_frame = self._frame_buffer("half_screen_box", (half_height * 2, self.target_width, 3))
+            cv2.resize(cropped_frame, (self.target_width, half_height), dst=full_frame[:half_height])
 
             # Get the background frame for the bottom half
             background_frame = self._get_background_frame()
             if background_frame is None:
-                background_frame = np.zeros((self.target_height // 2, self.target_width, 3), dtype=np.uint8)
-
-            # Combine the resized frame and the background frame
-            full_frame = np.vstack((resized_frame, background_frame))
+                full_frame[half_height:] = 0
+            else:
+                full_frame[half_height:] = background_frame
 
             return full_frame
         except Exception as e:
             print(f"Error in _process_half_screen_box: {str(e)}")
             return None
 
-    def crop_video(self) -> str:
-        self._initialize_video()
+    def _process_frame(self, frame: np.ndarray, frame_idx: int) -> np.ndarray:
+        frame_type, boxes = self._get_bounding_box(frame_idx)
 
-        with tempfile.NamedTemporaryFile(suffix='.mp4', delete=False) as tmp_file:
-            output_path = tmp_file.name
+        if frame_type == "standard_tiktok":
+            return self._process_standard_tiktok(frame, boxes[0])
+        elif frame_type == "two_boxes":
+            return self._process_two_boxes(frame, boxes, vertical=True)
+        elif frame_type == "two_boxes_reversed":
+            return self._process_two_boxes(frame, boxes, vertical=True, reverse=True)
+        elif frame_type == "picture_in_picture":
+            return self._process_picture_in_picture(frame, boxes[0])
+        elif frame_type == "reaction_box":
+            return self._process_reaction_box(frame, boxes)
+        elif frame_type == "half_screen_box":
+            return self._process_half_screen_box(frame, boxes[0])
 
-        # Create a temporary file for raw video data
-        with tempfile.NamedTemporaryFile(suffix='.yuv', delete=False) as raw_file:
-            raw_path = raw_file.name
+        print(f"Unknown frame type: {frame_type}. Skipping...")
+        return None
 
-        # Process frames and write raw video data
-        with open(raw_path, 'wb') as raw_out:
-            frame_idx = 0
-            while True:
+    def _read_frames(self, frame_queue: queue.Queue, stop: threading.Event):
+        """Decodes the input video on a background thread so decoding overlaps with cropping."""
+        try:
+            while not stop.is_set():
                 ret, frame = self.video.read()
                 if not ret:
                     break
+                frame_queue.put(frame)
+            frame_queue.put(None)
+        except Exception as e:
+            frame_queue.put(e)
+
+    def _iter_processed_frames(self):
+        """Yields each cropped frame as raw I420 bytes, in order."""
+        frame_queue = queue.Queue(maxsize=self.decode_queue_size)
+        stop = threading.Event()
+        reader = threading.Thread(target=self._read_frames, args=(frame_queue, stop), daemon=True)
+        reader.start()
+
+        try:
+            frame_idx = 0
+            while True:
+                frame = frame_queue.get()
+                if frame is None:
+                    break
+                if isinstance(frame, Exception):
+                    raise frame
 
-                if frame is None or frame.size == 0:
+                if frame.size == 0:
                     print(f"Empty or invalid frame at index {frame_idx}. Skipping...")
                     frame_idx += 1
                     continue
 
-                frame_type, boxes = self._get_bounding_box(frame_idx)
-
-                processed_frame = None
-                if frame_type == "standard_tiktok":
-                    processed_frame = self._process_standard_tiktok(frame, boxes[0])
-                elif frame_type == "two_boxes":
-                    processed_frame = self._process_two_boxes(frame, boxes, vertical=True)
-                elif frame_type == "two_boxes_reversed":
-                    processed_frame = self._process_two_boxes(frame, boxes, vertical=True, reverse=True)
-                elif frame_type == "picture_in_picture":
-                    processed_frame = self._process_picture_in_picture(frame, boxes[0])
-                elif frame_type == "reaction_box":
-                    processed_frame = self._process_reaction_box(frame, boxes)
-                elif frame_type == "half_screen_box":
-                    processed_frame = self._process_half_screen_box(frame, boxes[0])
-                else:
-                    print(f"Unknown frame type: {frame_type}. Skipping...")
-
+                processed_frame = self._process_frame(frame, frame_idx)
                 if processed_frame is not None:
-                    # Convert to YUV and write to raw file
-                    yuv = cv2.cvtColor(processed_frame, cv2.COLOR_BGR2YUV_I420)
-                    raw_out.write(yuv.tobytes())
+                    yield cv2.cvtColor(processed_frame, cv2.COLOR_BGR2YUV_I420).tobytes()
                 else:
                     print(f"Failed to process frame {frame_idx}. Skipping...")
 
                 frame_idx += 1
                 if frame_idx % 100 == 0:
                     print(f"Processed {frame_idx}/{self.total_frames} frames")
+        finally:
+            stop.set()
+            # Unblock the reader if it is waiting on a full queue
+            while reader.is_alive():
+                try:
+                    frame_queue.get_nowait()
+                except queue.Empty:
+                    pass
+                reader.join(timeout=0.1)
+            self.video.release()
+
+    def _frame_sink(self, output_path: str) -> FrameSink:
+        return FrameSink(output_path, self.target_width, self.target_height, self.fps, input_pix_fmt='yuv420p',
+                         pix_fmt=None, preset='ultrafast', crf=23)
+
+    def _encode_streaming(self, output_path: str):
+        """Pipes cropped frames straight into FFmpeg, so decoding, cropping and encoding all run at once."""
+        with self._frame_sink(output_path) as sink:
+            for frame_bytes in self._iter_processed_frames():
+                sink.write(frame_bytes)
+
+    def _encode_from_raw_file(self, output_path: str):
+        """Writes every cropped frame to a raw YUV temp file and encodes it afterwards."""
+        with tempfile.NamedTemporaryFile(suffix='.yuv', delete=False) as raw_file:
+            raw_path = raw_file.name
 
-        self.video.release()
-
-        # Use FFmpeg to encode the raw video data
-        ffmpeg_command = [
-            'ffmpeg',
-            '-f', 'rawvideo',
-            '-vcodec', 'rawvideo',
-            '-s', f'{self.target_width}x{self.target_height}',
-            '-pix_fmt', 'yuv420p',
-            '-r', str(self.fps),
-            '-i', raw_path,
-            '-c:v', 'libx264',
-            '-preset', 'ultrafast',
-            '-crf', '23',
-            '-y',
-            output_path
-        ]
-
-        subprocess.run(ffmpeg_command, check=True)
-
-        # Clean up the temporary raw video file
-        os.remove(raw_path)
+        try:
+            with open(raw_path, 'wb') as raw_out:
+                for frame_bytes in self._iter_processed_frames():
+                    raw_out.write(frame_bytes)
+
+            subprocess.run(self._frame_sink(output_path).command(raw_path), check=True)
+        finally:
+            os.remove(raw_path)
+
+    def crop_video(self, stream: bool = True) -> str:
+        """
+        Crops the input video to the TikTok layout and encodes it with FFmpeg. By default frames are
+        streamed into FFmpeg's stdin, set stream to False to go through a raw YUV temp file instead.
+        """
+        self._initialize_video()
+
+        with tempfile.NamedTemporaryFile(suffix='.mp4', delete=False) as tmp_file:
+            output_path = tmp_file.name
+
+        if stream:
+            self._encode_streaming(output_path)
+        else:
+            self._encode_from_raw_file(output_path)
 
         print(f"Cropped video saved to: {output_path}")
         return output_path
@@ -0,0 +1,56 @@
+class CaptionSchedule:
+    """
+    Tracks which of a set of inclusive frame intervals are active as frames advance.
+
+    Start and end events are sorted once, and advance() consumes only the events between the previous frame
+    and this one, so stepping through a video costs amortized O(1) per frame rather than a scan of every
+    interval. It also reports whether the active set changed, so callers can reuse whatever they built for
+    the previous frame. Stepping backwards replays the events from the beginning.
+    """
+
+    def __init__(self, intervals):
+        self.intervals = list(intervals)
+        self._starts = sorted(range(len(self.intervals)), key=lambda index: self.intervals[index][0])
+        self._ends = sorted(range(len(self.intervals)), key=lambda index: self.intervals[index][1])
+        self.reset()
+
+    def reset(self):
+        self._next_start = 0
+        self._next_end = 0
+        self._active = set()
+        self._frame = None
+        # Indices of the active intervals in ascending order, and whether the last advance() changed them
+        self.active = ()
+        self.changed = False
+
+    def advance(self, frame):
+        """Moves to frame and returns the active interval indices and whether they changed since the last frame."""
+        if self._frame is not None and frame < self._frame:
+            previous = self.active
+            self.reset()
+        else:
+            previous = None
+
+        changed = False
+        while self._next_start < len(self._starts) and self.intervals[self._starts[self._next_start]][0] <= frame:
+            index = self._starts[self._next_start]
+            self._next_start += 1
+            # Intervals that both started and ended since the last frame are never active
+            if self.intervals[index][1] >= frame:
+                self._active.add(index)
+                changed = True
+
+        while self._next_end < len(self._ends) and self.intervals[self._ends[self._next_end]][1] < frame:
+            index = self._ends[self._next_end]
+            self._next_end += 1
+            if index in self._active:
+                self._active.remove(index)
+                changed = True
+
+        if changed:
+            self.active = tuple(sorted(self._active))
+        if previous is not None:
+            changed = self.active != previous
+        self._frame = frame
+        self.changed = changed
+        return self.active, changed
@@ -7,15 +7,31 @@ from google.cloud import firestore as fs
 from firebase_admin import storage
 import base64
 import os
+import shutil
 from datetime import datetime, timedelta
 import json
 from dotenv import load_dotenv
-from io import BytesIO
 import pandas as pd
+
+from serverless_backend.services.blob_cache import BlobCache
+from serverless_backend.services.blob_transfer import ChunkedTransfer
+from serverless_backend.services.ranged_blob import BucketRangeBackend, LocalRangeBackend, RangedBlobFile
 load_dotenv()
 
 
+def _default_blob_cache():
+    # Lambda keeps /tmp between warm invocations; by default the cache may use a quarter of it
+    cache_dir = os.path.join(tempfile.gettempdir(), 'blob-cache')
+    max_bytes = os.getenv('BLOB_CACHE_MAX_BYTES')
+    if max_bytes is None:
+        max_bytes = shutil.disk_usage(tempfile.gettempdir()).total // 4
+    return BlobCache(cache_dir, int(max_bytes))
+
+
 class FirebaseService:
+    # Shared by every instance, routes create a new FirebaseService per request
+    blob_cache = _default_blob_cache()
+
     def __init__(self):
         # Initialize the app with a service account, granting admin privileges
         encoded_json_str = os.getenv('SERVICE_ACCOUNT_ENCODED')
@@ -29,6 +45,11 @@ class FirebaseService:
             })
         self.db = firestore.client()
         self.bucket = storage.bucket()
+        # Ranged reads can be served from a local directory instead of the bucket, for running offline
+        local_storage_dir = os.getenv('FIREBASE_LOCAL_STORAGE_DIR')
+        self.range_backend = LocalRangeBackend(local_storage_dir) if local_storage_dir else BucketRangeBackend(self.bucket)
+        # Large blobs are moved as parallel byte ranges rather than one stream
+        self.transfer = ChunkedTransfer(self.range_backend)
 
     def get_document(self, collection_name, document_id):
         # Retrieve an instance of a CollectionReference
@@ -53,43 +74,56 @@ class FirebaseService:
         docs = collection_ref.stream()
         return [doc.to_dict() for doc in docs]
 
+    def _download_through_cache(self, blob_name, destination_file_name):
+        """
+        Downloads a blob to destination_file_name through the local blob cache, keyed by its generation, so
+        fetching the same version again within a worker costs a metadata request rather than a download.
+        """
+        stat = self.range_backend.stat(blob_name)
+        if stat is None:
+            # Let the download raise the usual NotFound
+            self.range_backend.download(blob_name, destination_file_name)
+            return destination_file_name
+        return self.blob_cache.fetch(blob_name, stat['version'], stat['size'], destination_file_name,
+                                     lambda path: self.transfer.download(blob_name, path, stat=stat))
+
     def download_file(self, blob_name, destination_file_name):
         """Downloads a file from Firebase Storage."""
-        blob = self.bucket.blob(blob_name)
-        blob.download_to_filename(destination_file_name)
+        self._download_through_cache(blob_name, destination_file_name)
         return f"File downloaded to {destination_file_name}."
 
     def download_file_to_memory(self, blob_name):
         """Downloads a file from Firebase Storage to memory."""
-        blob = self.bucket.blob(blob_name)
-        in_memory_file = BytesIO()
-        blob.download_to_file(in_memory_file)
-        in_memory_file.seek(0)  # Move to the beginning of the BytesIO buffer
-        return in_memory_file
+        return self.transfer.download_to_memory(blob_name)
+
+    def open_blob(self, blob_name, read_ahead=256 * 1024):
+        """
+        Opens a blob as a seekable, read-only file object that only fetches the byte ranges that are read,
+        so a parser that seeks (e.g. the wave module) pulls the header and the parts it needs, not the whole file.
+        """
+        return RangedBlobFile(self.range_backend, blob_name, read_ahead=read_ahead)
+
+    def get_ranged_source(self, blob_name, expiration=3600):
+        """
+        An input FFmpeg can read a blob from with range requests, seeking straight to the moov atom and the
+        ranges it decodes instead of waiting for the whole file to download.
+        """
+        return self.range_backend.url(blob_name, expiration=expiration)
 
     def update_message(self,  document_id, message):
         try:
             # Get a reference to the document
             doc_ref = self.db.collection("requests").document(document_id)
 
-            # Get the current document
-            doc = doc_ref.get()
-
             # Prepare the new log entry
             new_log = {
                 "message": message,
                 "timestamp": datetime.now()
             }
 
-            # Get the current logs or initialize an empty list
-            current_logs = doc.to_dict().get("logs", []) if doc.exists else []
-
-            # Append the new log
-            updated_logs = current_logs + [new_log]
-
-            # Update the document
+            # Append the log on the server instead of reading and rewriting the whole array
             doc_ref.update({
-                "logs": updated_logs,
+                "logs": fs.ArrayUnion([new_log]),
                 "progress_message": message,
                 "last_updated": datetime.now()
             })
@@ -157,15 +191,13 @@ class FirebaseService:
 
     def download_file_to_temp(self, blob_name, suffix=".mp4"):
         """Downloads a file from Firebase Storage to a temporary file and returns the file path."""
-        blob = self.bucket.blob(blob_name)
-        _, temp_local_path = tempfile.mkstemp(suffix=suffix)
-        blob.download_to_filename(temp_local_path)
-        return temp_local_path
+        fd, temp_local_path = tempfile.mkstemp(suffix=suffix)
+        os.close(fd)
+        return self._download_through_cache(blob_name, temp_local_path)
 
     def upload_file_from_temp(self, file_path, destination_blob_name):
         """Uploads a file from a temporary file to Firebase Storage."""
-        blob = self.bucket.blob(destination_blob_name)
-        blob.upload_from_filename(file_path)
+        self.transfer.upload(file_path, destination_blob_name)
         os.remove(file_path)
 
     def upload_file_from_memory(self, file_data, destination_blob_name):
@@ -186,12 +218,40 @@ class FirebaseService:
                 content = file_data.read()
                 blob.upload_from_string(content)
 
+    def delete_file(self, blob_name):
+        """Deletes a file from Firebase Storage, if it exists."""
+        if self.range_backend.stat(blob_name) is not None:
+            self.range_backend.delete(blob_name)
+
     def update_document(self, collection_name, document_id, update_fields):
         """Updates specific fields of a document."""
         doc_ref = self.db.collection(collection_name).document(document_id)
         doc_ref.update(update_fields)
         return f"Document {document_id} in {collection_name} updated."
 
+    def batch_update_documents(self, updates):
+        """
+        Updates several documents in batched writes.
+
+        :param updates: Dictionary mapping (collection_name, document_id) to the fields to update
+        """
+        batch = self.db.batch()
+        batch_count = 0
+        max_batch_size = 500  # Firestore allows up to 500 operations per batch
+
+        for (collection_name, document_id), update_fields in updates.items():
+            batch.update(self.db.collection(collection_name).document(document_id), update_fields)
+            batch_count += 1
+
+            if batch_count >= max_batch_size:
+                batch.commit()
+                batch = self.db.batch()
+                batch_count = 0
+
+        # Commit any remaining operations
+        if batch_count > 0:
+            batch.commit()
+
     def upsert_document(self, collection_name, document_id, document_data):
         """
         Updates a document if it exists, or inserts a new one if it doesn't.
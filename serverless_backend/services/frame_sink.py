@@ -0,0 +1,106 @@
+import subprocess
+import tempfile
+import time
+
+
+class FrameSink:
+    """
+    Encodes raw frames with FFmpeg as they are written, in place of cv2.VideoWriter.
+
+    Frames go to FFmpeg's stdin as raw `input_pix_fmt` pixels and come out as `codec` (libx264 by default) at
+    the given preset and CRF, so the output is a compact H.264 file rather than an mp4v or MJPG intermediate.
+    `input_args` are added after the frame input, for more inputs such as audio tracks, and `output_args`
+    before the video codec options, for filters, maps and audio codecs.
+
+    Use it as a context manager; leaving the block closes stdin and waits for FFmpeg, raising RuntimeError with
+    its stderr if it fails, and an exception inside the block kills FFmpeg. The encode rate is printed and
+    kept in `stats`.
+    """
+
+    def __init__(self, output_path, width, height, fps, input_pix_fmt='bgr24', codec='libx264', pix_fmt='yuv420p',
+                 preset='medium', crf=23, input_args=(), output_args=()):
+        self.output_path = output_path
+        self.width = width
+        self.height = height
+        self.fps = fps
+        self.input_pix_fmt = input_pix_fmt
+        self.codec = codec
+        self.pix_fmt = pix_fmt
+        self.preset = preset
+        self.crf = crf
+        self.input_args = list(input_args)
+        self.output_args = list(output_args)
+        self.process = None
+        self.frames_written = 0
+        self.stats = None
+        self._stderr_file = None
+        self._start_time = None
+        self._broken = False
+
+    def command(self, input_path='pipe:0'):
+        """The FFmpeg command, reading raw frames from input_path, which can also be a raw file on disk."""
+        command = [
+            'ffmpeg',
+            '-v', 'error',
+            '-f', 'rawvideo',
+            '-pix_fmt', self.input_pix_fmt,
+            '-s', f'{self.width}x{self.height}',
+            '-r', str(self.fps),
+            '-i', input_path,
+            *self.input_args,
+            *self.output_args,
+            '-c:v', self.codec,
+        ]
+        if self.preset is not None:
+            command += ['-preset', self.preset]
+        if self.crf is not None:
+            command += ['-crf', str(self.crf)]
+        if self.pix_fmt is not None:
+            command += ['-pix_fmt', self.pix_fmt]
+        return command + ['-y', self.output_path]
+
+    def __enter__(self):
+        self._stderr_file = tempfile.TemporaryFile()
+        self.process = subprocess.Popen(self.command(), stdin=subprocess.PIPE, stdout=subprocess.DEVNULL,
+                                        stderr=self._stderr_file)
+        self._start_time = time.perf_counter()
+        return self
+
+    def write(self, frame):
+        """Writes one frame, a numpy array or bytes in input_pix_fmt at the sink's size."""
+        if self._broken:
+            return
+        try:
+            self.process.stdin.write(frame if isinstance(frame, bytes) else frame.tobytes())
+            self.frames_written += 1
+        except BrokenPipeError:
+            # FFmpeg exited early, its return code and stderr say why when the sink closes
+            self._broken = True
+
+    def __exit__(self, exc_type, exc, traceback):
+        try:
+            if exc_type is not None:
+                self.process.kill()
+                self.process.wait()
+                return False
+
+            try:
+                self.process.stdin.close()
+            except BrokenPipeError:
+                pass
+            if self.process.wait() != 0:
+                self._stderr_file.seek(0)
+                raise RuntimeError(f"FFmpeg failed to encode {self.output_path}: "
+                                   f"{self._stderr_file.read().decode(errors='replace')}")
+        finally:
+            self._stderr_file.close()
+
+        seconds = time.perf_counter() - self._start_time
+        self.stats = {
+            "frames": self.frames_written,
+            "seconds": seconds,
+            "fps": self.frames_written / seconds if seconds > 0 else float('inf'),
+        }
+        print(f"Encoded {self.frames_written} frames to {self.output_path} in {seconds:.2f}s "
+              f"({self.stats['fps']:.1f} fps)")
+        return False
@@ -157,6 +157,95 @@ class OpenAIService():
         response = json.loads(completion.choices[0].message.tool_calls[0].function.arguments)
         return response
 
+    def summarise_segment(self, segment_index, segment_text):
+        """
+        Summarises and names one segment on its own, without the summary of the segments before it, so every
+        segment of a video can be summarised at once. merge_segment_summary builds the rolling summary.
+        """
+        tools = [
+            {
+                "type": "function",
+                "function": {
+                    "name": "summarise_segment",
+                    "description": "Summarise the segment given, and give a catchy fun name to the segment.",
+                    "parameters": {
+                        "type": "object",
+                        "properties": {
+                            "segment_summary": {
+                                "type": "string",
+                                "description": "The summary of the current segment provided",
+                            },
+                            "segment_title": {
+                                "type": "string",
+                                "description": "The title to the new segment."
+                            },
+                        }
+                    },
+                }
+            }
+        ]
+
+        prompt = (
+                  f"Segment Index: {segment_index}, \n"
+                  f"Segment Transcript: {segment_text}, \n"
+                  f"Your Response:")
+        completion = self.client.chat.completions.create(
+            model="gpt-3.5-turbo",
+            messages=[
+                {"role": "system",
+                 "content": "You are a topical segment describer. Your goal is to take in a segment index and a subset of the diarized transcript of a video, and call the function summarise_segment. For the parameters, provide a summary of the segment in the parameter segment_summary try to include information that stands out in the example segment. For the segment_title, give a fun exciting name for the segment."},
+                {"role": "user", "content": prompt}
+            ],
+            tools=tools,
+            tool_choice={"type": "function", "function": {"name": "summarise_segment"}}
+        )
+
+        response = json.loads(completion.choices[0].message.tool_calls[0].function.arguments)
+        return response
+
+    def merge_segment_summary(self, segment_index, segment_summary, previous_summary):
+        """
+        Updates the running summary of a video's segments with the next segment's summary. Only the short
+        summaries are sent, not the transcript, so this is the cheap part of summarising a segment.
+        """
+        tools = [
+            {
+                "type": "function",
+                "function": {
+                    "name": "update_combined_summary",
+                    "description": "Update the previous segments summary to now include the information captured from the new segment summary.",
+                    "parameters": {
+                        "type": "object",
+                        "properties": {
+                            "new_combined_summary": {
+                                "type": "string",
+                                "description": "The new continuous summary of all the previous segments to now include the new most recent segment"
+                            },
+                        }
+                    },
+                }
+            }
+        ]
+
+        prompt = (
+                  f"Segment Index: {segment_index}, \n"
+                  f"Previous Segments Summary: {previous_summary} \n"
+                  f"New Segment Summary: {segment_summary}, \n"
+                  f"Your Response:")
+        completion = self.client.chat.completions.create(
+            model="gpt-3.5-turbo",
+            messages=[
+                {"role": "system",
+                 "content": "You keep a running summary of a video. Investigate the Previous Segments Summary and call the function update_combined_summary with it updated to include some information about what we've learned from the new segment summary, this summary should be brief and will be used to understand what's occured in the video so far."},
+                {"role": "user", "content": prompt}
+            ],
+            tools=tools,
+            tool_choice={"type": "function", "function": {"name": "update_combined_summary"}}
+        )
+
+        response = json.loads(completion.choices[0].message.tool_calls[0].function.arguments)
+        return response.get("new_combined_summary", previous_summary)
+
     def get_embedding(self, text):
         try:
             response = self.client.embeddings.create(
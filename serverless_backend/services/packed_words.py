@@ -0,0 +1,95 @@
+import struct
+
+import numpy as np
+
+# Magic, word count, string table size, the byte width of the word ids, and the time the float32 times count from
+_HEADER = struct.Struct('<4sIIBd')
+_MAGIC = b'PWD1'
+
+
+def pack_words(words):
+    """
+    Packs a segment's word dicts into a compact columnar blob for the `words_packed` field.
+
+    Each distinct word is stored once in a string table and the words become ids into it. Start and end times
+    and confidences are float32 columns, with NaN for a missing value, and the global word indices an int32
+    column, with -1 for a missing one. Times are stored relative to the segment's earliest time, so float32
+    keeps them to the millisecond however far into the video the segment is. Other keys on the words are dropped.
+    """
+    table = {}
+    ids = [table.setdefault(word['word'], len(table)) for word in words]
+    strings = [string.encode('utf-8') for string in table]
+    id_dtype = np.uint16 if len(strings) <= 0xFFFF else np.uint32
+
+    def values(key, dtype, missing):
+        return np.array([missing if word.get(key) is None else word[key] for word in words], dtype=dtype)
+
+    start_times = values('start_time', np.float64, np.nan)
+    end_times = values('end_time', np.float64, np.nan)
+    known_times = np.concatenate([start_times, end_times])
+    known_times = known_times[~np.isnan(known_times)]
+    base_time = float(known_times.min()) if known_times.size else 0.0
+
+    return b''.join([
+        _HEADER.pack(_MAGIC, len(words), len(strings), np.dtype(id_dtype).itemsize, base_time),
+        np.array([len(string) for string in strings], dtype=np.uint32).tobytes(),
+        b''.join(strings),
+        np.array(ids, dtype=id_dtype).tobytes(),
+        (start_times - base_time).astype('<f4').tobytes(),
+        (end_times - base_time).astype('<f4').tobytes(),
+        values('confidence', '<f4', np.nan).tobytes(),
+        values('index', '<i4', -1).tobytes(),
+    ])
+
+
+def unpack_words(data):
+    """
+    Decodes a blob from pack_words back into word dicts with word, start_time, end_time, confidence and index.
+    Times are rounded to the millisecond and confidences to six places, so the usual values come back unchanged.
+    """
+    data = bytes(data)
+    if len(data) < _HEADER.size:
+        raise ValueError("Packed words are truncated")
+    magic, count, string_count, id_width, base_time = _HEADER.unpack_from(data)
+    if magic != _MAGIC:
+        raise ValueError(f"Unknown packed words format {magic!r}")
+
+    offset = _HEADER.size
+    lengths = np.frombuffer(data, dtype=np.uint32, count=string_count, offset=offset)
+    offset += lengths.nbytes
+    ends = np.cumsum(lengths, dtype=np.int64) + offset
+    starts = ends - lengths
+    strings = [data[start:end].decode('utf-8') for start, end in zip(starts.tolist(), ends.tolist())]
+    offset = int(ends[-1]) if string_count else offset
+
+    def column(dtype):
+        nonlocal offset
+        values = np.frombuffer(data, dtype=dtype, count=count, offset=offset)
+        offset += values.nbytes
+        return values
+
+    try:
+        ids = column({2: '<u2', 4: '<u4'}[id_width])
+        start_times, end_times, confidences = column('<f4'), column('<f4'), column('<f4')
+        indices = column('<i4')
+    except (KeyError, ValueError) as e:
+        raise ValueError(f"Corrupt packed words: {e}")
+
+    def to_list(values, digits, offset=0.0):
+        values = (values.astype(np.float64) + offset).round(digits)
+        missing = np.isnan(values)
+        values = values.tolist()
+        if missing.any():
+            values = [None if is_missing else value for value, is_missing in zip(values, missing.tolist())]
+        return values
+
+    index_list = indices.tolist()
+    if (indices < 0).any():
+        index_list = [None if index < 0 else index for index in index_list]
+
+    return [
+        {'word': strings[word_id], 'start_time': start_time, 'end_time': end_time, 'confidence': confidence,
+         'index': index}
+        for word_id, start_time, end_time, confidence, index in zip(
+            ids.tolist(), to_list(start_times, 3, base_time), to_list(end_times, 3, base_time), to_list(confidences, 6), index_list)
+    ]
@@ -1,6 +1,8 @@
 import json
 import ast
 
+from serverless_backend.services.packed_words import unpack_words
+
 def fix_string_representation(input_string):
     # Check if the string starts with a double quote
     if input_string.startswith('"'):
@@ -25,6 +27,9 @@ def fix_string_representation(input_string):
 
 
 def parse_segment_words(segment_document):
+    # Segments are written with packed words, older ones still have the stringified list
+    if segment_document.get('words_packed') is not None:
+        return unpack_words(segment_document['words_packed'])
     try:
         return fix_string_representation(segment_document['words'])
     except (ValueError, SyntaxError, json.JSONDecodeError) as e:
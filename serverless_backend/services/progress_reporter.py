@@ -0,0 +1,135 @@
+import threading
+import time
+from datetime import datetime
+
+from google.cloud import firestore as fs
+
+
+class ProgressReporter:
+    """
+    Reports a request's progress and messages to Firestore without blocking the caller.
+
+    update_progress() and update_message() only record the latest state; a background thread merges
+    everything recorded since its last write into one batched write to the request (and short) document.
+    Writes happen at most once per `interval` seconds, or straight away when progress has moved by at least
+    `min_progress_change` percent. Every message is still appended to the request's logs, with ArrayUnion so
+    the document never has to be read back. close() writes whatever is left, call it when the request
+    finishes or fails.
+    """
+
+    def __init__(self, firebase_service, request_id, short_id=None, interval=1.0, min_progress_change=5.0):
+        self.firebase_service = firebase_service
+        self.request_id = request_id
+        self.short_id = short_id
+        self.interval = interval
+        self.min_progress_change = min_progress_change
+
+        self._condition = threading.Condition()
+        self._write_lock = threading.Lock()
+        self._progress = None
+        self._message = None
+        self._logs = []
+        self._urgent = False
+        self._closed = False
+        self._last_written_progress = None
+        self._last_write_time = 0.0
+        self._thread = threading.Thread(target=self._run, daemon=True)
+        self._thread.start()
+
+    def update_progress(self, progress):
+        with self._condition:
+            self._progress = progress
+            if (self._last_written_progress is None or
+                    abs(progress - self._last_written_progress) >= self.min_progress_change):
+                self._urgent = True
+            # Wake the writer even for a small change, so it schedules the write for `interval` from now
+            # rather than waiting with nothing pending
+            self._condition.notify()
+
+    def update_message(self, message):
+        with self._condition:
+            self._message = message
+            self._logs.append({"message": message, "timestamp": datetime.now()})
+            self._condition.notify()
+
+    def _has_pending(self):
+        return self._progress is not None or self._message is not None
+
+    def _seconds_until_due(self):
+        if not self._has_pending():
+            return None
+        if self._urgent:
+            return 0.0
+        return max(0.0, self._last_write_time + self.interval - time.monotonic())
+
+    def _run(self):
+        while True:
+            with self._condition:
+                while not self._closed:
+                    wait = self._seconds_until_due()
+                    if wait == 0.0:
+                        break
+                    self._condition.wait(timeout=wait)
+                if self._closed:
+                    return
+            self.flush()
+
+    def _take_pending(self):
+        with self._condition:
+            progress, message, logs = self._progress, self._message, self._logs
+            self._progress, self._message, self._logs = None, None, []
+            self._urgent = False
+            if progress is not None:
+                self._last_written_progress = progress
+            self._last_write_time = time.monotonic()
+        return progress, message, logs
+
+    def _build_updates(self, progress, message, logs):
+        request_fields = {}
+        short_fields = {}
+
+        if progress is not None:
+            request_fields["progress"] = progress
+            short_fields["update_progress"] = progress
+
+        if message is not None:
+            request_fields.update({
+                "logs": fs.ArrayUnion(logs),
+                "progress_message": message,
+                "last_updated": datetime.now()
+            })
+            short_fields.update({
+                "progress_message": message,
+                "last_updated": fs.SERVER_TIMESTAMP
+            })
+
+        updates = {("requests", self.request_id): request_fields}
+        if self.short_id:
+            updates[("shorts", self.short_id)] = short_fields
+        return updates
+
+    def flush(self):
+        """Writes everything recorded so far in one batch, from the calling thread."""
+        # Holding the write lock keeps writes in the order their state was recorded
+        with self._write_lock:
+            progress, message, logs = self._take_pending()
+            if progress is None and message is None:
+                return
+            try:
+                self.firebase_service.batch_update_documents(self._build_updates(progress, message, logs))
+            except Exception as e:
+                print(f"Failed to report progress for {self.request_id}: {str(e)}")
+
+    def close(self):
+        """Stops the background writer and writes any remaining progress and messages."""
+        with self._condition:
+            self._closed = True
+            self._condition.notify()
+        self._thread.join()
+        self.flush()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
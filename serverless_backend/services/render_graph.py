@@ -0,0 +1,142 @@
+import os
+import tempfile
+
+import cv2
+
+from serverless_backend.services.add_text_to_video_service import AddTextToVideoService
+from serverless_backend.services.frame_sink import FrameSink
+
+
+def _pad(stream):
+    """Filtergraph pad for a stream, input streams like 1:a are written [1:a]."""
+    return stream if stream.startswith('[') else f'[{stream}]'
+
+
+class RenderGraph:
+    """
+    Describes how a finished short is assembled from a clipped video, then renders it in a single pass.
+
+    Steps are collected first (text overlay, voice track, background music, intro), and render() decodes the
+    clipped video once, draws the text on each frame, and pipes the frames into one FFmpeg process that mixes
+    the audio, prepends the intro and encodes the result. This replaces a chain of separate encodes, each
+    with its own temp file and generation loss.
+    """
+
+    def __init__(self, input_video_path, text_service=None):
+        self.input_video_path = input_video_path
+        self.text_service = text_service or AddTextToVideoService()
+        self.text_additions = []
+        self.voice_track_path = None
+        self.background_music_path = None
+        self.background_volume_percent = None
+        self.intro_video_path = None
+
+    def add_text(self, text_additions):
+        self.text_additions.extend(text_additions)
+        return self
+
+    def set_voice_track(self, audio_path):
+        self.voice_track_path = audio_path
+        return self
+
+    def add_background_music(self, audio_path, volume_percent):
+        """Loops the music under the voice track for the length of the video, at volume_percent of its level."""
+        self.background_music_path = audio_path
+        self.background_volume_percent = volume_percent
+        return self
+
+    def prepend_intro(self, intro_video_path):
+        self.intro_video_path = intro_video_path
+        return self
+
+    def _frame_sink(self, output_path, width, height, fps, duration):
+        """A FrameSink for the composited frames, with the audio inputs and filters the steps need."""
+        input_args = []
+        filters = []
+        output_args = []
+        input_index = 1
+        # Streams are named by their -map argument, input streams like 1:a and filter outputs like [mixed]
+        video_stream = '0:v'
+        audio_stream = None
+
+        if self.voice_track_path:
+            input_args += ['-i', self.voice_track_path]
+            audio_stream = f'{input_index}:a'
+            input_index += 1
+
+        if self.background_music_path:
+            input_args += ['-stream_loop', '-1', '-i', self.background_music_path]
+            volume = self.background_volume_percent / 100.0
+            filters.append(f'[{input_index}:a]volume={volume},atrim=end={duration}[music]')
+            input_index += 1
+
+            if audio_stream:
+                # Like a moviepy CompositeAudioClip: the voice is cut or padded to the video and summed with the music
+                filters.append(f'{_pad(audio_stream)}atrim=end={duration},apad=whole_dur={duration}[voice]')
+                filters.append('[voice][music]amix=inputs=2:duration=first:normalize=0[mixed]')
+                audio_stream = '[mixed]'
+            else:
+                audio_stream = '[music]'
+
+        if self.intro_video_path:
+            input_args += ['-i', self.intro_video_path]
+            if audio_stream is None:
+                filters.append(f'anullsrc=channel_layout=stereo:sample_rate=44100,atrim=end={duration}[silence]')
+                audio_stream = '[silence]'
+            filters.append(f'[{input_index}:v]scale={width}:{height},setsar=1[intro]')
+            filters.append(f'[intro][{input_index}:a]{_pad(video_stream)}{_pad(audio_stream)}'
+                           f'concat=n=2:v=1:a=1[outv][outa]')
+            video_stream, audio_stream = '[outv]', '[outa]'
+            input_index += 1
+
+        if filters:
+            output_args += ['-filter_complex', ';'.join(filters)]
+
+        output_args += ['-map', video_stream]
+        if audio_stream:
+            output_args += ['-map', audio_stream]
+
+        output_args += ['-c:a', 'aac', '-b:a', '192k', '-movflags', '+faststart']
+        return FrameSink(output_path, width, height, fps, preset='medium', crf=23, input_args=input_args,
+                         output_args=output_args)
+
+    def render(self, update_progress=None):
+        """Renders every step in one decode, composite and encode pass, returning the output video path."""
+        cap = cv2.VideoCapture(self.input_video_path)
+        if not cap.isOpened():
+            raise ValueError(f"Error: Could not open video {self.input_video_path}")
+        fps = cap.get(cv2.CAP_PROP_FPS)
+        width = int(cap.get(cv2.CAP_PROP_FRAME_WIDTH))
+        height = int(cap.get(cv2.CAP_PROP_FRAME_HEIGHT))
+        total_frames = int(cap.get(cv2.CAP_PROP_FRAME_COUNT))
+        duration = total_frames / fps
+
+        if self.text_additions:
+            self.text_service.prepare(self.text_additions, width, height, fps)
+
+        with tempfile.NamedTemporaryFile(suffix='.mp4', delete=False) as output_file:
+            output_path = output_file.name
+
+        try:
+            with self._frame_sink(output_path, width, height, fps, duration) as sink:
+                frame_count = 0
+                while True:
+                    ret, frame = cap.read()
+                    if not ret:
+                        break
+
+                    if self.text_additions:
+                        frame = self.text_service.render_frame(frame, frame_count)
+                    sink.write(frame)
+                    frame_count += 1
+
+                    if update_progress and total_frames and frame_count % 100 == 0:
+                        update_progress(frame_count / total_frames * 100)
+        except BaseException:
+            os.remove(output_path)
+            raise
+        finally:
+            cap.release()
+
+        print(f"Rendered video saved to: {output_path}")
+        return output_path
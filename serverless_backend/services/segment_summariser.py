@@ -0,0 +1,80 @@
+from concurrent.futures import ThreadPoolExecutor
+
+
+class SegmentSummariser:
+    """
+    Summarises a video's topical segments with the OpenAI calls for every segment in flight at once.
+
+    Each segment's summary and title, its moderation check and its embedding only need that segment, so they
+    run on a thread pool of `max_workers`. Only the rolling video summary depends on the segment before it,
+    and that merge is a small call on the segment summaries, made in order as each summary arrives while the
+    other segments are still being worked on. The Firestore fields and vector rows are returned for the
+    caller to write in one batch each.
+    """
+
+    def __init__(self, open_ai_service, vector_db, max_workers=8):
+        self.open_ai_service = open_ai_service
+        self.vector_db = vector_db
+        self.max_workers = max_workers
+
+    def _summarise_and_embed(self, segment):
+        summary = self.open_ai_service.summarise_segment(segment['index'], segment['transcript'])
+        segment_summary = summary['segment_summary']
+        segment_title = summary.get('segment_title', "Unable to name segment")
+        segment_text = self.vector_db.generate_segment_text(
+            {**segment, 'segment_summary': segment_summary, 'segment_title': segment_title})
+        return segment_summary, segment_title, self.open_ai_service.get_embedding(segment_text)
+
+    def summarise(self, segments, channel_id, update_progress=None, update_progress_message=None):
+        """
+        :return: A tuple of the Firestore updates, as (collection, document id) to fields, the vector rows for
+            the segments that have an embedding, and the rolling summary of the whole video
+        """
+        updates = {}
+        vector_rows = []
+        combined_summary = ""
+
+        with ThreadPoolExecutor(max_workers=self.max_workers) as executor:
+            # Summaries first, the rolling merge waits on them in order
+            summary_futures = [executor.submit(self._summarise_and_embed, segment) for segment in segments]
+            moderation_futures = [executor.submit(self.open_ai_service.extract_moderation_metrics,
+                                                  segment['transcript']) for segment in segments]
+
+            try:
+                for index, (segment, summary_future, moderation_future) in enumerate(
+                        zip(segments, summary_futures, moderation_futures)):
+                    segment_summary, segment_title, embedding = summary_future.result()
+                    combined_summary = self.open_ai_service.merge_segment_summary(segment['index'], segment_summary,
+                                                                                  combined_summary)
+                    content_moderation = moderation_future.result()
+
+                    updates[("topical_segments", segment["id"])] = {
+                        'segment_summary': segment_summary,
+                        'segment_title': segment_title,
+                        'segment_status': "Segment Summarised",
+                        'flagged': content_moderation['flagged'],
+                        "harassment": content_moderation["harassment"],
+                        "harassment_threatening": content_moderation["harassment_threatening"],
+                        "hate": content_moderation['hate'],
+                        "hate_threatening": content_moderation["hate_threatening"],
+                        "self_harm": content_moderation["self_harm"],
+                        "self_harm_intent": content_moderation['self_harm_intent'],
+                        "sexual": content_moderation['sexual'],
+                        "sexual_minors": content_moderation['sexual_minors'],
+                    }
+                    segment['segment_summary'] = segment_summary
+                    segment['segment_title'] = segment_title
+                    if embedding:
+                        vector_rows.append(self.vector_db.segment_row(segment['id'], segment['video_id'], channel_id,
+                                                                      embedding))
+
+                    if update_progress:
+                        update_progress((index + 1) / len(segments) * 100)
+                    if update_progress_message:
+                        update_progress_message("Description: " + segment_summary[:20] + "...")
+            except BaseException:
+                # Don't start the calls still queued for a summary that has already failed
+                executor.shutdown(wait=False, cancel_futures=True)
+                raise
+
+        return updates, vector_rows, combined_summary
@@ -0,0 +1,136 @@
+import bisect
+
+import numpy as np
+
+
+def nearest_zero_crossing(samples, index, window):
+    """
+    Index of the zero crossing in a mono sample array closest to `index`, searching `window` samples either
+    side. A crossing at i means samples[i - 1] and samples[i] have different signs. Returns `index` when
+    there is no crossing in the window.
+    """
+    low = max(1, index - window)
+    high = min(len(samples), index + window + 1)
+    if high <= low:
+        return index
+
+    signs = np.signbit(samples[low - 1:high])
+    crossings = np.flatnonzero(signs[1:] != signs[:-1]) + low
+    if len(crossings) == 0:
+        return index
+    return int(crossings[np.argmin(np.abs(crossings - index))])
+
+
+class SpanPlanner:
+    """
+    Plans how the kept spans of a recording are joined into a short.
+
+    Word-level cuts leave many spans under 300 ms separated by tiny gaps. The planner merges spans whose gap
+    is below `min_gap` seconds, so the short is built from a few longer spans. Joins are cross-faded over
+    `crossfade` seconds, and the audio of each span can be shifted onto a zero crossing within
+    `zero_crossing_window` seconds, both to avoid clicks. The plan is rendered as a single FFmpeg filter script
+    that cuts and joins the video and audio tracks in one encoder invocation.
+    """
+
+    def __init__(self, min_gap=0.08, crossfade=0.01, zero_crossing_window=0.005):
+        self.min_gap = min_gap
+        self.crossfade = crossfade
+        self.zero_crossing_window = zero_crossing_window
+
+    def merge(self, spans):
+        """Merges (start, end) spans in seconds that overlap or are less than min_gap apart, dropping empty ones."""
+        merged = []
+        for start, end in spans:
+            if end <= start:
+                continue
+            if merged and start - merged[-1][1] < self.min_gap:
+                merged[-1] = (merged[-1][0], max(merged[-1][1], end))
+            else:
+                merged.append((start, end))
+        return merged
+
+    def output_times(self, spans, times):
+        """
+        Where each source time lands in the output joined from the merged `spans`. A time in a gap between
+        spans maps to the join, and a time after the last span to the end of the output.
+        """
+        starts = [start for start, _ in spans]
+        offsets = [0.0]
+        for start, end in spans:
+            offsets.append(offsets[-1] + end - start)
+
+        output = []
+        for time in times:
+            index = bisect.bisect_right(starts, time) - 1
+            if index < 0:
+                output.append(0.0)
+            else:
+                start, end = spans[index]
+                output.append(offsets[index] + min(time, end) - start)
+        return output
+
+    def retime_words(self, words):
+        """
+        Copies of the kept words with their times moved onto the short cut from them, that is the output of
+        the merge of the words' own spans, so captions stay in sync with the gaps the merge keeps.
+        """
+        spans = self.merge([(word['start_time'], word['end_time']) for word in words])
+        starts = self.output_times(spans, [word['start_time'] for word in words])
+        ends = self.output_times(spans, [word['end_time'] for word in words])
+        return [{**word, 'start_time': start, 'end_time': end} for word, start, end in zip(words, starts, ends)]
+
+    def crossfades(self, spans):
+        """Cross-fade length in seconds for each join, never more than half of either span."""
+        return [
+            min(self.crossfade, (spans[i][1] - spans[i][0]) / 2, (spans[i + 1][1] - spans[i + 1][0]) / 2)
+            for i in range(len(spans) - 1)
+        ]
+
+    def snap_to_zero_crossings(self, spans, samples, sample_rate):
+        """
+        Moves each span so that it starts on a zero crossing of the mono `samples`, keeping its length so the
+        total duration, and sync with a video cut on the original times, is unchanged. The end of each span
+        is hidden by the cross-fade into the next.
+        """
+        window = int(self.zero_crossing_window * sample_rate)
+        snapped = []
+        for start, end in spans:
+            index = int(round(start * sample_rate))
+            shift = (nearest_zero_crossing(samples, index, window) - index) / sample_rate
+            if start + shift < 0:
+                shift = 0.0
+            snapped.append((start + shift, end + shift))
+        return snapped
+
+    def filter_script(self, spans, video=True, audio=True):
+        """
+        FFmpeg filtergraph that cuts the spans out of input 0 and joins them, labelled [outv] and [outa].
+
+        Video spans are trimmed and concatenated. Each audio span except the last is trimmed with an extra
+        cross-fade's worth of audio after its end, which acrossfade then blends into the start of the next
+        span, so the audio comes out exactly as long as the video.
+        """
+        crossfades = self.crossfades(spans) + [0.0]
+        filters = []
+
+        if video:
+            for i, (start, end) in enumerate(spans):
+                filters.append(f"[0:v]trim=start={start:.6f}:end={end:.6f},setpts=PTS-STARTPTS[v{i}]")
+            inputs = "".join(f"[v{i}]" for i in range(len(spans)))
+            filters.append(f"{inputs}concat=n={len(spans)}:v=1:a=0[outv]")
+
+        if audio:
+            for i, (start, end) in enumerate(spans):
+                filters.append(f"[0:a]atrim=start={start:.6f}:end={end + crossfades[i]:.6f},"
+                               f"asetpts=PTS-STARTPTS[a{i}]")
+            joined = "[a0]"
+            for i in range(1, len(spans)):
+                label = f"[j{i}]"
+                if crossfades[i - 1] > 0:
+                    filters.append(f"{joined}[a{i}]acrossfade=d={crossfades[i - 1]:.6f}:c1=tri:c2=tri{label}")
+                else:
+                    filters.append(f"{joined}[a{i}]concat=n=2:v=0:a=1{label}")
+                joined = label
+            filters.append(f"{joined}anull[outa]")
+
+        return ";\n".join(filters)
@@ -0,0 +1,40 @@
+import numpy as np
+
+
+class TextSprite:
+    """
+    A pre-rendered RGBA overlay cropped to its visible pixels and placed at (x, y) in the frame.
+
+    The colour is premultiplied by alpha once, when the sprite is made, so compositing it onto a frame is
+    integer math over the sprite's own rectangle rather than float math over the whole frame.
+    """
+
+    def __init__(self, rgba, x, y):
+        alpha = rgba[:, :, 3:4].astype(np.uint16)
+        self.x = x
+        self.y = y
+        self.height, self.width = rgba.shape[:2]
+        # With the +127 the blend rounds to nearest, and it never exceeds 255 * 255 + 127, so it fits in uint16
+        self.colour = rgba[:, :, :3].astype(np.uint16) * alpha + 127
+        self.inverse_alpha = 255 - alpha
+
+    @classmethod
+    def crop(cls, rgba, x=0, y=0):
+        """The sprite for the non-transparent part of an RGBA array placed at (x, y), or None if it is all transparent."""
+        rows = np.flatnonzero(rgba[:, :, 3].any(axis=1))
+        if rows.size == 0:
+            return None
+        columns = np.flatnonzero(rgba[:, :, 3].any(axis=0))
+        top, bottom = rows[0], rows[-1] + 1
+        left, right = columns[0], columns[-1] + 1
+        return cls(rgba[top:bottom, left:right], x + int(left), y + int(top))
+
+    def blend(self, frame):
+        """Alpha-blends the sprite onto the uint8 frame in place."""
+        region = frame[self.y:self.y + self.height, self.x:self.x + self.width]
+        blended = region * self.inverse_alpha
+        blended += self.colour
+        # Exact division by 255 for values below 65535
+        blended += (blended >> 8) + 1
+        blended >>= 8
+        region[:] = blended
@@ -47,12 +47,17 @@ class ZilizVectorDB:
         open_ai = OpenAIService()
         embedding = open_ai.get_embedding(text)
         if embedding:
-            self.insert_to_collection(
-                'segments',
-                data=[{
-                    'segments_id': segment_id,
-                    'textual_vector': embedding,
-                    'video_id': video_id,
-                    'channel_id': channel_id
-                }]
-            )
\ No newline at end of file
+            self.insert_to_collection('segments', data=[self.segment_row(segment_id, video_id, channel_id, embedding)])
+
+    def segment_row(self, segment_id, video_id, channel_id, embedding):
+        return {
+            'segments_id': segment_id,
+            'textual_vector': embedding,
+            'video_id': video_id,
+            'channel_id': channel_id
+        }
+
+    def upload_segment_embeddings(self, rows):
+        """Inserts the rows from segment_row in one request."""
+        if rows:
+            self.insert_to_collection('segments', data=rows)
@@ -0,0 +1,92 @@
+from collections import deque
+
+import cv2
+import numpy as np
+
+
+class AdaptiveShotDetector:
+    """
+    Streaming shot boundary detector based on HSV colour histograms.
+
+    Frames are fed in one at a time with update(). A cut is declared at frame i when:
+    - the Bhattacharyya distance between the histograms of frames i - 1 and i is above an adaptive
+      threshold, the rolling mean plus threshold_std rolling standard deviations of the last
+      window_size distances, and never below min_distance
+    - at least min_shot_length frames have passed since the previous cut
+    - frame i + flash_frames is still that far from frame i - 1, so flashes and brief occlusions
+      that return to the previous shot are rejected
+
+    Cuts are reported as soon as they are confirmed, flash_frames frames after they happen.
+    """
+
+    def __init__(self, window_size=48, threshold_std=4.0, min_distance=0.3, min_shot_length=12, flash_frames=4,
+                 bins=(16, 4, 4)):
+        self.window_size = window_size
+        self.threshold_std = threshold_std
+        self.min_distance = min_distance
+        self.min_shot_length = min_shot_length
+        self.flash_frames = flash_frames
+        self.bins = bins
+        self.reset()
+
+    def reset(self):
+        """Forget all previous frames so the detector can be used on a new video."""
+        self._distances = deque(maxlen=self.window_size)
+        self._previous_histogram = None
+        self._frame_index = -1
+        self._last_cut = 0
+        self._candidate = None  # (frame index, threshold, histogram of the frame before the candidate cut)
+
+    def _histogram(self, frame):
+        hsv = cv2.cvtColor(frame, cv2.COLOR_BGR2HSV)
+        histogram = cv2.calcHist([hsv], [0, 1, 2], None, list(self.bins), [0, 180, 0, 256, 0, 256])
+        return histogram.flatten()
+
+    def _threshold(self):
+        if len(self._distances) < 2:
+            return self.min_distance
+        return max(self.min_distance, float(np.mean(self._distances) + self.threshold_std * np.std(self._distances)))
+
+    def update(self, frame):
+        """Adds the next BGR frame and returns the frame indices of any cuts confirmed by it."""
+        self._frame_index += 1
+        histogram = self._histogram(frame)
+        cuts = []
+
+        if self._previous_histogram is not None:
+            distance = cv2.compareHist(self._previous_histogram, histogram, cv2.HISTCMP_BHATTACHARYYA)
+            threshold = self._threshold()
+
+            if (distance > threshold and self._candidate is None and
+                    self._frame_index - self._last_cut >= self.min_shot_length):
+                self._candidate = (self._frame_index, threshold, self._previous_histogram)
+            elif distance <= threshold:
+                # Only distances within a shot feed the rolling statistics
+                self._distances.append(distance)
+
+        if self._candidate is not None and self._frame_index - self._candidate[0] >= self.flash_frames:
+            cuts.extend(self._resolve_candidate(histogram))
+
+        self._previous_histogram = histogram
+        return cuts
+
+    def finish(self):
+        """Resolves a cut still waiting for its flash check at the end of the video."""
+        if self._candidate is None or self._previous_histogram is None:
+            return []
+        return self._resolve_candidate(self._previous_histogram)
+
+    def _resolve_candidate(self, histogram):
+        cut_index, threshold, histogram_before = self._candidate
+        self._candidate = None
+        if cv2.compareHist(histogram_before, histogram, cv2.HISTCMP_BHATTACHARYYA) > threshold:
+            self._last_cut = cut_index
+            return [cut_index]
+        return []
+
+    def detect(self, frames):
+        """Yields the frame index of each cut in an iterable of BGR frames as soon as it is confirmed."""
+        self.reset()
+        for frame in frames:
+            yield from self.update(frame)
+        yield from self.finish()
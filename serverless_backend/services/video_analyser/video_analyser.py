@@ -1,6 +1,14 @@
+import shutil
+import subprocess
+import tempfile
+
 import numpy as np
 import cv2
 
+from serverless_backend.services.frame_sink import FrameSink
+from serverless_backend.services.video_analyser.shot_detector import AdaptiveShotDetector
+
+
 class VideoAnalyser():
     def get_differences(self, video_path, update_progress):
         # Load the video
@@ -52,6 +60,203 @@ class VideoAnalyser():
 
         return differences, last_frames, fps, frame_height, frame_width
 
+    def get_differences_fast(self, video_path, update_progress, width=320, chunk_size=64, progress_step=5):
+        """
+        Faster equivalent of get_differences for cut detection.
+
+        Frames are decoded straight to grayscale at `width` pixels wide (by ffmpeg when it is available),
+        differenced `chunk_size` frames at a time with numpy, and scaled back to full-resolution units so
+        the values and the cuts found from them stay comparable to get_differences. update_progress is
+        only called when progress has advanced by at least `progress_step` percent.
+        """
+        cap = cv2.VideoCapture(video_path)
+        if not cap.isOpened():
+            raise ValueError(f"Could not open video {video_path}")
+        frame_width = int(cap.get(cv2.CAP_PROP_FRAME_WIDTH))
+        frame_height = int(cap.get(cv2.CAP_PROP_FRAME_HEIGHT))
+        total_frames = int(cap.get(cv2.CAP_PROP_FRAME_COUNT))
+        fps = cap.get(cv2.CAP_PROP_FPS)
+        cap.release()
+
+        small_width, small_height = self._small_frame_size(frame_width, frame_height, width)
+        # Each changed pixel of the small frame stands in for this many full-resolution pixels
+        area_scale = (frame_width * frame_height) / (small_width * small_height)
+
+        differences = []
+        last_frames = 0
+        previous_frame = None
+        chunk = []
+        reported_progress = 5
+
+        update_progress(5)
+
+        def flush(chunk, previous_frame):
+            frames = np.stack(([previous_frame] if previous_frame is not None else []) + chunk).astype(np.int16)
+            if len(frames) < 2:
+                return
+            changed = np.abs(np.diff(frames, axis=0)) > 50
+            differences.extend((np.count_nonzero(changed, axis=(1, 2)) * 255 * area_scale).tolist())
+
+        for frame in self._read_small_frames(video_path, (small_width, small_height)):
+            chunk.append(frame)
+            last_frames += 1
+
+            if len(chunk) == chunk_size:
+                flush(chunk, previous_frame)
+                previous_frame = chunk[-1]
+                chunk = []
+
+                progress = 5 + min(last_frames / max(total_frames, 1), 1) * 90
+                if progress - reported_progress >= progress_step:
+                    update_progress(progress)
+                    reported_progress = progress
+
+        if chunk:
+            flush(chunk, previous_frame)
+
+        return differences, last_frames, fps, frame_height, frame_width
+
+    def _small_frame_size(self, frame_width, frame_height, width):
+        """Even-sized (width, height) at most `width` pixels wide that keeps the frame's aspect ratio."""
+        small_width = min(width, frame_width)
+        small_height = max(2, int(round(frame_height * small_width / frame_width / 2)) * 2)
+        return small_width, small_height
+
+    def _read_small_frames(self, video_path, size, gray=True):
+        """Yields the video's frames resized to size (width, height), as grayscale or BGR arrays."""
+        small_width, small_height = size
+        channels = 1 if gray else 3
+
+        if shutil.which("ffmpeg") is None:
+            cap = cv2.VideoCapture(video_path)
+            try:
+                while True:
+                    ret, frame = cap.read()
+                    if not ret:
+                        break
+                    if gray:
+                        frame = cv2.cvtColor(frame, cv2.COLOR_BGR2GRAY)
+                    yield cv2.resize(frame, (small_width, small_height), interpolation=cv2.INTER_AREA)
+            finally:
+                cap.release()
+            return
+
+        pixel_format = 'gray' if gray else 'bgr24'
+        command = [
+            'ffmpeg',
+            '-v', 'error',
+            '-i', video_path,
+            '-vf', f'scale={small_width}:{small_height}:flags=area,format={pixel_format}',
+            '-f', 'rawvideo',
+            '-pix_fmt', pixel_format,
+            'pipe:1'
+        ]
+        process = subprocess.Popen(command, stdout=subprocess.PIPE, stderr=subprocess.PIPE)
+        frame_size = small_width * small_height * channels
+        frame_shape = (small_height, small_width) if gray else (small_height, small_width, 3)
+        try:
+            while True:
+                buffer = process.stdout.read(frame_size)
+                if len(buffer) < frame_size:
+                    break
+                yield np.frombuffer(buffer, dtype=np.uint8).reshape(frame_shape)
+
+            if process.wait() != 0:
+                raise RuntimeError(f"FFmpeg failed to decode {video_path}: {process.stderr.read().decode()}")
+        finally:
+            process.stdout.close()
+            if process.poll() is None:
+                process.kill()
+            process.wait()
+            process.stderr.close()
+
+    def analyse_video(self, video_path, update_progress, cache_skip_frames=2, cache_max_side=320, cache_crf=12):
+        """
+        Decodes the video once and returns everything later stages need from it:
+        the frame difference signal (as get_differences), the video metadata, and a cache of
+        every (cache_skip_frames + 1)-th frame, downscaled so its longest side is at most
+        cache_max_side (the saliency model's input size). The cache is encoded as it is filled to an
+        H.264 .mp4 at cache_crf, under a tenth of the size of the raw frames (around 100 MB a minute).
+        """
+        cap = cv2.VideoCapture(video_path)
+        if not cap.isOpened():
+            raise ValueError(f"Could not open video {video_path}")
+
+        frame_width = int(cap.get(cv2.CAP_PROP_FRAME_WIDTH))
+        frame_height = int(cap.get(cv2.CAP_PROP_FRAME_HEIGHT))
+        total_frames = int(cap.get(cv2.CAP_PROP_FRAME_COUNT))
+        fps = cap.get(cv2.CAP_PROP_FPS)
+
+        scale = min(1.0, cache_max_side / max(frame_width, frame_height))
+        # yuv420p needs even dimensions
+        cache_size = (max(2, int(round(frame_width * scale / 2)) * 2),
+                      max(2, int(round(frame_height * scale / 2)) * 2))
+        _, frame_cache_path = tempfile.mkstemp(suffix=".mp4")
+
+        prev_frame = None
+        differences = []
+        last_frames = 0
+        cached_frames = 0
+
+        update_progress(5)
+
+        with FrameSink(frame_cache_path, cache_size[0], cache_size[1], (fps or 30) / (cache_skip_frames + 1),
+                       preset='veryfast', crf=cache_crf) as frame_cache:
+            while True:
+                ret, frame = cap.read()
+                if not ret:
+                    break
+
+                if last_frames % (cache_skip_frames + 1) == 0:
+                    frame_cache.write(cv2.resize(frame, cache_size, interpolation=cv2.INTER_AREA))
+                    cached_frames += 1
+
+                gray = cv2.cvtColor(frame, cv2.COLOR_BGR2GRAY)
+                last_frames += 1
+
+                if prev_frame is not None:
+                    diff = cv2.absdiff(prev_frame, gray)
+                    _, thresh = cv2.threshold(diff, 50, 255, cv2.THRESH_BINARY)
+                    differences.append(float(np.sum(thresh)))
+
+                if last_frames % 100 == 0 and total_frames > 0:
+                    update_progress(5 + min(last_frames / total_frames, 1) * 90)
+
+                prev_frame = gray
+
+        cap.release()
+
+        return {
+            "differences": differences,
+            "total_frames": last_frames,
+            "fps": fps,
+            "height": frame_height,
+            "width": frame_width,
+            "frame_cache_path": frame_cache_path,
+            "frame_cache_frames": cached_frames,
+            "frame_cache_skip_frames": cache_skip_frames,
+        }
+
+    def iter_camera_cuts_adaptive(self, video_path, detector=None, width=320):
+        """
+        Yields camera cuts one at a time as an AdaptiveShotDetector finds them, in a single streaming
+        pass over frames decoded at `width` pixels wide, so later stages can start on the first shots
+        before the whole video has been analysed.
+
+        Cuts use the same indexing as get_camera_cuts: the index of the last frame before the cut.
+        """
+        cap = cv2.VideoCapture(video_path)
+        if not cap.isOpened():
+            raise ValueError(f"Could not open video {video_path}")
+        frame_width = int(cap.get(cv2.CAP_PROP_FRAME_WIDTH))
+        frame_height = int(cap.get(cv2.CAP_PROP_FRAME_HEIGHT))
+        cap.release()
+
+        detector = detector or AdaptiveShotDetector()
+        size = self._small_frame_size(frame_width, frame_height, width)
+        for cut in detector.detect(self._read_small_frames(video_path, size, gray=False)):
+            yield cut - 1
+
     def get_camera_cuts(self, differences):
         mean_difference = np.mean(differences)
         std = np.std(differences)
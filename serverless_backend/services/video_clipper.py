@@ -1,8 +1,27 @@
+import json
 import subprocess
 import tempfile
 import shutil
 import os
-from moviepy.editor import VideoFileClip, concatenate_videoclips
+from moviepy.editor import VideoFileClip
+
+from serverless_backend.services.span_planner import SpanPlanner
+
+
+# libx264 profile names for the H.264 profiles ffprobe reports
+X264_PROFILES = {
+    'Constrained Baseline': 'baseline',
+    'Baseline': 'baseline',
+    'Main': 'main',
+    'High': 'high',
+    'High 10': 'high10',
+    'High 4:2:2': 'high422',
+    'High 4:4:4 Predictive': 'high444',
+}
+
+# Smart cut parts go through Annex B, which puts each part's SPS and PPS in front of its keyframes, into an
+# 'avc3' MP4, which keeps them in its samples
+IN_BAND_PARAMETER_SETS = ['-bsf:v', 'h264_mp4toannexb', '-tag:v', 'avc3']
 
 
 class VideoClipper:
@@ -21,7 +40,33 @@ class VideoClipper:
         with VideoFileClip(video_path) as video:
             return video.duration
 
-    def clip_video(self, input_path, start_time, end_time, output_path):
+    def clip_video(self, input_path, start_time, end_time, output_path, mode="reencode"):
+        """
+        Clips [start_time, end_time] out of the input video.
+
+        mode "reencode" (the default) re-encodes the whole range. "copy" stream copies from the keyframe at or
+        before start_time, which is fastest but not frame accurate. "smart" stream copies the whole GOPs in the
+        middle of the range and only re-encodes the partial GOPs at either end, so the clip is frame accurate
+        for a fraction of the CPU. The re-encoded ends have their own SPS and PPS, so the clip is an 'avc3' MP4
+        that carries the parameter sets in band at each part. Smart falls back to "reencode" when the source
+        isn't H.264 in a profile libx264 can write, or the range holds fewer than two keyframes.
+
+        :return: The mode the clip was made with, "reencode" when smart fell back
+        """
+        if mode == "copy":
+            self._stream_copy(input_path, start_time, end_time, output_path)
+        elif mode == "smart":
+            if self._smart_clip(input_path, start_time, end_time, output_path):
+                return mode
+            self._reencode(input_path, start_time, end_time, output_path)
+            return "reencode"
+        elif mode == "reencode":
+            self._reencode(input_path, start_time, end_time, output_path)
+        else:
+            raise ValueError(f"Unknown clip mode: {mode}")
+        return mode
+
+    def _reencode(self, input_path, start_time, end_time, output_path):
         # Format times as strings, e.g., '00:00:10'
         start_str = self.format_time(start_time)
         end_str = self.format_time(end_time)
@@ -40,6 +85,161 @@ class VideoClipper:
 
         subprocess.run(command, check=True)
 
+    def _stream_copy(self, input_path, start_time, end_time, output_path):
+        command = [
+            'ffmpeg',
+            '-v', 'error',
+            '-y',
+            '-ss', self.format_time(start_time),
+            '-to', self.format_time(end_time),
+            '-i', input_path,
+            '-c', 'copy',
+            '-avoid_negative_ts', 'make_zero',
+            output_path
+        ]
+        subprocess.run(command, check=True)
+
+    def get_video_parameters(self, video_path):
+        """The codec, profile, level and pixel format of the first video stream, as ffprobe names them."""
+        command = [
+            'ffprobe',
+            '-v', 'error',
+            '-select_streams', 'v:0',
+            '-show_entries', 'stream=codec_name,profile,level,pix_fmt',
+            '-of', 'json',
+            video_path
+        ]
+        streams = json.loads(subprocess.check_output(command, universal_newlines=True)).get('streams', [])
+        return streams[0] if streams else {}
+
+    def get_video_packets(self, video_path, start_time, end_time):
+        """(presentation time, is keyframe) of the video packets between start_time and end_time, sorted by time."""
+        command = [
+            'ffprobe',
+            '-v', 'error',
+            '-select_streams', 'v:0',
+            '-read_intervals', f'{start_time}%{end_time}',
+            '-show_entries', 'packet=pts_time,flags',
+            '-of', 'csv=p=0',
+            video_path
+        ]
+        output = subprocess.check_output(command, universal_newlines=True)
+        packets = []
+        for line in output.splitlines():
+            pts_time, _, flags = line.partition(',')
+            if pts_time in ('', 'N/A'):
+                continue
+            pts_time = float(pts_time)
+            if start_time <= pts_time < end_time:
+                packets.append((pts_time, 'K' in flags))
+        return sorted(packets)
+
+    def _encode_part(self, input_path, start_time, frame_count, output_path, parameters):
+        # Encode at the source's profile, level and pixel format, so the stream keeps one bit depth and chroma
+        # format and stays within what a decoder of the source supports
+        command = [
+            'ffmpeg',
+            '-v', 'error',
+            '-y',
+            '-ss', f'{start_time:.6f}',
+            '-i', input_path,
+            '-frames:v', str(frame_count),
+            '-an',
+            '-c:v', 'libx264',
+            '-crf', '23',
+            '-preset', 'fast',
+            '-profile:v', X264_PROFILES[parameters['profile']],
+            '-level', f"{parameters['level'] / 10:.1f}",
+            '-pix_fmt', parameters['pix_fmt'],
+            # Keep the source frame timing, a constant rate output would duplicate a frame when the cut
+            # doesn't fall on a frame boundary
+            '-fps_mode', 'passthrough',
+            *IN_BAND_PARAMETER_SETS,
+            output_path
+        ]
+        subprocess.run(command, check=True)
+
+    def _copy_part(self, input_path, start_time, frame_count, output_path, parameters):
+        # start_time is a keyframe, so seeking to it is exact. Cutting by frame count rather than duration
+        # stops before the next keyframe, which with B-frames is muxed ahead of frames shown before it
+        command = [
+            'ffmpeg',
+            '-v', 'error',
+            '-y',
+            '-ss', f'{start_time:.6f}',
+            '-i', input_path,
+            '-frames:v', str(frame_count),
+            '-an',
+            '-c:v', 'copy',
+            '-avoid_negative_ts', 'make_zero',
+            *IN_BAND_PARAMETER_SETS,
+            output_path
+        ]
+        subprocess.run(command, check=True)
+
+    def _smart_clip(self, input_path, start_time, end_time, output_path):
+        """Makes a smart cut, returning False without writing output_path when it can't be made."""
+        parameters = self.get_video_parameters(input_path)
+        if (parameters.get('codec_name') != 'h264' or parameters.get('profile') not in X264_PROFILES
+                or parameters.get('level', 0) <= 0):
+            return False
+
+        packets = self.get_video_packets(input_path, start_time, end_time)
+        keyframes = [pts_time for pts_time, is_keyframe in packets if is_keyframe]
+        if len(keyframes) < 2:
+            return False
+
+        # Re-encode up to the first keyframe and from the last one, stream copy the whole GOPs in between.
+        # Every part is cut by its number of source frames, so no frame is dropped or repeated at the joins.
+        first_keyframe, last_keyframe = keyframes[0], keyframes[-1]
+        parts = [
+            (self._encode_part, start_time, sum(1 for pts_time, _ in packets if pts_time < first_keyframe)),
+            (self._copy_part, first_keyframe,
+             sum(1 for pts_time, _ in packets if first_keyframe <= pts_time < last_keyframe)),
+            (self._encode_part, last_keyframe, sum(1 for pts_time, _ in packets if pts_time >= last_keyframe)),
+        ]
+
+        temp_dir = tempfile.mkdtemp()
+        try:
+            part_paths = []
+            for make_part, part_start, frame_count in parts:
+                # Skip empty parts, e.g. when the range starts on a keyframe
+                if frame_count == 0:
+                    continue
+                part_path = os.path.join(temp_dir, f'part_{len(part_paths)}.mp4')
+                make_part(input_path, part_start, frame_count, part_path, parameters)
+                part_paths.append(part_path)
+
+            list_path = os.path.join(temp_dir, 'parts.txt')
+            with open(list_path, 'w') as list_file:
+                list_file.writelines(f"file '{path}'\n" for path in part_paths)
+
+            # An MP4 sample entry holds only the first part's avcC, so the joined video is tagged 'avc3', where
+            # the SPS and PPS in front of each part's keyframes take over as the decoder reaches them. The audio
+            # is cut accurately from the source and re-encoded.
+            command = [
+                'ffmpeg',
+                '-v', 'error',
+                '-y',
+                '-f', 'concat',
+                '-safe', '0',
+                '-i', list_path,
+                '-ss', self.format_time(start_time),
+                '-to', self.format_time(end_time),
+                '-i', input_path,
+                '-map', '0:v',
+                '-map', '1:a?',
+                '-c:v', 'copy',
+                '-tag:v', 'avc3',
+                '-c:a', 'aac',
+                '-movflags', '+faststart',
+                output_path
+            ]
+            subprocess.run(command, check=True)
+            return True
+        finally:
+            shutil.rmtree(temp_dir, ignore_errors=True)
+
     def clip_and_replace_video(self, original_path, start_time, end_time):
         # Create a temporary file
         temp_fd, temp_path = tempfile.mkstemp(suffix='.mp4')
@@ -73,21 +273,64 @@ class VideoClipper:
             os.close(temp_fd)
             os.remove(temp_path)
 
-    def delete_segments_from_video(self, input_video_path, segments_to_keep, output_video_path, update_progress):
-        # Load the source video
-        video = VideoFileClip(input_video_path)
+    def has_audio_stream(self, video_path):
+        command = [
+            'ffprobe',
+            '-v', 'error',
+            '-select_streams', 'a',
+            '-show_entries', 'stream=index',
+            '-of', 'csv=p=0',
+            video_path
+        ]
+        return bool(subprocess.check_output(command, universal_newlines=True).strip())
 
-        # List to store the clips to concatenate
-        clips = []
+    def delete_segments_from_video(self, input_video_path, segments_to_keep, output_video_path, update_progress,
+                                   span_planner=None, fps=24):
+        # Merge tiny gaps and join every kept span in a single FFmpeg filter graph and encode
+        span_planner = span_planner or SpanPlanner()
+        spans = span_planner.merge(segments_to_keep)
+        if not spans:
+            raise ValueError("No segments to keep")
+        has_audio = self.has_audio_stream(input_video_path)
+        output_duration = sum(end - start for start, end in spans)
 
-        # Extract clips to keep from the video
-        for index, (start, end) in enumerate(segments_to_keep):
-            clips.append(video.subclip(start, end))
-            update_progress((index / len(segments_to_keep))*100)
+        with tempfile.NamedTemporaryFile('w', suffix='.txt', delete=False) as script_file:
+            script_file.write(span_planner.filter_script(spans, video=True, audio=has_audio))
+            script_path = script_file.name
+
+        command = [
+            'ffmpeg',
+            '-v', 'error',
+            '-y',
+            '-i', input_video_path,
+            '-filter_complex_script', script_path,
+            '-map', '[outv]',
+        ]
+        if has_audio:
+            command += ['-map', '[outa]', '-c:a', 'aac']
+        command += [
+            '-r', str(fps),
+            '-c:v', 'libx264',
+            '-preset', 'fast',
+            '-progress', 'pipe:1',
+            output_video_path
+        ]
 
-        # Concatenate the clips
-        final_clip = concatenate_videoclips(clips)
+        try:
+            with tempfile.TemporaryFile() as stderr_file:
+                process = subprocess.Popen(command, stdout=subprocess.PIPE, stderr=stderr_file,
+                                           universal_newlines=True)
+                for line in process.stdout:
+                    # FFmpeg reports progress as key=value lines, out_time_us is the output position
+                    key, _, value = line.strip().partition('=')
+                    if key == 'out_time_us' and value.isdigit():
+                        update_progress(min(100, int(value) / 1e6 / output_duration * 100))
 
-        # Write the result to the output file
-        final_clip.write_videofile(output_video_path, codec="libx264", fps=24, preset="fast", temp_audiofile="/tmp/random_audio.mp3")
+                if process.wait() != 0:
+                    stderr_file.seek(0)
+                    raise RuntimeError(f"FFmpeg failed to join {len(spans)} segments: "
+                                       f"{stderr_file.read().decode(errors='replace')}")
+        finally:
+            os.remove(script_path)
 
+        update_progress(100)
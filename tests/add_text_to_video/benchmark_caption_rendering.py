@@ -0,0 +1,124 @@
+import time
+
+import numpy as np
+from PIL import Image, ImageDraw
+
+from serverless_backend.services.add_text_to_video_service import AddTextToVideoService
+
+WIDTH, HEIGHT, FPS = 1080, 1920, 30
+
+
+class FullFrameTextService(AddTextToVideoService):
+    """The previous compositing: float blends of the full-frame static overlay and a redrawn full-frame caption overlay."""
+
+    def render_frame(self, frame, frame_count):
+        current_additions = [
+            addition for addition in self.dynamic_additions
+            if addition['start_frame'] <= frame_count <= addition['end_frame']
+        ]
+
+        if self.static_overlay is not None:
+            alpha_channel = self.static_overlay[:, :, 3] / 255.0
+            for c in range(3):
+                frame[:, :, c] = frame[:, :, c] * (1 - alpha_channel) + self.static_overlay[:, :, c] * alpha_channel
+
+        if current_additions:
+            dynamic_overlay = Image.new('RGBA', (frame.shape[1], frame.shape[0]), (255, 255, 255, 0))
+            draw = ImageDraw.Draw(dynamic_overlay)
+            for addition in current_additions:
+                self._draw_text_with_effects(draw, addition)
+            overlay_array = np.array(dynamic_overlay)
+            alpha_channel = overlay_array[:, :, 3] / 255.0
+            for c in range(3):
+                frame[:, :, c] = frame[:, :, c] * (1 - alpha_channel) + overlay_array[:, :, c] * alpha_channel
+
+        return frame
+
+
+def short_text_additions(line_count=20, line_seconds=1.5, font_scale=3):
+    """A title and transcript captions as spacial_segmentation lays them out for a short."""
+    return [
+        {
+            'text': "how we cut render time",
+            'font_scale': 2,
+            'thickness': 'Bold',
+            'color': (255, 255, 255),
+            'static': True,
+            'shadow_color': (0, 0, 0),
+            'shadow_offset': (1, 1),
+            'outline': True,
+            'outline_color': (0, 0, 0),
+            'outline_thickness': 2,
+            'offset': (0, 0.1)
+        },
+        {
+            'type': 'transcript',
+            'texts': [f"caption line number {index} goes here" for index in range(line_count)],
+            'start_times': [index * line_seconds for index in range(line_count)],
+            'end_times': [(index + 1) * line_seconds - 0.1 for index in range(line_count)],
+            'font_scale': font_scale,
+            'thickness': 'Bold',
+            'color': (255, 255, 255),
+            'shadow_color': (0, 0, 0),
+            'shadow_offset': (1, 1),
+            'outline': True,
+            'outline_color': (0, 0, 0),
+            'outline_thickness': 4,
+            'offset': (0, 0.05)
+        },
+    ]
+
+
+def make_frame(frame_count):
+    frame = np.empty((HEIGHT, WIDTH, 3), dtype=np.uint8)
+    frame[:] = np.linspace(0, 255, WIDTH, dtype=np.uint8)[None, :, None]
+    frame[:, :, 1] = (frame[:, :, 1].astype(np.int32) + frame_count * 3) % 256
+    return frame
+
+
+def render(service, frame_counts):
+    service.prepare(short_text_additions(), WIDTH, HEIGHT, FPS)
+    start = time.perf_counter()
+    frames = [service.render_frame(make_frame(frame_count), frame_count) for frame_count in frame_counts]
+    return time.perf_counter() - start, frames
+
+
+def benchmark_caption_rendering(frame_total=300):
+    frame_counts = range(frame_total)
+    # make_frame's own cost is taken out of both timings
+    start = time.perf_counter()
+    for frame_count in frame_counts:
+        make_frame(frame_count)
+    frame_seconds = time.perf_counter() - start
+
+    full_seconds, full_frames = render(FullFrameTextService(), frame_counts)
+    sprite_seconds, sprite_frames = render(AddTextToVideoService(), frame_counts)
+    full_fps = frame_total / (full_seconds - frame_seconds)
+    sprite_fps = frame_total / (sprite_seconds - frame_seconds)
+    return {
+        "full_frame_fps": full_fps,
+        "sprite_fps": sprite_fps,
+        "speedup": sprite_fps / full_fps,
+        "max_pixel_difference": max(int(np.abs(a.astype(np.int16) - b).max())
+                                    for a, b in zip(full_frames, sprite_frames)),
+    }
+
+
+def test_sprites_match_full_frame_compositing():
+    # Frames with a caption, between captions, and at a caption's first and last frame
+    frame_counts = [0, 20, 44, 45, 46, 90, 300]
+    _, full_frames = render(FullFrameTextService(), frame_counts)
+    sprite_service = AddTextToVideoService()
+    _, sprite_frames = render(sprite_service, frame_counts)
+
+    for full_frame, sprite_frame in zip(full_frames, sprite_frames):
+        # The float path truncates where the integer path rounds
+        assert np.abs(full_frame.astype(np.int16) - sprite_frame).max() <= 1
+    assert sprite_service.static_sprite.height < HEIGHT // 4
+    # Only the caption on screen keeps a sprite
+    assert len(sprite_service.dynamic_sprites) == 1
+
+
+if __name__ == "__main__":
+    for name, result in benchmark_caption_rendering().items():
+        print(f"{name}: {result}")
@@ -0,0 +1,87 @@
+import os
+import time
+
+from PIL import Image, ImageDraw, ImageFont
+
+from serverless_backend.services import add_text_to_video_service
+from serverless_backend.services.add_text_to_video_service import AddTextToVideoService
+from tests.add_text_to_video.benchmark_caption_rendering import FPS, HEIGHT, WIDTH, short_text_additions
+
+
+class LinearFontSearchService(AddTextToVideoService):
+    """The previous fitting: reload the font and remeasure after every 1pt step down from font_scale * 20."""
+
+    def _get_font(self, text, max_width, max_height, thickness, font_scale):
+        font_path = os.path.abspath(os.path.join(self.font_base_path, f'Montserrat-{thickness}.ttf'))
+        font_size = int(font_scale * 20)
+        font = ImageFont.truetype(font_path, font_size)
+        while True:
+            bbox = ImageDraw.Draw(Image.new('RGB', (1, 1))).textbbox((0, 0), text, font=font)
+            if bbox[2] - bbox[0] <= max_width and bbox[3] - bbox[1] <= max_height:
+                break
+            font_size -= 1
+            if font_size <= 0:
+                raise ValueError("Error: Text is too large to fit in the video")
+            font = ImageFont.truetype(font_path, font_size)
+        return font
+
+    def _text_bbox(self, text, font):
+        return ImageDraw.Draw(Image.new('RGB', (1, 1))).textbbox((0, 0), text, font=font)
+
+
+def clear_font_caches():
+    add_text_to_video_service._load_font.cache_clear()
+    add_text_to_video_service._text_bbox.cache_clear()
+
+
+def font_sizes(service):
+    return [addition['font'].size for addition in service.dynamic_additions]
+
+
+def time_layout(service, line_count, font_scale):
+    start = time.perf_counter()
+    _, service.dynamic_additions = service._prepare_additions(short_text_additions(line_count, font_scale=font_scale),
+                                                              WIDTH, HEIGHT, FPS)
+    return time.perf_counter() - start
+
+
+def benchmark_font_fitting(line_count=60, font_scale=6):
+    """At font_scale 6 the captions start at 120pt and have to shrink to fit the frame width."""
+    linear = LinearFontSearchService()
+    linear_seconds = time_layout(linear, line_count, font_scale)
+
+    clear_font_caches()
+    cached = AddTextToVideoService()
+    cold_seconds = time_layout(cached, line_count, font_scale)
+    # A second short in the same warm Lambda
+    warm_seconds = time_layout(AddTextToVideoService(), line_count, font_scale)
+    return {
+        "linear_seconds": linear_seconds,
+        "binary_search_cold_seconds": cold_seconds,
+        "binary_search_warm_seconds": warm_seconds,
+        "fonts_loaded": add_text_to_video_service._load_font.cache_info().currsize,
+        "same_font_sizes": font_sizes(linear) == font_sizes(cached),
+    }
+
+
+def test_binary_search_picks_the_same_sizes():
+    clear_font_caches()
+    service = AddTextToVideoService()
+    for max_width in (200, 333, 700, 1080):
+        for text in ("hi", "caption line number 12 goes here", "a much longer caption that needs a small font"):
+            expected = LinearFontSearchService()._get_font(text, max_width, 400, 'Bold', 3).size
+            assert service._get_font(text, max_width, 400, 'Bold', 3).size == expected
+    # Fonts are loaded once per size and shared
+    assert service._get_font("hi", 1080, 400, 'Bold', 3) is AddTextToVideoService()._get_font("hi", 1080, 400, 'Bold', 3)
+
+    try:
+        service._get_font("far too long to fit anywhere", 1, 1, 'Bold', 3)
+    except ValueError:
+        pass
+    else:
+        raise AssertionError("Text that cannot fit was not rejected")
+
+
+if __name__ == "__main__":
+    for name, result in benchmark_font_fitting().items():
+        print(f"{name}: {result}")
@@ -0,0 +1,80 @@
+import os
+import tempfile
+import time
+import tracemalloc
+import wave
+
+import numpy as np
+from pydub import AudioSegment
+
+from serverless_backend.services.audio_assembler import assemble_audio_spans, merge_word_spans
+
+
+def make_source_wav(path, minutes=10, frame_rate=44100, seed=0):
+    rng = np.random.default_rng(seed)
+    samples = rng.integers(-3000, 3000, size=minutes * 60 * frame_rate, dtype=np.int16)
+    with wave.open(path, 'wb') as wav_file:
+        wav_file.setnchannels(1)
+        wav_file.setsampwidth(2)
+        wav_file.setframerate(frame_rate)
+        wav_file.writeframes(samples.tobytes())
+
+
+def make_kept_words(num_words=1500, seconds=60, source_seconds=600, seed=0):
+    """Words of a one-minute short picked from the source, in runs of consecutive words with cuts between runs."""
+    rng = np.random.default_rng(seed)
+    words = []
+    time_cursor = rng.uniform(0, source_seconds - seconds * 2)
+    for _ in range(num_words):
+        duration = rng.uniform(0.1, 0.5)
+        if rng.random() < 0.2:
+            time_cursor += rng.uniform(0.2, 2.0)
+        words.append({'start_time': time_cursor, 'end_time': time_cursor + duration})
+        time_cursor += duration
+    return words
+
+
+def assemble_per_word(audio_path, words):
+    """The previous implementation: decode the whole source, then append one slice per word."""
+    combined_audio = AudioSegment.empty()
+    audio = AudioSegment.from_file(audio_path, format='wav')
+    for word in words:
+        combined_audio += audio[int(word['start_time'] * 1000):int(word['end_time'] * 1000)]
+    return combined_audio
+
+
+def measure(function, *args):
+    tracemalloc.start()
+    start = time.perf_counter()
+    result = function(*args)
+    elapsed = time.perf_counter() - start
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    return result, elapsed, peak
+
+
+def benchmark_audio_assembly(minutes=10, num_words=300):
+    with tempfile.TemporaryDirectory() as directory:
+        wav_path = os.path.join(directory, "source.wav")
+        make_source_wav(wav_path, minutes=minutes)
+        words = make_kept_words(num_words=num_words, source_seconds=minutes * 60)
+
+        per_word, per_word_seconds, per_word_peak = measure(assemble_per_word, wav_path, words)
+        spans = merge_word_spans(words)
+        assembled, span_seconds, span_peak = measure(assemble_audio_spans, wav_path, spans)
+
+    return {
+        "words": len(words),
+        "spans": len(spans),
+        "per_word": {"seconds": per_word_seconds, "peak_mb": per_word_peak / 1e6},
+        "spans_seek": {"seconds": span_seconds, "peak_mb": span_peak / 1e6},
+        "identical": per_word.raw_data == assembled.raw_data,
+    }
+
+
+def test_span_assembly_matches_per_word_slices():
+    assert benchmark_audio_assembly(minutes=2, num_words=100)["identical"]
+
+
+if __name__ == "__main__":
+    print(benchmark_audio_assembly())
@@ -0,0 +1,104 @@
+import multiprocessing
+import os
+import resource
+import subprocess
+import tempfile
+import time
+import wave
+from types import SimpleNamespace
+
+from serverless_backend.routes.split_video_and_audio import extract_audio_from_video, stream_audio_from_video
+from serverless_backend.services.blob_transfer import ChunkedTransfer
+from serverless_backend.services.ranged_blob import LocalRangeBackend
+from tests.blob_transfer.benchmark_blob_transfer import bucket_files
+
+
+def make_source_video(path, seconds):
+    """A small-frame but high bitrate upload, so the file is large for its length like a phone recording."""
+    subprocess.run([
+        'ffmpeg', '-v', 'error', '-y',
+        '-f', 'lavfi', '-i', f'testsrc=size=320x240:rate=30:d={seconds}',
+        '-f', 'lavfi', '-i', f'sine=frequency=440:duration={seconds}',
+        '-c:v', 'libx264', '-preset', 'ultrafast', '-b:v', '2M', '-c:a', 'aac', '-shortest', path
+    ], check=True)
+
+
+def local_firebase_service(bucket_dir):
+    """The parts of FirebaseService the extraction uses, over the local stand-in backend."""
+    backend = LocalRangeBackend(bucket_dir)
+    return SimpleNamespace(range_backend=backend, transfer=ChunkedTransfer(backend, chunk_size=4 * 1024 * 1024),
+                           get_ranged_source=backend.url)
+
+
+def run_buffered(bucket_dir, video_blob_name, audio_blob_name):
+    """The previous route: video into memory, through a temp file, WAV back into memory, then one upload."""
+    service = local_firebase_service(bucket_dir)
+    video_downloaded = service.transfer.download_to_memory(video_blob_name)
+    audio_bytes = extract_audio_from_video(video_downloaded)
+    service.range_backend.upload_bytes(audio_blob_name, audio_bytes)
+
+
+def run_streaming(bucket_dir, video_blob_name, audio_blob_name):
+    stream_audio_from_video(local_firebase_service(bucket_dir), video_blob_name, audio_blob_name)
+
+
+def _measure(mode, bucket_dir, video_blob_name, audio_blob_name, queue):
+    start = time.perf_counter()
+    {"buffered": run_buffered, "streaming": run_streaming}[mode](bucket_dir, video_blob_name, audio_blob_name)
+    # ru_maxrss is in kilobytes on Linux
+    queue.put({"seconds": time.perf_counter() - start,
+               "peak_rss_mb": resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024})
+
+
+def measure(mode, bucket_dir, video_blob_name, audio_blob_name):
+    """Runs one extraction in a fresh process so its peak RSS is its own."""
+    context = multiprocessing.get_context('spawn')
+    queue = context.Queue()
+    process = context.Process(target=_measure, args=(mode, bucket_dir, video_blob_name, audio_blob_name, queue))
+    process.start()
+    result = queue.get()
+    process.join()
+    return result
+
+
+def read_wav(path):
+    with wave.open(path, 'rb') as wav_file:
+        return wav_file.getparams()[:3], wav_file.readframes(wav_file.getnframes())
+
+
+def benchmark_audio_extraction(durations=(300, 1200)):
+    results = {}
+    with tempfile.TemporaryDirectory() as bucket_dir:
+        for seconds in durations:
+            video_blob_name = f"videos/{seconds}.mp4"
+            os.makedirs(os.path.join(bucket_dir, "videos"), exist_ok=True)
+            make_source_video(os.path.join(bucket_dir, video_blob_name), seconds)
+            result = {"video_mb": os.path.getsize(os.path.join(bucket_dir, video_blob_name)) / 1e6}
+            for mode in ("buffered", "streaming"):
+                result[mode] = measure(mode, bucket_dir, video_blob_name, f"audio/{seconds}_{mode}.wav")
+            result["identical_audio"] = (read_wav(os.path.join(bucket_dir, f"audio/{seconds}_buffered.wav")) ==
+                                         read_wav(os.path.join(bucket_dir, f"audio/{seconds}_streaming.wav")))
+            results[f"{seconds}s"] = result
+    return results
+
+
+def test_streamed_audio_is_a_valid_wav():
+    with tempfile.TemporaryDirectory() as bucket_dir:
+        os.makedirs(os.path.join(bucket_dir, "videos"))
+        make_source_video(os.path.join(bucket_dir, "videos/source.mp4"), 20)
+        service = local_firebase_service(bucket_dir)
+        # Parts small enough that they pass the compose limit and get folded into an intermediate part
+        service.transfer.chunk_size = 16 * 1024
+        stream_audio_from_video(service, "videos/source.mp4", "audio/streamed.wav")
+        run_buffered(bucket_dir, "videos/source.mp4", "audio/buffered.wav")
+
+        params, frames = read_wav(os.path.join(bucket_dir, "audio/streamed.wav"))
+        assert params == (1, 2, 16000)
+        assert (params, frames) == read_wav(os.path.join(bucket_dir, "audio/buffered.wav"))
+        # Every upload part has been composed and deleted
+        assert bucket_files(bucket_dir) == ["audio/buffered.wav", "audio/streamed.wav", "videos/source.mp4"]
+
+
+if __name__ == "__main__":
+    for duration, result in benchmark_audio_extraction().items():
+        print(f"{duration}: {result}")
@@ -0,0 +1,113 @@
+import os
+import tempfile
+import time
+
+from serverless_backend.services.blob_cache import BlobCache
+
+# Blobs fetched by one auto-generate chain, in order: the original upload once per segment cropped, the
+# clipped short by determine-boundaries, generate-a-roll and generate-intro-video, and the test audio twice
+CHAIN_FETCHES = (
+    ["videos/original.mp4"] * 4
+    + ["short-video/clipped.mp4"] * 3
+    + ["temp-audio/short_output.mp4"] * 2
+)
+BLOB_SIZES = {
+    "videos/original.mp4": 96 * 1024 * 1024,
+    "short-video/clipped.mp4": 24 * 1024 * 1024,
+    "temp-audio/short_output.mp4": 2 * 1024 * 1024,
+}
+
+
+class FakeBucket:
+    """Serves blobs of zeros at a fixed bandwidth, counting the bytes it sends."""
+
+    def __init__(self, sizes, bandwidth=200 * 1024 * 1024):
+        self.sizes = sizes
+        self.generations = {name: 1 for name in sizes}
+        self.bandwidth = bandwidth
+        self.bytes_sent = 0
+
+    def downloader(self, blob_name):
+        def download(path):
+            size = self.sizes[blob_name]
+            time.sleep(size / self.bandwidth)
+            with open(path, 'wb') as file:
+                file.truncate(size)
+            self.bytes_sent += size
+        return download
+
+
+def run_chain(bucket, directory, cache=None):
+    for blob_name in CHAIN_FETCHES:
+        fd, path = tempfile.mkstemp(dir=directory)
+        os.close(fd)
+        if cache is None:
+            bucket.downloader(blob_name)(path)
+        else:
+            cache.fetch(blob_name, bucket.generations[blob_name], bucket.sizes[blob_name], path,
+                        bucket.downloader(blob_name))
+        assert os.path.getsize(path) == bucket.sizes[blob_name]
+        # Routes delete their downloaded copy when they are done with it
+        os.remove(path)
+
+
+def benchmark_blob_cache():
+    results = {}
+    with tempfile.TemporaryDirectory() as directory:
+        bucket = FakeBucket(BLOB_SIZES)
+        start = time.perf_counter()
+        run_chain(bucket, directory)
+        results["uncached"] = {"seconds": time.perf_counter() - start, "mb_downloaded": bucket.bytes_sent / 1e6}
+
+        bucket = FakeBucket(BLOB_SIZES)
+        cache = BlobCache(os.path.join(directory, "cache"), max_bytes=512 * 1024 * 1024)
+        start = time.perf_counter()
+        run_chain(bucket, directory, cache)
+        results["cached"] = {"seconds": time.perf_counter() - start, "mb_downloaded": bucket.bytes_sent / 1e6,
+                             **cache.stats()}
+    return results
+
+
+def test_cache_hits_versions_and_eviction():
+    with tempfile.TemporaryDirectory() as directory:
+        sizes = {"a": 1000, "b": 1000, "c": 1000}
+        bucket = FakeBucket(sizes, bandwidth=1e9)
+        cache = BlobCache(os.path.join(directory, "cache"), max_bytes=2500)
+
+        def fetch(name):
+            path = os.path.join(directory, name + ".out")
+            cache.fetch(name, bucket.generations[name], sizes[name], path, bucket.downloader(name))
+            assert os.path.getsize(path) == sizes[name]
+            os.remove(path)
+
+        fetch("a")
+        fetch("a")
+        assert (cache.hits, cache.misses) == (1, 1)
+
+        # A new generation is a different entry
+        bucket.generations["a"] = 2
+        fetch("a")
+        assert cache.misses == 2
+
+        # Over the cap the least recently used entry, the old generation of a, goes first
+        fetch("b")
+        fetch("c")
+        assert cache.evictions == 2
+        fetch("c")
+        assert cache.hits == 2
+        assert cache.stats()["bytes"] <= 2500
+
+        # Blobs bigger than the cache are downloaded straight to the caller
+        sizes["big"] = 5000
+        bucket.generations["big"] = 1
+        fetch("big")
+        assert cache.stats()["entries"] == 2
+
+        # A fresh cache over the same directory picks up the existing entries
+        reopened = BlobCache(os.path.join(directory, "cache"), max_bytes=2500)
+        assert reopened.stats()["entries"] == 2
+
+
+if __name__ == "__main__":
+    for name, result in benchmark_blob_cache().items():
+        print(f"{name}: {result}")
@@ -0,0 +1,231 @@
+import json
+import os
+import tempfile
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import numpy as np
+import requests
+
+from serverless_backend.services.blob_transfer import ChunkedTransfer, crc32c_of_file
+
+
+class FakeStorageHandler(BaseHTTPRequestHandler):
+    """
+    Minimal object store over a directory: HEAD for metadata, GET with Range, PUT, DELETE and a compose
+    POST. Every request body is sent or received at `stream_bandwidth`, like one TCP stream to the bucket.
+    """
+    protocol_version = 'HTTP/1.1'
+
+    def log_message(self, *args):
+        pass
+
+    def _path(self):
+        return os.path.join(self.server.root_dir, self.path.split('/', 2)[2])
+
+    def _throttle(self, size, start):
+        remaining = size / self.server.stream_bandwidth - (time.perf_counter() - start)
+        if remaining > 0:
+            time.sleep(remaining)
+
+    def do_HEAD(self):
+        path = self._path()
+        if not os.path.exists(path):
+            self.send_response(404)
+            self.send_header('Content-Length', '0')
+            self.end_headers()
+            return
+        self.send_response(200)
+        self.send_header('Content-Length', str(os.path.getsize(path)))
+        self.send_header('X-Crc32c', crc32c_of_file(path))
+        self.send_header('X-Generation', str(os.stat(path).st_mtime_ns))
+        self.end_headers()
+
+    def do_GET(self):
+        start_time = time.perf_counter()
+        path = self._path()
+        size = os.path.getsize(path)
+        start, end = 0, size
+        if 'Range' in self.headers:
+            first, last = self.headers['Range'].split('=')[1].split('-')
+            start, end = int(first), min(size, int(last) + 1)
+        with open(path, 'rb') as blob_file:
+            blob_file.seek(start)
+            data = blob_file.read(end - start)
+        self._throttle(len(data), start_time)
+        self.send_response(206 if 'Range' in self.headers else 200)
+        self.send_header('Content-Length', str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def do_PUT(self):
+        start_time = time.perf_counter()
+        data = self.rfile.read(int(self.headers['Content-Length']))
+        self._throttle(len(data), start_time)
+        path = self._path()
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        with open(path, 'wb') as blob_file:
+            blob_file.write(data)
+        self.send_response(200)
+        self.send_header('Content-Length', '0')
+        self.end_headers()
+
+    def do_POST(self):
+        # Compose: the body lists the source blobs in order
+        sources = json.loads(self.rfile.read(int(self.headers['Content-Length'])))
+        with open(self._path(), 'wb') as blob_file:
+            for source in sources:
+                with open(os.path.join(self.server.root_dir, source), 'rb') as part:
+                    blob_file.write(part.read())
+        self.send_response(200)
+        self.send_header('Content-Length', '0')
+        self.end_headers()
+
+    def do_DELETE(self):
+        os.remove(self._path())
+        self.send_response(204)
+        self.send_header('Content-Length', '0')
+        self.end_headers()
+
+
+class FakeStorageServer:
+    def __init__(self, root_dir, stream_bandwidth=50 * 1024 * 1024):
+        self.server = ThreadingHTTPServer(('127.0.0.1', 0), FakeStorageHandler)
+        self.server.root_dir = root_dir
+        self.server.stream_bandwidth = stream_bandwidth
+        self.url = f"http://127.0.0.1:{self.server.server_address[1]}/b"
+        self.thread = threading.Thread(target=self.server.serve_forever, daemon=True)
+
+    def __enter__(self):
+        self.thread.start()
+        return self
+
+    def __exit__(self, *exc):
+        self.server.shutdown()
+        self.server.server_close()
+
+
+class HttpStorageBackend:
+    """The ChunkedTransfer backend methods over the fake storage server, in place of BucketRangeBackend."""
+
+    def __init__(self, url):
+        self.url = url
+        self._local = threading.local()
+
+    def _session(self):
+        # One connection per worker thread, like the storage client's pooled sessions
+        if not hasattr(self._local, 'session'):
+            self._local.session = requests.Session()
+        return self._local.session
+
+    def stat(self, blob_name):
+        response = self._session().head(f"{self.url}/{blob_name}")
+        if response.status_code == 404:
+            return None
+        return {"size": int(response.headers['Content-Length']), "version": response.headers['X-Generation'],
+                "crc32c": response.headers['X-Crc32c']}
+
+    def read_range(self, blob_name, start, end):
+        response = self._session().get(f"{self.url}/{blob_name}", headers={'Range': f"bytes={start}-{end - 1}"})
+        response.raise_for_status()
+        return response.content
+
+    def download(self, blob_name, path):
+        response = self._session().get(f"{self.url}/{blob_name}")
+        response.raise_for_status()
+        with open(path, 'wb') as file:
+            file.write(response.content)
+
+    def upload(self, path, blob_name):
+        with open(path, 'rb') as file:
+            self._session().put(f"{self.url}/{blob_name}", data=file.read()).raise_for_status()
+        return self.stat(blob_name)
+
+    def upload_part(self, part_name, path, start, length):
+        with open(path, 'rb') as file:
+            file.seek(start)
+            self._session().put(f"{self.url}/{part_name}", data=file.read(length)).raise_for_status()
+
+    def compose(self, blob_name, part_names, content_type=None):
+        self._session().post(f"{self.url}/{blob_name}", data=json.dumps(part_names)).raise_for_status()
+        return self.stat(blob_name)
+
+    def delete(self, blob_name):
+        self._session().delete(f"{self.url}/{blob_name}").raise_for_status()
+
+
+def bucket_files(bucket_dir):
+    return sorted(os.path.relpath(os.path.join(root, name), bucket_dir)
+                  for root, _, names in os.walk(bucket_dir) for name in names)
+
+
+def make_video_file(path, size, seed=0):
+    rng = np.random.default_rng(seed)
+    with open(path, 'wb') as file:
+        for start in range(0, size, 16 * 1024 * 1024):
+            file.write(rng.integers(0, 256, size=min(16 * 1024 * 1024, size - start), dtype=np.uint8).tobytes())
+
+
+def benchmark_blob_transfer(size=512 * 1024 * 1024, stream_bandwidth=50 * 1024 * 1024):
+    results = {}
+    with tempfile.TemporaryDirectory() as directory:
+        bucket_dir = os.path.join(directory, "bucket")
+        os.makedirs(bucket_dir)
+        source_path = os.path.join(directory, "source.mp4")
+        make_video_file(source_path, size)
+
+        with FakeStorageServer(bucket_dir, stream_bandwidth) as server:
+            backend = HttpStorageBackend(server.url)
+            engines = {
+                "single_stream": ChunkedTransfer(backend, parallel_threshold=float('inf')),
+                "parallel": ChunkedTransfer(backend),
+            }
+            for name, transfer in engines.items():
+                blob_name = f"videos/{name}.mp4"
+                download_path = os.path.join(directory, f"{name}_download.mp4")
+                upload = transfer.upload(source_path, blob_name)
+                download = transfer.download(blob_name, download_path)
+                results[name] = {
+                    "upload_mb_per_second": upload["mb_per_second"],
+                    "download_mb_per_second": download["mb_per_second"],
+                    "parts": download["parts"],
+                    "identical": crc32c_of_file(download_path) == crc32c_of_file(source_path),
+                }
+                os.remove(download_path)
+            results["bucket_files"] = bucket_files(bucket_dir)
+    return results
+
+
+def test_parallel_transfer_round_trips_and_detects_corruption():
+    with tempfile.TemporaryDirectory() as directory:
+        bucket_dir = os.path.join(directory, "bucket")
+        os.makedirs(bucket_dir)
+        source_path = os.path.join(directory, "source.mp4")
+        make_video_file(source_path, 5 * 1024 * 1024 + 123)
+
+        with FakeStorageServer(bucket_dir, stream_bandwidth=1e9) as server:
+            backend = HttpStorageBackend(server.url)
+            transfer = ChunkedTransfer(backend, chunk_size=256 * 1024, parallel_threshold=1024 * 1024)
+
+            transfer.upload(source_path, "videos/source.mp4")
+            # The parts are deleted once composed
+            assert bucket_files(bucket_dir) == ["videos/source.mp4"]
+            stats = transfer.download("videos/source.mp4", os.path.join(directory, "download.mp4"))
+            assert stats["parts"] == 21
+            assert crc32c_of_file(os.path.join(directory, "download.mp4")) == crc32c_of_file(source_path)
+            assert transfer.download_to_memory("videos/source.mp4").getvalue() == open(source_path, 'rb').read()
+
+            stat = backend.stat("videos/source.mp4")
+            stat["crc32c"] = "AAAAAA=="
+            try:
+                transfer.download("videos/source.mp4", os.path.join(directory, "corrupt.mp4"), stat=stat)
+            except RuntimeError as e:
+                assert "CRC32C mismatch" in str(e)
+            else:
+                raise AssertionError("Checksum mismatch was not detected")
+
+
+if __name__ == "__main__":
+    for name, result in benchmark_blob_transfer().items():
+        print(f"{name}: {result}")
@@ -0,0 +1,98 @@
+import time
+
+import cv2
+import numpy as np
+
+from serverless_backend.services.bounding_box_generator.bounding_boxes import BoundingBoxGenerator
+
+
+class FrameReader:
+    """Stands in for the cv2.VideoCapture of a saliency video."""
+
+    def __init__(self, frames):
+        self.frames = iter(frames)
+
+    def read(self):
+        frame = next(self.frames, None)
+        return frame is not None, frame
+
+
+class CountingGenerator(BoundingBoxGenerator):
+    full_searches = 0
+
+    def _search_boxes(self, integral_image):
+        self.full_searches += 1
+        return super()._search_boxes(integral_image)
+
+
+def make_shot_frames(shot_lengths, width=640, height=360, seed=0):
+    """BGR saliency frames with one blob per shot, drifting slowly, and jumping at each cut."""
+    rng = np.random.default_rng(seed)
+    ys, xs = np.mgrid[0:height, 0:width]
+    frames = []
+    for shot_length in shot_lengths:
+        cx, cy = rng.uniform(0.2, 0.8) * width, rng.uniform(0.3, 0.7) * height
+        for i in range(shot_length):
+            blob = np.exp(-((xs - cx - 2 * i) ** 2 + (ys - cy) ** 2) / (2 * 40.0 ** 2))
+            gray = (255 * blob).astype(np.uint8)
+            frames.append(cv2.cvtColor(gray, cv2.COLOR_GRAY2BGR))
+    return frames
+
+
+def shot_cuts(shot_lengths, skip_frames):
+    """Cut frame indices in the original video for saliency shots of the given lengths."""
+    return list(np.cumsum(shot_lengths)[:-1] * (skip_frames + 1))
+
+
+def count_full_searches(frames, cuts, skip_frames, chunk_size):
+    """Full searches the parallel path runs, counted by searching its chunks in this process."""
+    generator = CountingGenerator(temporal_warm_start=True, workers=2, chunk_size=chunk_size)
+    chunks = list(generator._frame_chunks(FrameReader(frames), len(frames), skip_frames, cuts))
+    for gray_frames, shots in chunks:
+        generator._find_boxes_for_frames(gray_frames, shots)
+    return generator.full_searches, [len(gray_frames) for gray_frames, _ in chunks]
+
+
+def test_chunks_keep_shots_whole():
+    shot_lengths, skip_frames = [5, 7, 3, 20, 6], 2
+    frames = make_shot_frames(shot_lengths, width=160, height=90)
+    cuts = shot_cuts(shot_lengths, skip_frames)
+
+    full_searches, chunk_lengths = count_full_searches(frames, cuts, skip_frames, chunk_size=8)
+    # The 20 frame shot is the only one split, into 8 + 8 + 4
+    assert chunk_lengths == [5, 7, 3, 8, 8, 4, 6]
+    assert full_searches == len(shot_lengths) + 2
+
+    full_searches, chunk_lengths = count_full_searches(frames, cuts, skip_frames, chunk_size=32)
+    assert chunk_lengths == [15, 26]
+    assert full_searches == len(shot_lengths)
+
+
+def test_parallel_boxes_match_sequential():
+    shot_lengths, skip_frames = [6, 4, 9, 5], 2
+    frames = make_shot_frames(shot_lengths, width=320, height=180)
+    cuts = shot_cuts(shot_lengths, skip_frames)
+
+    sequential = BoundingBoxGenerator(temporal_warm_start=True)._generate_frame_boxes(
+        FrameReader(frames), len(frames), lambda progress: None, skip_frames, cuts)
+    parallel = BoundingBoxGenerator(temporal_warm_start=True, workers=2, chunk_size=12)._generate_frame_boxes_parallel(
+        FrameReader(frames), len(frames), lambda progress: None, skip_frames, cuts)
+    assert parallel == sequential
+
+
+if __name__ == "__main__":
+    skip_frames = 2
+    rng = np.random.default_rng(1)
+    shot_lengths = [int(length) for length in rng.integers(10, 120, size=12)]
+    frames = make_shot_frames(shot_lengths, width=1280, height=720)
+    cuts = shot_cuts(shot_lengths, skip_frames)
+    print(f"{len(frames)} frames in {len(shot_lengths)} shots")
+
+    for chunk_size in (16, 64, 128):
+        full_searches, chunk_lengths = count_full_searches(frames, cuts, skip_frames, chunk_size)
+        start = time.perf_counter()
+        BoundingBoxGenerator(temporal_warm_start=True, workers=4, chunk_size=chunk_size)._generate_frame_boxes_parallel(
+            FrameReader(frames), len(frames), lambda progress: None, skip_frames, cuts)
+        elapsed = time.perf_counter() - start
+        print(f"chunk_size={chunk_size}: {len(chunk_lengths)} chunks, {full_searches} full searches, "
+              f"{elapsed:.2f}s with 4 workers")
@@ -0,0 +1,110 @@
+import time
+
+import cv2
+import numpy as np
+
+from serverless_backend.services.bounding_box_generator.bounding_boxes import BoundingBoxGenerator
+from tests.bounding_box_generator.benchmark_single_box_search import make_synthetic_saliency_frames
+
+
+def make_textured_saliency_frames(num_frames=5, width=640, height=360, seed=1):
+    """Blurred noise frames with many comparable peaks, the hard case for a coarse-to-fine search."""
+    rng = np.random.default_rng(seed)
+    frames = []
+    for _ in range(num_frames):
+        frame = cv2.GaussianBlur(rng.uniform(0, 255, size=(height, width)).astype(np.uint8), (0, 0), 8)
+        frames.append(cv2.normalize(frame, None, 0, 255, cv2.NORM_MINMAX))
+    return frames
+
+
+def _box_saliency(generator, integral_image, box):
+    """Saliency captured by a single (x, y, w, h) box, 0 for empty boxes."""
+    if box is None or box[2] == 0 or box[3] == 0:
+        return 0.0
+    x, y, w, h = box
+    return float(generator._saliency_captured(integral_image, x, y, x + w - 1, y + h - 1))
+
+
+def _iou(box_a, box_b):
+    if box_a is None or box_b is None:
+        return float(box_a == box_b)
+    ax, ay, aw, ah = box_a
+    bx, by, bw, bh = box_b
+    inter_w = max(0, min(ax + aw, bx + bw) - max(ax, bx))
+    inter_h = max(0, min(ay + ah, by + bh) - max(ay, by))
+    intersection = inter_w * inter_h
+    union = aw * ah + bw * bh - intersection
+    return intersection / union if union > 0 else 1.0
+
+
+def benchmark_pyramid_search(frames, step_size=10, pyramid_factor=4):
+    """Compare exhaustive and pyramid search per box type: time per frame, saliency retained and IoU."""
+    exhaustive = BoundingBoxGenerator(step_size=step_size, search_mode="exhaustive")
+    pyramid = BoundingBoxGenerator(step_size=step_size, search_mode="pyramid", pyramid_factor=pyramid_factor)
+
+    start = time.perf_counter()
+    exhaustive_boxes = [exhaustive._find_boxes(frame) for frame in frames]
+    exhaustive_time = time.perf_counter() - start
+
+    start = time.perf_counter()
+    pyramid_boxes = [pyramid._find_boxes(frame) for frame in frames]
+    pyramid_time = time.perf_counter() - start
+
+    report = {
+        "exhaustive_seconds_per_frame": exhaustive_time / len(frames),
+        "pyramid_seconds_per_frame": pyramid_time / len(frames),
+        "speedup": exhaustive_time / pyramid_time if pyramid_time > 0 else float("inf"),
+        "box_types": {},
+    }
+
+    for box_type in exhaustive_boxes[0].keys():
+        retained, ious, exact = [], [], 0
+        for frame, reference, candidate in zip(frames, exhaustive_boxes, pyramid_boxes):
+            integral_image = exhaustive._calculate_integral_image(frame)
+            reference_boxes, candidate_boxes = reference[box_type], candidate[box_type]
+            if box_type != "two_boxes":
+                reference_boxes, candidate_boxes = [reference_boxes], [candidate_boxes]
+
+            reference_saliency = sum(_box_saliency(exhaustive, integral_image, b) for b in reference_boxes)
+            candidate_saliency = sum(_box_saliency(exhaustive, integral_image, b) for b in candidate_boxes)
+            if box_type == "reaction_box":
+                # The reaction box maximises saliency density rather than total saliency
+                reference_saliency /= max(1, sum(b[2] * b[3] for b in reference_boxes if b is not None))
+                candidate_saliency /= max(1, sum(b[2] * b[3] for b in candidate_boxes if b is not None))
+
+            retained.append(candidate_saliency / reference_saliency if reference_saliency > 0 else 1.0)
+            ious.append(np.mean([_iou(a, b) for a, b in zip(reference_boxes, candidate_boxes)]))
+            exact += int(reference[box_type] == candidate[box_type])
+
+        report["box_types"][box_type] = {
+            "mean_saliency_retained": float(np.mean(retained)),
+            "min_saliency_retained": float(np.min(retained)),
+            "mean_iou": float(np.mean(ious)),
+            "exact_match_rate": exact / len(frames),
+        }
+
+    return report
+
+
+def test_pyramid_search_retains_saliency():
+    frames = make_synthetic_saliency_frames(num_frames=3, width=640, height=360)
+    report = benchmark_pyramid_search(frames)
+    for box_type, metrics in report["box_types"].items():
+        assert metrics["mean_saliency_retained"] > 0.95, box_type
+
+
+if __name__ == "__main__":
+    for width, height in [(640, 360), (1920, 1080)]:
+        for name, make_frames in [("blobs", make_synthetic_saliency_frames),
+                                  ("textured", make_textured_saliency_frames)]:
+            frames = make_frames(num_frames=10, width=width, height=height)
+            for pyramid_factor in (2, 4):
+                report = benchmark_pyramid_search(frames, step_size=10, pyramid_factor=pyramid_factor)
+                print(f"{width}x{height} {name}, pyramid_factor={pyramid_factor}: "
+                      f"exhaustive {report['exhaustive_seconds_per_frame'] * 1000:.1f}ms/frame, "
+                      f"pyramid {report['pyramid_seconds_per_frame'] * 1000:.1f}ms/frame, "
+                      f"speedup {report['speedup']:.1f}x")
+                for box_type, metrics in report["box_types"].items():
+                    print(f"    {box_type:16s} saliency retained {metrics['mean_saliency_retained']:.4f} "
+                          f"(min {metrics['min_saliency_retained']:.4f}), IoU {metrics['mean_iou']:.3f}, "
+                          f"exact {metrics['exact_match_rate']:.0%}")
@@ -0,0 +1,64 @@
+import time
+
+import numpy as np
+
+from serverless_backend.services.bounding_box_generator.bounding_boxes import BoundingBoxGenerator
+
+
+def make_synthetic_saliency_frames(num_frames=5, width=640, height=360, seed=0):
+    """Create blurry saliency-like frames with a few moving hot spots."""
+    rng = np.random.default_rng(seed)
+    frames = []
+    centres = rng.uniform([0, 0], [width, height], size=(3, 2))
+    velocities = rng.uniform(-8, 8, size=(3, 2))
+    yy, xx = np.mgrid[0:height, 0:width]
+
+    for _ in range(num_frames):
+        frame = rng.uniform(0, 20, size=(height, width))
+        for (cx, cy), radius in zip(centres, (40, 70, 100)):
+            frame += 235 * np.exp(-((xx - cx) ** 2 + (yy - cy) ** 2) / (2 * radius ** 2))
+        centres = (centres + velocities) % [width, height]
+        frames.append(np.clip(frame, 0, 255).astype(np.uint8))
+
+    return frames
+
+
+def benchmark_single_box_search(frames, step_size=10):
+    loop_generator = BoundingBoxGenerator(step_size=step_size, engine="loop")
+    numpy_generator = BoundingBoxGenerator(step_size=step_size, engine="numpy")
+    integral_images = [loop_generator._calculate_integral_image(frame) for frame in frames]
+
+    start = time.perf_counter()
+    loop_boxes = [loop_generator._find_best_single_box(integral, loop_generator.tiktok_aspect_ratio)
+                  for integral in integral_images]
+    loop_time = time.perf_counter() - start
+
+    start = time.perf_counter()
+    numpy_boxes = [numpy_generator._find_best_single_box(integral, numpy_generator.tiktok_aspect_ratio)
+                   for integral in integral_images]
+    numpy_time = time.perf_counter() - start
+
+    mismatches = [i for i, (a, b) in enumerate(zip(loop_boxes, numpy_boxes)) if a != b]
+
+    return {
+        "frames": len(frames),
+        "loop_seconds_per_frame": loop_time / len(frames),
+        "numpy_seconds_per_frame": numpy_time / len(frames),
+        "speedup": loop_time / numpy_time if numpy_time > 0 else float("inf"),
+        "mismatched_frames": mismatches,
+    }
+
+
+def test_numpy_engine_matches_loop():
+    frames = make_synthetic_saliency_frames(num_frames=3, width=320, height=180)
+    results = benchmark_single_box_search(frames, step_size=10)
+    assert results["mismatched_frames"] == []
+
+
+if __name__ == "__main__":
+    for width, height in [(640, 360), (1920, 1080)]:
+        frames = make_synthetic_saliency_frames(num_frames=3, width=width, height=height)
+        results = benchmark_single_box_search(frames, step_size=10)
+        print(f"{width}x{height}: loop {results['loop_seconds_per_frame']:.3f}s/frame, "
+              f"numpy {results['numpy_seconds_per_frame']:.4f}s/frame, "
+              f"speedup {results['speedup']:.1f}x, mismatches {results['mismatched_frames']}")
@@ -0,0 +1,103 @@
+import time
+
+import cv2
+import numpy as np
+
+from serverless_backend.services.bounding_box_generator.video_cropper import VideoCropper
+
+
+class PerFrameSpriteVideoCropper(VideoCropper):
+    """The compositing VideoCropper used before OverlayCompositor, kept as the benchmark baseline."""
+
+    def _process_standard_tiktok(self, frame, box):
+        x, y, w, h = box
+        return cv2.resize(frame[y:y + h, x:x + w], (self.target_width, self.target_height))
+
+    def _process_two_boxes(self, frame, boxes, vertical=True, reverse=False):
+        cropped_frames = [frame[y:y + h, x:x + w] for x, y, w, h in boxes]
+        if reverse:
+            cropped_frames = cropped_frames[::-1]
+        return np.vstack([cv2.resize(f, (self.target_width, self.target_height // 2)) for f in cropped_frames])
+
+    def _overlay(self, main_frame, content, width, height):
+        border_thickness = 3
+        padding = border_thickness * 2
+        content = cv2.resize(content, (width - padding, height - padding))
+        sprite = np.zeros((height, width, 4), dtype=np.uint8)
+        cv2.rectangle(sprite, (0, 0), (width - 1, height - 1), (255, 255, 255, 255), border_thickness)
+        sprite[border_thickness:height - border_thickness, border_thickness:width - border_thickness, :3] = content
+        sprite[border_thickness:height - border_thickness, border_thickness:width - border_thickness, 3] = 255
+
+        y_offset = self.target_height - height - 20
+        x_offset = (self.target_width - width) // 2
+        for c in range(0, 3):
+            alpha = sprite[:, :, 3] / 255.0
+            main_frame[y_offset:y_offset + height, x_offset:x_offset + width, c] = \
+                (1 - alpha) * main_frame[y_offset:y_offset + height, x_offset:x_offset + width, c] + \
+                alpha * sprite[:, :, c]
+        return main_frame
+
+    def _process_picture_in_picture(self, frame, box):
+        pip_height = self.target_height // 4
+        pip_width = int(pip_height * (self.width / self.height))
+        return self._overlay(self._process_standard_tiktok(frame, box), frame, pip_width, pip_height)
+
+    def _process_reaction_box(self, frame, boxes):
+        main_box, (x, y, w, h) = boxes
+        reaction_height = self.target_height // 4
+        return self._overlay(self._process_standard_tiktok(frame, main_box), frame[y:y + h, x:x + w],
+                             int(reaction_height * (w / h)), reaction_height)
+
+    def _process_half_screen_box(self, frame, box):
+        x, y, w, h = box
+        resized_frame = cv2.resize(frame[y:y + h, x:x + w], (self.target_width, self.target_height // 2))
+        background_frame = np.zeros((self.target_height // 2, self.target_width, 3), dtype=np.uint8)
+        return np.vstack((resized_frame, background_frame))
+
+
+FRAME_TYPES = ["standard_tiktok", "two_boxes", "two_boxes_reversed", "picture_in_picture", "reaction_box",
+               "half_screen_box"]
+
+
+def make_cropper(cropper_class, frame_type, num_frames, width=1920, height=1080):
+    boxes = {
+        "standard_tiktok": [(600, 0, 608, 1080)] * num_frames,
+        "two_boxes": [[(0, 0, 960, 540), (960, 540, 960, 540)]] * num_frames,
+        "reaction_box": [(100, 100, 300, 400)] * num_frames,
+        "half_screen_box": [(300, 0, 1080, 960)] * num_frames,
+    }
+    cropper = cropper_class("unused.mp4", boxes, [frame_type] * num_frames)
+    cropper.width, cropper.height = width, height
+    return cropper
+
+
+def benchmark_layouts(num_frames=60, seed=0):
+    rng = np.random.default_rng(seed)
+    frames = [rng.integers(0, 256, size=(1080, 1920, 3), dtype=np.uint8) for _ in range(4)]
+    results = {}
+
+    for frame_type in FRAME_TYPES:
+        result = {}
+        outputs = {}
+        for name, cropper_class in [("before", PerFrameSpriteVideoCropper), ("after", VideoCropper)]:
+            cropper = make_cropper(cropper_class, frame_type, num_frames)
+            start = time.perf_counter()
+            for i in range(num_frames):
+                output = cropper._process_frame(frames[i % len(frames)], i)
+            result[name] = num_frames / (time.perf_counter() - start)
+            outputs[name] = output.copy()
+        result["identical"] = np.array_equal(outputs["before"], outputs["after"])
+        results[frame_type] = result
+
+    return results
+
+
+def test_layouts_match_per_frame_sprites():
+    results = benchmark_layouts(num_frames=4)
+    assert all(result["identical"] for result in results.values())
+
+
+if __name__ == "__main__":
+    for frame_type, result in benchmark_layouts().items():
+        print(f"{frame_type:20s} before {result['before']:6.1f} fps, after {result['after']:6.1f} fps "
+              f"({result['after'] / result['before']:.1f}x), identical output: {result['identical']}")
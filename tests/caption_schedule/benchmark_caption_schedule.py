@@ -0,0 +1,74 @@
+import time
+
+import numpy as np
+
+from serverless_backend.services.caption_schedule import CaptionSchedule
+
+
+def make_caption_intervals(line_count, fps=30, seed=0):
+    """Caption lines one after another with small gaps, as _prepare_transcript frames them, plus an always-on addition."""
+    rng = np.random.default_rng(seed)
+    intervals = []
+    frame = 0
+    for _ in range(line_count):
+        start = frame + int(rng.integers(0, fps // 2))
+        end = start + int(rng.uniform(0.8, 3.0) * fps)
+        intervals.append((start, end))
+        frame = end + 1
+    intervals.append((0, float('inf')))
+    return intervals
+
+
+def scan(intervals, frame):
+    """The previous per-frame lookup, a pass over every addition."""
+    return tuple(index for index, (start, end) in enumerate(intervals) if start <= frame <= end)
+
+
+def benchmark_caption_schedule(line_counts=(60, 600)):
+    results = {}
+    for line_count in line_counts:
+        intervals = make_caption_intervals(line_count)
+        frames = range(intervals[-2][1] + 30)
+
+        start = time.perf_counter()
+        scanned = [scan(intervals, frame) for frame in frames]
+        scan_seconds = time.perf_counter() - start
+
+        schedule = CaptionSchedule(intervals)
+        start = time.perf_counter()
+        scheduled = [schedule.advance(frame) for frame in frames]
+        schedule_seconds = time.perf_counter() - start
+
+        results[f"{line_count}_lines"] = {
+            "frames": len(frames),
+            "scan_us_per_frame": scan_seconds / len(frames) * 1e6,
+            "schedule_us_per_frame": schedule_seconds / len(frames) * 1e6,
+            "frames_needing_redraw": sum(changed for _, changed in scheduled),
+            "identical": scanned == [active for active, _ in scheduled],
+        }
+    return results
+
+
+def test_schedule_matches_scan():
+    rng = np.random.default_rng(1)
+    # Overlapping, zero-length and open-ended intervals
+    intervals = [(int(start), int(start + length)) for start, length in
+                 zip(rng.integers(0, 300, size=40), rng.integers(0, 40, size=40))]
+    intervals.append((50, float('inf')))
+    schedule = CaptionSchedule(intervals)
+
+    # Stepping forward, skipping ahead, then jumping back
+    frames = list(range(0, 120)) + list(range(120, 360, 7)) + [10, 11, 200, 5]
+    previous = ()
+    for frame in frames:
+        active, changed = schedule.advance(frame)
+        assert active == scan(intervals, frame)
+        assert changed == (active != previous)
+        previous = active
+
+    assert CaptionSchedule([]).advance(0) == ((), False)
+
+
+if __name__ == "__main__":
+    for name, result in benchmark_caption_schedule().items():
+        print(f"{name}: {result}")
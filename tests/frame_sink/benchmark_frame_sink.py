@@ -0,0 +1,134 @@
+import os
+import tempfile
+import time
+
+import cv2
+import numpy as np
+
+from serverless_backend.services.frame_sink import FrameSink
+
+
+def make_colour_frames(count, width=1080, height=1920):
+    """Frames like a captioned short: a slowly moving gradient with a shape and some sensor noise."""
+    rng = np.random.default_rng(0)
+    x = np.linspace(0, 255, width, dtype=np.float32)[None, :]
+    y = np.linspace(0, 255, height, dtype=np.float32)[:, None]
+    for index in range(count):
+        frame = np.empty((height, width, 3), dtype=np.uint8)
+        frame[:, :, 0] = (x + index * 2) % 256
+        frame[:, :, 1] = (y + index) % 256
+        frame[:, :, 2] = 128
+        cv2.circle(frame, (200 + index * 4, 900), 150, (30, 200, 60), -1)
+        cv2.putText(frame, "caption text", (150, 1500), cv2.FONT_HERSHEY_SIMPLEX, 4, (255, 255, 255), 10)
+        noise = rng.integers(-4, 5, size=(height // 4, width // 4, 1), dtype=np.int16)
+        yield np.clip(frame + cv2.resize(noise, (width, height))[..., None], 0, 255).astype(np.uint8)
+
+
+def make_saliency_frames(count, width=1080, height=1920):
+    """Smooth blobs that drift, like MSI-Net saliency maps."""
+    yy, xx = np.mgrid[0:height, 0:width].astype(np.float32)
+    for index in range(count):
+        centre_x, centre_y = 300 + index * 5, 800 + index * 3
+        saliency = np.exp(-((xx - centre_x) ** 2 + (yy - centre_y) ** 2) / (2 * 180.0 ** 2))
+        saliency += 0.6 * np.exp(-((xx - 800) ** 2 + (yy - 1400 + index * 2) ** 2) / (2 * 120.0 ** 2))
+        yield (np.clip(saliency, 0, 1) * 255).astype(np.uint8)
+
+
+def write_with_cv2(frames, path, fourcc, fps, size, is_color=True):
+    start = time.perf_counter()
+    writer = cv2.VideoWriter(path, cv2.VideoWriter_fourcc(*fourcc), fps, size, isColor=is_color)
+    count = 0
+    for frame in frames:
+        writer.write(frame)
+        count += 1
+    writer.release()
+    return count / (time.perf_counter() - start)
+
+
+def write_with_sink(frames, path, fps, size, **options):
+    with FrameSink(path, size[0], size[1], fps, **options) as sink:
+        for frame in frames:
+            sink.write(frame)
+    return sink.stats["fps"]
+
+
+def benchmark_frame_sink(frame_total=150, fps=30):
+    results = {}
+    size = (1080, 1920)
+    with tempfile.TemporaryDirectory() as directory:
+        colour = list(make_colour_frames(frame_total))
+        saliency = list(make_saliency_frames(frame_total))
+        cases = {
+            "colour": (
+                lambda path: write_with_cv2(colour, path, 'mp4v', fps, size), ".mp4",
+                lambda path: write_with_sink(colour, path, fps, size, preset='medium', crf=23),
+            ),
+            "saliency": (
+                lambda path: write_with_cv2(saliency, path, 'MJPG', fps / 3, size, is_color=False), ".avi",
+                lambda path: write_with_sink(saliency, path, fps / 3, size, input_pix_fmt='gray', pix_fmt='gray',
+                                             preset='medium', crf=23),
+            ),
+        }
+        for name, (write_cv2, cv2_suffix, write_sink) in cases.items():
+            cv2_path = os.path.join(directory, f"{name}_cv2{cv2_suffix}")
+            sink_path = os.path.join(directory, f"{name}_sink.mp4")
+            cv2_fps = write_cv2(cv2_path)
+            sink_fps = write_sink(sink_path)
+            results[name] = {
+                "cv2_mb": os.path.getsize(cv2_path) / 1e6,
+                "sink_mb": os.path.getsize(sink_path) / 1e6,
+                "size_ratio": os.path.getsize(cv2_path) / os.path.getsize(sink_path),
+                "cv2_encode_fps": cv2_fps,
+                "sink_encode_fps": sink_fps,
+            }
+    return results
+
+
+def read_frames(path):
+    cap = cv2.VideoCapture(path)
+    frames = []
+    while True:
+        ret, frame = cap.read()
+        if not ret:
+            break
+        frames.append(frame)
+    cap.release()
+    return frames
+
+
+def test_frame_sink_encodes_and_reports_failures():
+    with tempfile.TemporaryDirectory() as directory:
+        frames = list(make_colour_frames(12, width=320, height=240))
+        path = os.path.join(directory, "colour.mp4")
+        write_with_sink(frames, path, 30, (320, 240), preset='ultrafast', crf=18)
+        decoded = read_frames(path)
+        assert len(decoded) == 12
+        assert np.abs(decoded[5].astype(np.int16) - frames[5]).mean() < 4
+
+        gray_path = os.path.join(directory, "gray.mp4")
+        write_with_sink(make_saliency_frames(6, width=320, height=240), gray_path, 10, (320, 240),
+                        input_pix_fmt='gray', pix_fmt='gray')
+        assert len(read_frames(gray_path)) == 6
+
+        # A failing encode raises with FFmpeg's error
+        try:
+            write_with_sink(frames, os.path.join(directory, "bad.mp4"), 30, (320, 240), codec='no-such-codec')
+        except RuntimeError as e:
+            assert "no-such-codec" in str(e)
+        else:
+            raise AssertionError("FFmpeg failure was not raised")
+
+        # An error while writing kills FFmpeg and propagates
+        try:
+            with FrameSink(os.path.join(directory, "aborted.mp4"), 320, 240, 30) as sink:
+                sink.write(frames[0])
+                raise KeyError("stop")
+        except KeyError:
+            assert sink.process.poll() is not None
+        else:
+            raise AssertionError("The error inside the sink was swallowed")
+
+
+if __name__ == "__main__":
+    for name, result in benchmark_frame_sink().items():
+        print(f"{name}: {result}")
@@ -0,0 +1,95 @@
+import json
+import time
+
+import numpy as np
+
+from serverless_backend.services.packed_words import pack_words
+from serverless_backend.services.parse_segment_words import parse_segment_words
+
+VOCABULARY = ["the", "and", "so", "we", "video", "really", "think", "you", "know,", "that's", "going", "to",
+              "make", "it", "work.", "I", "mean", "this", "is", "what", "happens", "when", "people", "café"]
+
+
+def make_words(count, seed=0):
+    """Words like a Deepgram transcript after reformat_transcripts, with millisecond times."""
+    rng = np.random.default_rng(seed)
+    words = []
+    time_cursor = 12.0
+    for index in range(count):
+        duration = round(float(rng.uniform(0.08, 0.6)), 3)
+        words.append({
+            'word': VOCABULARY[int(rng.integers(len(VOCABULARY)))],
+            'start_time': round(time_cursor, 3),
+            'end_time': round(time_cursor + duration, 3),
+            'confidence': round(float(rng.uniform(0.5, 1.0)), 4),
+            'language': 'en',
+            'group_index': index,
+            'index': 4000 + index,
+        })
+        time_cursor += duration + round(float(rng.uniform(0, 0.3)), 3)
+    return words
+
+
+def legacy_document(words):
+    """A segment document as create_segments used to write it: the str() of the list, then json.dumps of that."""
+    return {'words': json.dumps(str(words))}
+
+
+def core(words):
+    return [{key: word[key] for key in ('word', 'start_time', 'end_time', 'confidence', 'index')} for word in words]
+
+
+def time_parse(document, repeats):
+    start = time.perf_counter()
+    for _ in range(repeats):
+        words = parse_segment_words(document)
+    return (time.perf_counter() - start) / repeats, words
+
+
+def benchmark_packed_words(word_counts=(500, 2000, 8000), repeats=5):
+    results = {}
+    for count in word_counts:
+        words = make_words(count)
+        legacy = legacy_document(words)
+        packed = {'words_packed': pack_words(words)}
+        legacy_seconds, legacy_words = time_parse(legacy, repeats)
+        packed_seconds, packed_words = time_parse(packed, repeats)
+        results[f"{count}_words"] = {
+            "legacy_kb": len(legacy['words'].encode('utf-8')) / 1024,
+            "packed_kb": len(packed['words_packed']) / 1024,
+            "legacy_parse_ms": legacy_seconds * 1000,
+            "packed_parse_ms": packed_seconds * 1000,
+            "speedup": legacy_seconds / packed_seconds,
+            "identical": core(legacy_words) == packed_words,
+        }
+    return results
+
+
+def test_packed_words_round_trip_and_legacy_fallback():
+    words = make_words(300)
+    # Far enough into a video that absolute float32 times would lose the milliseconds
+    for word in words:
+        word['start_time'] += 20000
+        word['end_time'] += 20000
+    words[5]['start_time'] = None
+    words[7]['word'] = "naïve"
+    packed = pack_words(words)
+
+    assert parse_segment_words({'words_packed': packed}) == core(words)
+    # Old segments only have the stringified list
+    assert parse_segment_words(legacy_document(words)) == words
+    # The packed field wins when a segment has both
+    assert parse_segment_words({'words_packed': packed, 'words': "not a list"}) == core(words)
+    assert parse_segment_words({'words_packed': pack_words([])}) == []
+
+    try:
+        parse_segment_words({'words_packed': packed[:len(packed) // 2]})
+    except ValueError:
+        pass
+    else:
+        raise AssertionError("Truncated packed words were not rejected")
+
+
+if __name__ == "__main__":
+    for name, result in benchmark_packed_words().items():
+        print(f"{name}: {result}")
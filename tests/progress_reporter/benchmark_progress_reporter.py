@@ -0,0 +1,87 @@
+import time
+
+from serverless_backend.services.progress_reporter import ProgressReporter
+
+
+class SlowFirestore:
+    """Stands in for FirebaseService, taking `latency` seconds per write like a Firestore round trip."""
+
+    def __init__(self, latency=0.05):
+        self.latency = latency
+        self.writes = []
+
+    def update_document(self, collection_name, document_id, update_fields):
+        time.sleep(self.latency)
+        self.writes.append({(collection_name, document_id): update_fields})
+
+    def update_message(self, document_id, message):
+        # The old update_message read the request document before writing it back
+        time.sleep(2 * self.latency)
+        self.writes.append({("requests", document_id): {"progress_message": message}})
+
+    def batch_update_documents(self, updates):
+        time.sleep(self.latency)
+        self.writes.append(updates)
+
+
+def per_word_loop(update_progress, update_message, words=200, seconds_per_word=0.002):
+    """The shape of the generate-test-audio word loop: a little work, then progress and a message per word."""
+    for i in range(words):
+        time.sleep(seconds_per_word)
+        update_progress(40 + (i / words * 50))
+        update_message(f"Processed segment {i + 1}/{words}")
+
+
+def benchmark_progress_reporter(words=200):
+    results = {}
+
+    firebase_service = SlowFirestore()
+
+    def update_progress(progress):
+        firebase_service.update_document("shorts", "short", {"update_progress": progress})
+        firebase_service.update_document("requests", "request", {"progress": progress})
+
+    def update_message(message):
+        firebase_service.update_document("shorts", "short", {"progress_message": message})
+        firebase_service.update_message("request", message)
+
+    start = time.perf_counter()
+    per_word_loop(update_progress, update_message, words)
+    results["direct"] = {"seconds": time.perf_counter() - start, "writes": len(firebase_service.writes)}
+
+    firebase_service = SlowFirestore()
+    start = time.perf_counter()
+    with ProgressReporter(firebase_service, "request", "short") as reporter:
+        per_word_loop(reporter.update_progress, reporter.update_message, words)
+    logs = sum(len(update[("requests", "request")].get("logs", []).values)
+               for update in firebase_service.writes)
+    final = firebase_service.writes[-1][("requests", "request")]
+    results["reporter"] = {"seconds": time.perf_counter() - start, "writes": len(firebase_service.writes),
+                           "logs": logs, "final_progress": final.get("progress"),
+                           "final_message": final.get("progress_message")}
+    return results
+
+
+def test_reporter_keeps_every_log_and_the_final_state():
+    result = benchmark_progress_reporter(words=50)["reporter"]
+    assert result["logs"] == 50
+    assert result["final_message"] == "Processed segment 50/50"
+
+
+def test_small_progress_changes_are_written_after_the_interval():
+    firestore = SlowFirestore(latency=0.0)
+    reporter = ProgressReporter(firestore, "request", interval=0.1, min_progress_change=5.0)
+    try:
+        reporter.update_progress(10)
+        time.sleep(0.05)
+        # Under min_progress_change, with nothing else pending
+        reporter.update_progress(12)
+        time.sleep(0.4)
+        assert firestore.writes[-1][("requests", "request")]["progress"] == 12
+    finally:
+        reporter.close()
+
+
+if __name__ == "__main__":
+    for name, result in benchmark_progress_reporter().items():
+        print(f"{name}: {result}")
@@ -0,0 +1,96 @@
+import os
+import tempfile
+import time
+
+from serverless_backend.services.audio_assembler import assemble_audio_spans, merge_word_spans
+from serverless_backend.services.ranged_blob import BucketRangeBackend, LocalRangeBackend, RangedBlobFile
+from tests.audio_assembler.benchmark_audio_assembly import make_kept_words, make_source_wav
+
+
+def benchmark_ranged_reads(minutes=30, num_words=300):
+    """Fetches a short's test audio from a WAV blob by range requests against a local stand-in bucket."""
+    with tempfile.TemporaryDirectory() as directory:
+        blob_name = "source.wav"
+        make_source_wav(os.path.join(directory, blob_name), minutes=minutes)
+        spans = merge_word_spans(make_kept_words(num_words=num_words, source_seconds=minutes * 60))
+        backend = LocalRangeBackend(directory)
+
+        start = time.perf_counter()
+        full = assemble_audio_spans(os.path.join(directory, blob_name), spans)
+        full_seconds = time.perf_counter() - start
+
+        start = time.perf_counter()
+        with RangedBlobFile(backend, blob_name) as blob_file:
+            ranged = assemble_audio_spans(blob_file, spans)
+        ranged_seconds = time.perf_counter() - start
+
+        return {
+            "spans": len(spans),
+            "blob_mb": backend.size(blob_name) / 1e6,
+            "fetched_mb": backend.bytes_read / 1e6,
+            "range_requests": backend.requests,
+            "local_file_seconds": full_seconds,
+            "ranged_seconds": ranged_seconds,
+            "identical": full.raw_data == ranged.raw_data,
+        }
+
+
+def test_ranged_file_reads_and_seeks_like_a_file():
+    with tempfile.TemporaryDirectory() as directory:
+        data = bytes(range(256)) * 1000
+        with open(os.path.join(directory, "blob"), 'wb') as blob:
+            blob.write(data)
+        backend = LocalRangeBackend(directory)
+        blob_file = RangedBlobFile(backend, "blob", read_ahead=4096)
+
+        assert blob_file.read(10) == data[:10]
+        assert blob_file.read(100) == data[10:110]
+        assert backend.requests == 1
+        blob_file.seek(-50, os.SEEK_END)
+        assert blob_file.read() == data[-50:]
+        assert blob_file.read(10) == b''
+        blob_file.seek(100000)
+        assert blob_file.read(20000) == data[100000:120000]
+
+
+def test_ranged_wav_fetches_only_the_spans():
+    results = benchmark_ranged_reads(minutes=10, num_words=100)
+    assert results["identical"]
+    assert results["fetched_mb"] < results["blob_mb"] / 4
+
+
+class FakeBlob:
+    """Records what BucketRangeBackend.compose sends, like a google.cloud.storage Blob."""
+
+    def __init__(self, name):
+        self.name = name
+        self.content_type = None
+        self.composed_content_type = None
+        self.size = self.generation = self.crc32c = None
+
+    def compose(self, sources):
+        self.composed_content_type = self.content_type
+
+
+class FakeBucket:
+    def __init__(self):
+        self.blobs = {}
+
+    def blob(self, blob_name):
+        return self.blobs.setdefault(blob_name, FakeBlob(blob_name))
+
+
+def test_composed_blobs_get_a_content_type():
+    bucket = FakeBucket()
+    backend = BucketRangeBackend(bucket)
+    backend.compose("short-video/short.mp4", ["short-video/short.mp4.parts-1/00"])
+    backend.compose("videos/unknown.parts-2/0031", ["videos/unknown.parts-2/0000"])
+    backend.compose("audio/video.wav", ["audio/video.wav.parts-3/0000"], content_type="audio/wav")
+
+    assert bucket.blobs["short-video/short.mp4"].composed_content_type == "video/mp4"
+    assert bucket.blobs["videos/unknown.parts-2/0031"].composed_content_type is None
+    assert bucket.blobs["audio/video.wav"].composed_content_type == "audio/wav"
+
+
+if __name__ == "__main__":
+    print(benchmark_ranged_reads())
@@ -0,0 +1,228 @@
+import threading
+import time
+from types import SimpleNamespace
+
+from serverless_backend.services.firebase import FirebaseService
+from serverless_backend.services.segment_summariser import SegmentSummariser
+from serverless_backend.services.vector_db.ziliz import ZilizVectorDB
+
+# Seconds per call, roughly the ratios seen from the OpenAI, Firestore and Milvus APIs
+LATENCIES = {
+    "summary": 0.4,
+    "merge": 0.08,
+    "moderation": 0.05,
+    "embedding": 0.05,
+    "firestore_write": 0.03,
+    "milvus_insert": 0.06,
+}
+
+MODERATION = {key: False for key in ("flagged", "harassment", "harassment_threatening", "hate", "hate_threatening",
+                                     "self_harm", "self_harm_intent", "sexual", "sexual_minors")}
+
+
+class FakeOpenAIService:
+    """Answers like OpenAIService after a fixed latency, recording the rolling merges in the order they happen."""
+
+    def __init__(self, latencies):
+        self.latencies = latencies
+        self.merges = []
+        self.in_flight = 0
+        self.peak_in_flight = 0
+        self._lock = threading.Lock()
+
+    def _call(self, kind):
+        with self._lock:
+            self.in_flight += 1
+            self.peak_in_flight = max(self.peak_in_flight, self.in_flight)
+        time.sleep(self.latencies[kind])
+        with self._lock:
+            self.in_flight -= 1
+
+    def get_segment_summary(self, segment_index, segment_text, previous_segment):
+        self._call("summary")
+        return {"segment_summary": f"summary of {segment_text}", "segment_title": f"title {segment_index}",
+                "new_combined_summary": f"{previous_segment}|{segment_index}"}
+
+    def summarise_segment(self, segment_index, segment_text):
+        self._call("summary")
+        return {"segment_summary": f"summary of {segment_text}", "segment_title": f"title {segment_index}"}
+
+    def merge_segment_summary(self, segment_index, segment_summary, previous_summary):
+        self._call("merge")
+        self.merges.append(segment_index)
+        return f"{previous_summary}|{segment_index}"
+
+    def extract_moderation_metrics(self, segment_text):
+        self._call("moderation")
+        return dict(MODERATION, flagged=segment_text.endswith("7"))
+
+    def get_embedding(self, text):
+        self._call("embedding")
+        return [float(len(text))] * 4
+
+
+class FakeFirebaseService:
+    def __init__(self, latencies):
+        self.latencies = latencies
+        self.writes = 0
+        self.documents = {}
+
+    def update_document(self, collection_name, document_id, update_fields):
+        time.sleep(self.latencies["firestore_write"])
+        self.writes += 1
+        self.documents.setdefault((collection_name, document_id), {}).update(update_fields)
+
+    def batch_update_documents(self, updates):
+        time.sleep(self.latencies["firestore_write"])
+        self.writes += 1
+        for key, update_fields in updates.items():
+            self.documents.setdefault(key, {}).update(update_fields)
+
+
+class FakeVectorDB(ZilizVectorDB):
+    """ZilizVectorDB over an in-memory collection instead of a Milvus client."""
+
+    def __init__(self, open_ai_service, latencies):
+        self.open_ai_service = open_ai_service
+        self.latencies = latencies
+        self.inserts = 0
+        self.rows = []
+
+    def insert_to_collection(self, collection_name, data):
+        time.sleep(self.latencies["milvus_insert"])
+        self.inserts += 1
+        self.rows.extend(data)
+
+
+def make_segments(count):
+    return [{"id": f"segment-{index}", "index": index, "video_id": "video", "transcript": f"transcript {index}"}
+            for index in range(count)]
+
+
+def summarise_sequentially(open_ai_service, firebase_service, vector_db, segments, channel_id):
+    """The previous route loop: one segment at a time, with a write and an insert per segment."""
+    previous_segment_summary = ""
+    for segment in segments:
+        summary = open_ai_service.get_segment_summary(segment['index'], segment['transcript'], previous_segment_summary)
+        content_moderation = open_ai_service.extract_moderation_metrics(segment['transcript'])
+        segment_summary = summary['segment_summary']
+        previous_segment_summary = summary.get("new_combined_summary", previous_segment_summary)
+        segment_title = summary.get('segment_title', "Unable to name segment")
+        firebase_service.update_document("topical_segments", segment["id"], {
+            'segment_summary': segment_summary,
+            'segment_title': segment_title,
+            'segment_status': "Segment Summarised",
+            **content_moderation,
+        })
+        segment['segment_summary'] = segment_summary
+        segment['segment_title'] = segment_title
+        embedding = open_ai_service.get_embedding(vector_db.generate_segment_text(segment))
+        vector_db.insert_to_collection('segments', data=[vector_db.segment_row(segment['id'], segment['video_id'],
+                                                                               channel_id, embedding)])
+    return previous_segment_summary
+
+
+def summarise_with_pipeline(open_ai_service, firebase_service, vector_db, segments, channel_id, max_workers=8):
+    summariser = SegmentSummariser(open_ai_service, vector_db, max_workers=max_workers)
+    updates, vector_rows, video_summary = summariser.summarise(segments, channel_id)
+    firebase_service.batch_update_documents(updates)
+    vector_db.upload_segment_embeddings(vector_rows)
+    return video_summary
+
+
+def run(summarise, segment_count, latencies, **options):
+    open_ai_service = FakeOpenAIService(latencies)
+    firebase_service = FakeFirebaseService(latencies)
+    vector_db = FakeVectorDB(open_ai_service, latencies)
+    start = time.perf_counter()
+    video_summary = summarise(open_ai_service, firebase_service, vector_db, make_segments(segment_count), "channel",
+                              **options)
+    return {
+        "seconds": time.perf_counter() - start,
+        "firestore_writes": firebase_service.writes,
+        "milvus_inserts": vector_db.inserts,
+        "peak_concurrent_calls": open_ai_service.peak_in_flight,
+        "video_summary": video_summary,
+        "documents": firebase_service.documents,
+        "rows": vector_db.rows,
+        "merges": open_ai_service.merges,
+    }
+
+
+def benchmark_segment_summariser(segment_count=30):
+    results = {}
+    for name, summarise in (("sequential", summarise_sequentially), ("pipeline", summarise_with_pipeline)):
+        result = run(summarise, segment_count, LATENCIES)
+        results[name] = {key: result[key] for key in
+                         ("seconds", "firestore_writes", "milvus_inserts", "peak_concurrent_calls")}
+    results["speedup"] = results["sequential"]["seconds"] / results["pipeline"]["seconds"]
+    return results
+
+
+def test_pipeline_writes_what_the_loop_wrote():
+    latencies = {kind: 0.001 for kind in LATENCIES}
+    # Later segments finish their summary first, the merges must still go in segment order
+    sequential = run(summarise_sequentially, 12, latencies)
+    pipeline = run(summarise_with_pipeline, 12, latencies, max_workers=4)
+
+    assert pipeline["documents"] == sequential["documents"]
+    assert pipeline["documents"][("topical_segments", "segment-7")]["flagged"]
+    assert pipeline["rows"] == sequential["rows"]
+    assert pipeline["video_summary"] == sequential["video_summary"] == "|" + "|".join(str(i) for i in range(12))
+    assert pipeline["merges"] == list(range(12))
+    assert (pipeline["firestore_writes"], pipeline["milvus_inserts"]) == (1, 1)
+    assert pipeline["peak_concurrent_calls"] > 1
+
+
+def test_failed_summary_cancels_the_queued_calls():
+    open_ai_service = FakeOpenAIService({kind: 0.01 for kind in LATENCIES})
+    calls = []
+
+    def summarise_segment(segment_index, segment_text):
+        calls.append(segment_index)
+        if segment_index == 0:
+            raise RuntimeError("rate limited")
+        return FakeOpenAIService.summarise_segment(open_ai_service, segment_index, segment_text)
+
+    open_ai_service.summarise_segment = summarise_segment
+    summariser = SegmentSummariser(open_ai_service, FakeVectorDB(open_ai_service, LATENCIES), max_workers=2)
+    try:
+        summariser.summarise(make_segments(50), "channel")
+    except RuntimeError as e:
+        assert "rate limited" in str(e)
+    else:
+        raise AssertionError("The failed summary was not raised")
+    # Only the calls already running when the failure was seen went ahead
+    assert len(calls) < 10
+
+
+class FakeFirestore:
+    """Records the size of each batched write committed, like firestore.client() under FirebaseService."""
+
+    def __init__(self):
+        self.committed = []
+
+    def collection(self, collection_name):
+        return SimpleNamespace(document=lambda document_id: (collection_name, document_id))
+
+    def batch(self):
+        writes = []
+        return SimpleNamespace(update=lambda reference, fields: writes.append(reference),
+                               commit=lambda: self.committed.append(len(writes)))
+
+
+def test_batch_updates_stay_within_firestore_limit():
+    firebase_service = FirebaseService.__new__(FirebaseService)
+    firebase_service.db = FakeFirestore()
+    firebase_service.batch_update_documents({("topical_segments", f"segment-{index}"): {"segment_title": "title"}
+                                             for index in range(1203)})
+    assert firebase_service.db.committed == [500, 500, 203]
+
+    firebase_service.db = FakeFirestore()
+    firebase_service.batch_update_documents({})
+    assert firebase_service.db.committed == []
+
+
+if __name__ == "__main__":
+    for name, result in benchmark_segment_summariser().items():
+        print(f"{name}: {result}")
@@ -0,0 +1,109 @@
+import json
+import os
+import sys
+import tempfile
+
+import cv2
+import numpy as np
+
+from serverless_backend.services.video_analyser.video_analyser import VideoAnalyser
+
+
+def make_labelled_clip(path, fps=30, width=640, height=360, seed=0):
+    """
+    Write a clip covering the cases that trouble the global threshold: calm shots, high-motion shots
+    (fast pans over texture), and camera flashes inside a shot. Returns the first frame of each new shot.
+    """
+    rng = np.random.default_rng(seed)
+    writer = cv2.VideoWriter(path, cv2.VideoWriter_fourcc(*'MJPG'), fps, (width, height))
+    shot_types = ["calm", "pan", "calm", "flash", "pan", "calm", "pan", "flash", "calm", "pan"]
+    shot_starts = []
+    frame_index = 0
+
+    for shot_type in shot_types:
+        shot_starts.append(frame_index)
+        shot_length = int(rng.uniform(2.5, 5) * fps)
+        texture = cv2.resize(rng.integers(0, 256, size=(height // 8, width // 4, 3), dtype=np.uint8),
+                             (width * 2, height), interpolation=cv2.INTER_CUBIC)
+        tint = rng.integers(0, 256, size=3)
+        texture = ((texture.astype(np.int16) + tint) // 2).astype(np.uint8)
+        flash_frames = set(rng.choice(np.arange(10, shot_length - 10), size=2, replace=False)) \
+            if shot_type == "flash" else set()
+        speed = 12 if shot_type == "pan" else 1
+
+        for i in range(shot_length):
+            offset = (i * speed) % width
+            frame = np.ascontiguousarray(texture[:, offset:offset + width])
+            if i in flash_frames:
+                frame = np.full_like(frame, 250)
+            writer.write(frame)
+            frame_index += 1
+
+    writer.release()
+    return shot_starts[1:]
+
+
+def precision_recall(true_cuts, detected_cuts, tolerance=2):
+    """Precision, recall and F1 of detected cuts, matching each true cut at most once within `tolerance` frames."""
+    unmatched = list(detected_cuts)
+    true_positives = 0
+    for cut in true_cuts:
+        match = next((c for c in unmatched if abs(c - cut) <= tolerance), None)
+        if match is not None:
+            unmatched.remove(match)
+            true_positives += 1
+
+    precision = true_positives / len(detected_cuts) if detected_cuts else 1.0
+    recall = true_positives / len(true_cuts) if true_cuts else 1.0
+    f1 = 2 * precision * recall / (precision + recall) if precision + recall > 0 else 0.0
+    return {"precision": precision, "recall": recall, "f1": f1}
+
+
+def evaluate_shot_detection(video_path, true_cuts):
+    """Compare the global-threshold and adaptive detectors against labelled shot starts."""
+    analyser = VideoAnalyser()
+
+    differences = analyser.get_differences(video_path, lambda x: None)[0]
+    # Both detectors return the last frame before each cut, labels are the first frame of the new shot
+    global_cuts = [cut + 1 for cut in analyser.get_camera_cuts(differences)]
+    adaptive_cuts = [cut + 1 for cut in analyser.iter_camera_cuts_adaptive(video_path)]
+
+    return {
+        "global": {"cuts": global_cuts, **precision_recall(true_cuts, global_cuts)},
+        "adaptive": {"cuts": adaptive_cuts, **precision_recall(true_cuts, adaptive_cuts)},
+    }
+
+
+def test_adaptive_detector_is_not_worse():
+    with tempfile.TemporaryDirectory() as directory:
+        video_path = os.path.join(directory, "labelled.avi")
+        true_cuts = make_labelled_clip(video_path)
+        results = evaluate_shot_detection(video_path, true_cuts)
+    assert results["adaptive"]["f1"] >= results["global"]["f1"]
+
+
+if __name__ == "__main__":
+    # Optionally pass a JSON file of {"video path": [first frame of each new shot, ...]} to evaluate real clips
+    if len(sys.argv) > 1:
+        with open(sys.argv[1]) as labels_file:
+            labelled_videos = json.load(labels_file)
+    else:
+        directory = tempfile.mkdtemp()
+        labelled_videos = {}
+        for seed in range(3):
+            video_path = os.path.join(directory, f"labelled_{seed}.avi")
+            labelled_videos[video_path] = make_labelled_clip(video_path, seed=seed)
+
+    totals = {"global": [], "adaptive": []}
+    for video_path, true_cuts in labelled_videos.items():
+        results = evaluate_shot_detection(video_path, true_cuts)
+        print(f"{video_path}: true cuts {true_cuts}")
+        for method, result in results.items():
+            totals[method].append(result)
+            print(f"    {method:8s} precision {result['precision']:.2f} recall {result['recall']:.2f} "
+                  f"F1 {result['f1']:.2f} cuts {result['cuts']}")
+
+    for method, results in totals.items():
+        print(f"{method}: mean precision {np.mean([r['precision'] for r in results]):.2f}, "
+              f"mean recall {np.mean([r['recall'] for r in results]):.2f}, "
+              f"mean F1 {np.mean([r['f1'] for r in results]):.2f}")
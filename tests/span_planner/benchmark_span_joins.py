@@ -0,0 +1,146 @@
+import os
+import subprocess
+import tempfile
+import time
+import wave
+
+import cv2
+import numpy as np
+from moviepy.editor import VideoFileClip, concatenate_videoclips
+
+from serverless_backend.services.audio_assembler import assemble_audio_spans
+from serverless_backend.services.frame_sink import FrameSink
+from serverless_backend.services.span_planner import SpanPlanner
+from serverless_backend.services.video_clipper import VideoClipper
+
+
+def make_word_spans(num_words=120, seconds=60, seed=0):
+    """Word-level kept spans like handle_operations_from_logs produces: short words, small and large cuts."""
+    rng = np.random.default_rng(seed)
+    spans = []
+    cursor = 0.5
+    while len(spans) < num_words and cursor < seconds - 1:
+        duration = rng.uniform(0.12, 0.45)
+        spans.append((round(cursor, 3), round(cursor + duration, 3)))
+        cursor += duration + (rng.uniform(0.3, 1.5) if rng.random() < 0.25 else rng.uniform(0.0, 0.05))
+    return spans
+
+
+def make_source_video(path, seconds=60):
+    subprocess.run([
+        'ffmpeg', '-v', 'error', '-y',
+        '-f', 'lavfi', '-i', f'testsrc=size=640x360:rate=30:d={seconds}',
+        '-f', 'lavfi', '-i', f'sine=frequency=220:duration={seconds}',
+        '-c:v', 'libx264', '-preset', 'ultrafast', '-c:a', 'aac', '-shortest', path
+    ], check=True)
+
+
+def make_source_wav(path, seconds=60, frame_rate=44100):
+    t = np.arange(seconds * frame_rate) / frame_rate
+    samples = (8000 * np.sin(2 * np.pi * 220 * t)).astype(np.int16)
+    with wave.open(path, 'wb') as wav_file:
+        wav_file.setnchannels(1)
+        wav_file.setsampwidth(2)
+        wav_file.setframerate(frame_rate)
+        wav_file.writeframes(samples.tobytes())
+
+
+def moviepy_subclips(input_path, spans, output_path):
+    """The previous VideoClipper.delete_segments_from_video: one moviepy subclip per span."""
+    video = VideoFileClip(input_path)
+    final_clip = concatenate_videoclips([video.subclip(start, end) for start, end in spans])
+    final_clip.write_videofile(output_path, codec="libx264", fps=24, preset="fast", logger=None,
+                               temp_audiofile=output_path + ".mp3")
+    video.close()
+
+
+def largest_join_step(samples, spans_ms, frame_rate):
+    """Largest sample-to-sample jump at the joins, a click shows up as a large jump."""
+    samples = np.frombuffer(samples, dtype=np.int16).astype(np.int32)
+    offsets = np.cumsum([int(end * frame_rate / 1000) - int(start * frame_rate / 1000) for start, end in spans_ms])
+    return max(abs(samples[o] - samples[o - 1]) for o in offsets[:-1] if 0 < o < len(samples))
+
+
+def benchmark_span_joins(seconds=60):
+    spans = make_word_spans(seconds=seconds)
+    planner = SpanPlanner()
+    results = {"word_spans": len(spans), "planned_spans": len(planner.merge(spans))}
+
+    with tempfile.TemporaryDirectory() as directory:
+        video_path = os.path.join(directory, "source.mp4")
+        make_source_video(video_path, seconds)
+
+        start = time.perf_counter()
+        moviepy_subclips(video_path, spans, os.path.join(directory, "moviepy.mp4"))
+        results["moviepy_seconds"] = time.perf_counter() - start
+
+        start = time.perf_counter()
+        VideoClipper().delete_segments_from_video(video_path, spans, os.path.join(directory, "planned.mp4"),
+                                                  lambda x: None)
+        results["filter_script_seconds"] = time.perf_counter() - start
+
+        wav_path = os.path.join(directory, "source.wav")
+        make_source_wav(wav_path, seconds)
+        spans_ms = [(int(s * 1000), int(e * 1000)) for s, e in planner.merge(spans)]
+        plain = assemble_audio_spans(wav_path, spans_ms)
+        joined = assemble_audio_spans(wav_path, spans_ms, span_planner=planner)
+        results["plain_join_step"] = largest_join_step(plain.raw_data, spans_ms, plain.frame_rate)
+        results["crossfaded_join_step"] = largest_join_step(joined.raw_data, spans_ms, joined.frame_rate)
+        results["same_length"] = len(plain.raw_data) == len(joined.raw_data)
+
+    return results
+
+
+def test_crossfaded_joins_are_smoother():
+    planner = SpanPlanner()
+    spans_ms = [(int(s * 1000), int(e * 1000)) for s, e in planner.merge(make_word_spans(seconds=20))]
+    with tempfile.TemporaryDirectory() as directory:
+        wav_path = os.path.join(directory, "source.wav")
+        make_source_wav(wav_path, 20)
+        plain = assemble_audio_spans(wav_path, spans_ms)
+        joined = assemble_audio_spans(wav_path, spans_ms, span_planner=planner)
+    assert len(plain.raw_data) == len(joined.raw_data)
+    assert (largest_join_step(joined.raw_data, spans_ms, joined.frame_rate) <
+            largest_join_step(plain.raw_data, spans_ms, plain.frame_rate))
+
+
+def test_caption_times_follow_the_cut_video():
+    # A bar that moves 4 px a frame, so each frame of the cut shows which source frame it came from
+    fps = 30
+    with tempfile.TemporaryDirectory() as directory:
+        source_path = os.path.join(directory, "source.mp4")
+        with FrameSink(source_path, 640, 64, fps, input_pix_fmt='gray', pix_fmt='yuv420p', crf=12) as sink:
+            for index in range(160):
+                frame = np.zeros((64, 640), dtype=np.uint8)
+                frame[:, index * 4:index * 4 + 4] = 255
+                sink.write(frame)
+
+        # Words 0.2 s long, in pairs 40 ms apart, which the planner keeps, with 300 ms cut between pairs
+        words = []
+        cursor = 0.2
+        for index in range(14):
+            words.append({'word': f"word{index}", 'start_time': round(cursor, 3), 'end_time': round(cursor + 0.2, 3)})
+            cursor += 0.2 + (0.04 if index % 2 == 0 else 0.3)
+
+        planner = SpanPlanner()
+        output_path = os.path.join(directory, "cut.mp4")
+        VideoClipper().delete_segments_from_video(source_path, [(w['start_time'], w['end_time']) for w in words],
+                                                  output_path, lambda progress: None, span_planner=planner, fps=fps)
+        cap = cv2.VideoCapture(output_path)
+        frames = []
+        while True:
+            ret, frame = cap.read()
+            if not ret:
+                break
+            frames.append(frame[:, :, 0].mean(axis=0))
+        cap.release()
+
+    for word, caption in zip(words, planner.retime_words(words)):
+        # The frame shown in the middle of the caption is the one from the middle of the spoken word
+        shown = frames[int((caption['start_time'] + caption['end_time']) / 2 * fps)]
+        source_frame = (word['start_time'] + word['end_time']) / 2 * fps
+        assert abs(int(np.argmax(shown)) // 4 - source_frame) <= 1
+
+
+if __name__ == "__main__":
+    print(benchmark_span_joins())
@@ -0,0 +1,116 @@
+import os
+import tempfile
+import time
+
+import cv2
+import numpy as np
+
+from serverless_backend.services.video_analyser.video_analyser import VideoAnalyser
+
+
+def make_synthetic_clip(path, seconds=60, fps=30, width=1920, height=1080, shot_seconds=(4, 9), seed=0):
+    """Write a clip of shots with moving shapes and sensor noise, returning the first frame index of each shot."""
+    rng = np.random.default_rng(seed)
+    writer = cv2.VideoWriter(path, cv2.VideoWriter_fourcc(*'mp4v'), fps, (width, height))
+    total_frames = seconds * fps
+    shot_starts = []
+    frame_index = 0
+
+    while frame_index < total_frames:
+        shot_starts.append(frame_index)
+        shot_length = int(rng.uniform(*shot_seconds) * fps)
+        background = rng.integers(0, 256, size=3)
+        shapes = [(rng.uniform(0, width), rng.uniform(0, height), rng.uniform(-6, 6), rng.uniform(-4, 4),
+                   int(rng.uniform(60, 250)), tuple(int(c) for c in rng.integers(0, 256, size=3)))
+                  for _ in range(4)]
+
+        for i in range(min(shot_length, total_frames - frame_index)):
+            frame = np.empty((height, width, 3), dtype=np.uint8)
+            frame[:] = background
+            for x, y, dx, dy, radius, colour in shapes:
+                cv2.circle(frame, (int(x + dx * i), int(y + dy * i)), radius, colour, -1)
+            noise = rng.integers(-6, 7, size=(height // 4, width // 4, 1), dtype=np.int16)
+            frame = np.clip(frame + cv2.resize(noise, (width, height))[..., None], 0, 255).astype(np.uint8)
+            writer.write(frame)
+            frame_index += 1
+
+    writer.release()
+    return shot_starts[1:]
+
+
+def match_cuts(reference, candidate, tolerance=1):
+    """Count reference cuts that have a candidate cut within `tolerance` frames."""
+    return sum(any(abs(r - c) <= tolerance for c in candidate) for r in reference)
+
+
+def benchmark_frame_differences(video_path, true_cuts):
+    analyser = VideoAnalyser()
+    results = {}
+
+    for name, get_differences in [("full", analyser.get_differences), ("fast", analyser.get_differences_fast)]:
+        progress_calls = []
+        start = time.perf_counter()
+        differences, frames, fps, height, width = get_differences(video_path, progress_calls.append)
+        elapsed = time.perf_counter() - start
+        # A difference at index i compares frame i + 1 with frame i, so the shot starts at i + 1
+        cuts = [i + 1 for i in analyser.get_camera_cuts(differences)]
+        results[name] = {
+            "seconds": elapsed,
+            "frames": frames,
+            "progress_calls": len(progress_calls),
+            "cuts": cuts,
+            "true_cuts_found": match_cuts(true_cuts, cuts),
+        }
+
+    results["fast"]["cuts_matching_full"] = match_cuts(results["full"]["cuts"], results["fast"]["cuts"])
+    return results
+
+
+def read_all_frames(path):
+    cap = cv2.VideoCapture(path)
+    frames = []
+    while True:
+        ret, frame = cap.read()
+        if not ret:
+            break
+        frames.append(frame)
+    cap.release()
+    return frames
+
+
+def test_analyse_video_caches_compact_frames():
+    analyser = VideoAnalyser()
+    with tempfile.TemporaryDirectory() as directory:
+        video_path = os.path.join(directory, "clip.mp4")
+        make_synthetic_clip(video_path, seconds=4, width=640, height=360)
+        analysis = analyser.analyse_video(video_path, lambda progress: None)
+        cache_path = analysis["frame_cache_path"]
+        try:
+            source = read_all_frames(video_path)
+            cached = read_all_frames(cache_path)
+            cache_bytes = os.path.getsize(cache_path)
+        finally:
+            os.remove(cache_path)
+
+    assert (analysis["total_frames"], analysis["frame_cache_frames"]) == (120, 40)
+    # Every third frame at 320 px, close to the source, in a fraction of the size of the raw frames
+    assert len(cached) == 40 and cached[0].shape == (180, 320, 3)
+    for index in (0, 17, 39):
+        expected = cv2.resize(source[index * 3], (320, 180), interpolation=cv2.INTER_AREA)
+        assert np.abs(cached[index].astype(np.int16) - expected).mean() < 3
+    assert cache_bytes < 40 * 180 * 320 * 3 / 10
+
+
+if __name__ == "__main__":
+    with tempfile.TemporaryDirectory() as directory:
+        video_path = os.path.join(directory, "clip.mp4")
+        true_cuts = make_synthetic_clip(video_path)
+        results = benchmark_frame_differences(video_path, true_cuts)
+
+    print(f"True cuts: {true_cuts}")
+    for name, result in results.items():
+        print(f"{name}: {result['seconds']:.1f}s for {result['frames']} frames "
+              f"({result['frames'] / result['seconds']:.0f} fps), {result['progress_calls']} progress calls, "
+              f"{result['true_cuts_found']}/{len(true_cuts)} true cuts found, cuts {result['cuts']}")
+    print(f"fast mode matches {results['fast']['cuts_matching_full']}/{len(results['full']['cuts'])} "
+          f"of the full-resolution cuts")
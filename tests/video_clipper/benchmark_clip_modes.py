@@ -0,0 +1,184 @@
+import os
+import subprocess
+import tempfile
+import time
+from unittest import mock
+
+import cv2
+import numpy as np
+
+from serverless_backend.services.video_clipper import VideoClipper
+
+
+def make_source_video(path, seconds=300, fps=30, gop_seconds=5, preset='veryfast', profile='high',
+                      pix_fmt='yuv420p'):
+    """An H.264 source with a keyframe every gop_seconds, like a long podcast upload."""
+    subprocess.run([
+        'ffmpeg', '-v', 'error', '-y',
+        '-f', 'lavfi', '-i', f'testsrc=size=1280x720:rate={fps}:d={seconds}',
+        '-f', 'lavfi', '-i', f'sine=frequency=330:duration={seconds}',
+        '-c:v', 'libx264', '-preset', preset, '-profile:v', profile, '-pix_fmt', pix_fmt,
+        '-g', str(fps * gop_seconds), '-sc_threshold', '0',
+        '-c:a', 'aac', '-shortest', path
+    ], check=True)
+
+
+class KnownSourceClipper(VideoClipper):
+    """
+    VideoClipper with the ffprobe answers for a make_source_video source filled in, so the clip tests run
+    without ffprobe. The parsing of ffprobe's own output is tested separately.
+    """
+
+    def __init__(self, fps=30, gop_seconds=5, profile='High', pix_fmt='yuv420p', level=31):
+        super().__init__()
+        self.fps = fps
+        self.gop_seconds = gop_seconds
+        self.parameters = {"codec_name": "h264", "profile": profile, "level": level, "pix_fmt": pix_fmt}
+
+    def get_video_parameters(self, video_path):
+        return dict(self.parameters)
+
+    def get_video_packets(self, video_path, start_time, end_time):
+        # A frame every 1 / fps from 0 and a keyframe every gop_seconds, as ffprobe lists the source's packets
+        gop = self.fps * self.gop_seconds
+        return [(index / self.fps, index % gop == 0)
+                for index in range(int(start_time * self.fps), int(end_time * self.fps) + 1)
+                if start_time <= index / self.fps < end_time]
+
+
+def nal_unit_types(path):
+    """The H.264 NAL unit types of an MP4's video samples, in order, from the raw length-prefixed samples."""
+    data = subprocess.run(['ffmpeg', '-v', 'error', '-i', path, '-map', '0:v', '-c', 'copy', '-f', 'data', '-'],
+                          stdout=subprocess.PIPE, check=True).stdout
+    types = []
+    position = 0
+    while position + 4 < len(data):
+        length = int.from_bytes(data[position:position + 4], 'big')
+        types.append(data[position + 4] & 0x1f)
+        position += 4 + length
+    return types
+
+
+def decode_errors(path):
+    """What FFmpeg reports decoding the whole file, empty when every frame decodes cleanly."""
+    result = subprocess.run(['ffmpeg', '-v', 'error', '-i', path, '-f', 'null', '-'], stderr=subprocess.PIPE,
+                            universal_newlines=True)
+    return result.stderr if result.returncode == 0 else result.stderr or f"exit code {result.returncode}"
+
+
+def read_frames(path, first=0, count=None, size=(160, 90)):
+    """Small grey frames [first, first + count) of a video, enough to tell which source frame each one is."""
+    cap = cv2.VideoCapture(path)
+    frames = []
+    index = 0
+    while count is None or len(frames) < count:
+        ret, frame = cap.read()
+        if not ret:
+            break
+        if index >= first:
+            grey = cv2.cvtColor(frame, cv2.COLOR_BGR2GRAY)
+            frames.append(cv2.resize(grey, size, interpolation=cv2.INTER_AREA).astype(np.float32))
+        index += 1
+    cap.release()
+    return frames
+
+
+def worst_psnr(reference, frames):
+    """Lowest per-frame PSNR against the reference; misaligned frames show up as a very low value."""
+    worst = float('inf')
+    for a, b in zip(reference, frames):
+        mse = np.mean((a - b) ** 2)
+        worst = min(worst, 100.0 if mse == 0 else 10 * np.log10(255 ** 2 / mse))
+    return worst
+
+
+def benchmark_clip_modes(seconds=300, start_time=42.37, end_time=233.81, fps=30, clipper=None):
+    clipper = clipper or VideoClipper()
+    results = {}
+
+    with tempfile.TemporaryDirectory() as directory:
+        source_path = os.path.join(directory, "source.mp4")
+        make_source_video(source_path, seconds, fps)
+
+        # The source frames whose presentation time falls in [start_time, end_time)
+        first_frame = int(np.ceil(start_time * fps))
+        expected_frames = int(np.ceil(end_time * fps)) - first_frame
+        reference = read_frames(source_path, first_frame, expected_frames)
+        results["expected_frames"] = expected_frames
+
+        for mode in ("reencode", "smart", "copy"):
+            output_path = os.path.join(directory, f"{mode}.mp4")
+            start = time.perf_counter()
+            used_mode = clipper.clip_video(source_path, start_time, end_time, output_path, mode=mode)
+            results[mode] = {"seconds": time.perf_counter() - start, "used_mode": used_mode}
+            frames = read_frames(output_path)
+            results[mode]["frames"] = len(frames)
+            results[mode]["worst_psnr_vs_source"] = worst_psnr(reference, frames)
+
+    return results
+
+
+def test_smart_clip_is_frame_accurate():
+    results = benchmark_clip_modes(seconds=40, start_time=7.21, end_time=31.9, clipper=KnownSourceClipper())
+    assert results["smart"]["frames"] == results["expected_frames"]
+    assert results["smart"]["worst_psnr_vs_source"] > 30
+    assert results["smart"]["used_mode"] == "smart"
+
+
+def test_smart_clip_joins_parts_with_other_parameter_sets():
+    # The re-encoded ends come out with other SPS and PPS than these sources: a 10-bit High 10 one and a
+    # Baseline one made with other x264 settings
+    sources = {
+        "high10": {"profile": "high10", "pix_fmt": "yuv420p10le"},
+        "baseline": {"profile": "baseline", "preset": "slow"},
+    }
+    probed = {
+        "high10": KnownSourceClipper(gop_seconds=2, profile="High 10", pix_fmt="yuv420p10le"),
+        "baseline": KnownSourceClipper(gop_seconds=2, profile="Constrained Baseline"),
+    }
+    start_time, end_time = 1.23, 9.5
+    expected_frames = int(np.ceil(end_time * 30)) - int(np.ceil(start_time * 30))
+    with tempfile.TemporaryDirectory() as directory:
+        for name, options in sources.items():
+            source_path = os.path.join(directory, f"{name}_source.mp4")
+            output_path = os.path.join(directory, f"{name}.mp4")
+            make_source_video(source_path, seconds=12, gop_seconds=2, **options)
+
+            assert probed[name].clip_video(source_path, start_time, end_time, output_path, mode="smart") == "smart"
+            assert decode_errors(output_path) == ""
+            frames = read_frames(output_path)
+            assert len(frames) == expected_frames
+            assert worst_psnr(read_frames(source_path, int(np.ceil(start_time * 30)), expected_frames), frames) > 30
+
+            # An avc3 track, with the SPS and PPS in band ahead of every IDR picture
+            stream_info = subprocess.run(['ffmpeg', '-i', output_path], stderr=subprocess.PIPE,
+                                         universal_newlines=True).stderr
+            assert "avc3" in stream_info
+            types = nal_unit_types(output_path)
+            idr_positions = [index for index, nal_type in enumerate(types) if nal_type == 5 and
+                             (index == 0 or types[index - 1] != 5)]
+            assert len(idr_positions) >= 3
+            for position in idr_positions:
+                assert {7, 8} <= set(types[max(0, position - 3):position])
+
+
+def test_ffprobe_output_is_parsed():
+    clipper = VideoClipper()
+    parameters_output = ('{\n    "programs": [\n\n    ],\n    "streams": [\n        {\n'
+                         '            "codec_name": "h264",\n            "profile": "High 10",\n'
+                         '            "pix_fmt": "yuv420p10le",\n            "level": 40\n        }\n    ]\n}\n')
+    # Packets in decode order, with one just outside the interval that ffprobe's read_intervals let through
+    packets_output = "2.000000,K__\n2.133333,___\n2.066667,___\n2.100000,_D_\nN/A,___\n3.000000,K__\n"
+
+    with mock.patch('subprocess.check_output', return_value=parameters_output):
+        assert clipper.get_video_parameters("video.mp4") == {
+            "codec_name": "h264", "profile": "High 10", "pix_fmt": "yuv420p10le", "level": 40}
+    with mock.patch('subprocess.check_output', return_value=packets_output) as check_output:
+        assert clipper.get_video_packets("video.mp4", 2.0, 3.0) == [
+            (2.0, True), (2.066667, False), (2.1, False), (2.133333, False)]
+        assert '2.0%3.0' in check_output.call_args[0][0]
+
+
+if __name__ == "__main__":
+    for mode, result in benchmark_clip_modes().items():
+        print(f"{mode}: {result}")